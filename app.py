@@ -1,23 +1,57 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from flask import Flask, request, jsonify
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import abc
+import asyncio
+import collections
+import contextlib
+import contextvars
+import copy
+import datetime
 import ee
+import hashlib
+import google.auth.exceptions
+import google.auth.transport.requests
+import json
 import time
 import os
-from functools import wraps
+import queue
+import random
+import requests
+import sqlite3
+import threading
+import urllib.parse
+import uuid
+from functools import partial, wraps
 from flasgger import Swagger
 
+try:
+    import numpy as np
+except ImportError:  # Opcional: só a amostragem local de pontos (climate_stats_batch) usa
+    np = None
+
+try:
+    import httpx
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # Opcionais: só o modo assíncrono (asgi_app) usa
+    httpx = None
+    WsgiToAsgi = None
+
+def gee_project_id():
+    """Projeto do GEE: variável de ambiente GEE_PROJECT ou o projeto padrão."""
+    return os.getenv('GEE_PROJECT', 'ee-silasnascimento')
+
 # Inicialização do Google Earth Engine com suporte a variável de ambiente
-def initialize_gee():
+def initialize_gee(credentials='persistent'):
     try:
-        # Usar variável de ambiente GEE_PROJECT ou fallback para projeto padrão
-        project_id = os.getenv('GEE_PROJECT', 'ee-silasnascimento')
+        project_id = gee_project_id()
         
         # Log do projeto sendo usado
         print(f"🌍 Inicializando Google Earth Engine com projeto: {project_id}")
         
         # Inicializar com o projeto especificado
-        ee.Initialize(project=project_id)
+        ee.Initialize(credentials, project=project_id)
         
         # Verificar se a inicialização foi bem-sucedida
         try:
@@ -32,14 +66,629 @@ def initialize_gee():
         print(error_msg)
         raise Exception(error_msg)
 
+# >>> SESSÃO DO EARTH ENGINE POR PROCESSO <<<
+
+# Intervalo da verificação de credenciais e antecedência mínima para renová-las
+GEE_CREDENTIAL_REFRESH_SECONDS = int(os.getenv('GEE_CREDENTIAL_REFRESH_SECONDS', '300'))
+GEE_CREDENTIAL_REFRESH_MARGIN_SECONDS = int(os.getenv('GEE_CREDENTIAL_REFRESH_MARGIN_SECONDS', '600'))
+
+# Trechos de mensagens do EE/google-auth que indicam credenciais inválidas ou sessão perdida.
+# Só frases específicas: erros de cota e de permissão também citam "credentials"
+AUTH_ERROR_MARKERS = (
+    'unauthenticated', 'invalid_grant', 'invalid credentials', 'invalid authentication credentials',
+    'credentials have expired', 'not initialized', 'please authorize', 'token has been expired',
+)
+AUTH_HTTP_STATUSES = (401,)
+
+def is_auth_error(error):
+    """Indica se a exceção vem de falha de autenticação (e exige reinicializar o EE)."""
+    if isinstance(error, google.auth.exceptions.GoogleAuthError):
+        return True
+    # 403 fica de fora: é falta de permissão no asset/projeto, que reinicializar não resolve
+    if http_status_code(error) in AUTH_HTTP_STATUSES:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in AUTH_ERROR_MARKERS)
+
+class EarthEngineSession:
+    """Ciclo de vida do Earth Engine por processo.
+
+    Cada worker do gunicorn inicializa o EE uma única vez (após o fork), renova as
+    credenciais em segundo plano e só reinicializa depois de uma falha de
+    autenticação. `ready` reflete o estado real da sessão sem chamadas de teste.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._ready = False
+        self._credentials = None
+        self._initialized_at = None
+        self._last_refresh_at = None
+        self._last_error = None
+
+    @property
+    def ready(self):
+        return self._ready and self._pid == os.getpid()
+
+    @property
+    def credentials(self):
+        """Credenciais da sessão (usadas também pelas chamadas REST do modo assíncrono)."""
+        return self._credentials if self.ready else None
+
+    def ensure_initialized(self):
+        """Inicializa o EE neste processo se ainda não estiver pronto."""
+        if self.ready:
+            return
+        with self._lock:
+            if self.ready:
+                return
+            try:
+                credentials = ee.data.get_persistent_credentials()
+                with stage_timer('init'):
+                    initialize_gee(credentials)
+            except Exception as e:
+                self._ready = False
+                self._last_error = str(e)
+                raise
+            first_init = self._pid != os.getpid()
+            self._pid = os.getpid()
+            self._credentials = credentials
+            self._initialized_at = time.time()
+            self._last_error = None
+            self._ready = True
+            if first_init:
+                threading.Thread(target=self._refresh_loop, name='gee-credential-refresh', daemon=True).start()
+
+    def report_error(self, error):
+        """Marca a sessão para reinicialização se o erro for de autenticação."""
+        if is_auth_error(error):
+            print(f"⚠️ Falha de autenticação no GEE, sessão será reinicializada: {error}")
+            self._ready = False
+            self._last_error = str(error)
+
+    def _refresh_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(GEE_CREDENTIAL_REFRESH_SECONDS)
+            credentials = self._credentials
+            if not self._ready or credentials is None or not hasattr(credentials, 'refresh'):
+                continue
+            expiry = getattr(credentials, 'expiry', None)
+            expires_soon = expiry is None or (
+                expiry - datetime.datetime.utcnow()
+            ).total_seconds() < GEE_CREDENTIAL_REFRESH_MARGIN_SECONDS
+            if credentials.valid and not expires_soon:
+                continue
+            try:
+                credentials.refresh(google.auth.transport.requests.Request())
+                self._last_refresh_at = time.time()
+            except Exception as e:
+                print(f"⚠️ Falha ao renovar credenciais do GEE: {e}")
+                self.report_error(e)
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'pid': os.getpid(),
+            'initialized_at': self._initialized_at if self._pid == os.getpid() else None,
+            'last_credential_refresh_at': self._last_refresh_at,
+            'last_error': self._last_error,
+        }
+
+gee_session = EarthEngineSession()
+# Após o fork (workers do gunicorn) o filho começa com a sessão zerada
+os.register_at_fork(after_in_child=gee_session._reset)
+
+# >>> CONCORRÊNCIA: EXECUTOR COMPARTILHADO E LIMITE DE CHAMADAS AO EE <<<
+
+# Threads do executor compartilhado, profundidade máxima da fila e chamadas simultâneas ao EE por processo
+EE_EXECUTOR_WORKERS = int(os.getenv('EE_EXECUTOR_WORKERS', '8'))
+EE_EXECUTOR_MAX_QUEUE = int(os.getenv('EE_EXECUTOR_MAX_QUEUE', '64'))
+EE_MAX_CONCURRENT_CALLS = int(os.getenv('EE_MAX_CONCURRENT_CALLS', '8'))
+EXECUTOR_RETRY_AFTER_SECONDS = int(os.getenv('EXECUTOR_RETRY_AFTER_SECONDS', '5'))
+
+# Tentativas por chamada ao EE, orçamento de novas tentativas por requisição e backoff exponencial
+EE_RETRY_MAX_ATTEMPTS = int(os.getenv('EE_RETRY_MAX_ATTEMPTS', '4'))
+EE_RETRY_BUDGET_PER_REQUEST = int(os.getenv('EE_RETRY_BUDGET_PER_REQUEST', '6'))
+EE_RETRY_BASE_DELAY_SECONDS = float(os.getenv('EE_RETRY_BASE_DELAY_SECONDS', '0.5'))
+EE_RETRY_MAX_DELAY_SECONDS = float(os.getenv('EE_RETRY_MAX_DELAY_SECONDS', '8'))
+
+# Prazo opcional por requisição (cabeçalho X-Request-Deadline ou `deadline_seconds` no corpo, em
+# segundos). Esgotado o prazo, períodos e chamadas ao EE ainda não iniciados são pulados e a
+# resposta traz os períodos prontos. 0 desativa o padrão; o teto fica abaixo do timeout do gunicorn.
+REQUEST_DEADLINE_DEFAULT_SECONDS = float(os.getenv('REQUEST_DEADLINE_DEFAULT_SECONDS', '0'))
+REQUEST_DEADLINE_MAX_SECONDS = float(os.getenv('REQUEST_DEADLINE_MAX_SECONDS', '110'))
+# Folga para as tarefas devolverem os períodos prontos depois do prazo
+REQUEST_DEADLINE_GRACE_SECONDS = float(os.getenv('REQUEST_DEADLINE_GRACE_SECONDS', '1'))
+REQUEST_DEADLINE_HEADER = 'X-Request-Deadline'
+TIMED_OUT_MESSAGE = 'Prazo da requisição esgotado'
+
+# Erros transitórios do EE que valem nova tentativa: pelo código HTTP da resposta ou por trechos
+# exatos das mensagens. Códigos soltos na mensagem ('429', '503') aparecem em ids de assets e datas
+RATE_LIMIT_HTTP_STATUSES = (429,)
+UNAVAILABLE_HTTP_STATUSES = (503,)
+RATE_LIMIT_ERROR_MARKERS = (
+    'too many requests', 'too many concurrent aggregations', 'rate limit', 'resource exhausted', 'resource_exhausted',
+)
+UNAVAILABLE_ERROR_MARKERS = ('service unavailable', 'backend error')
+RETRYABLE_ERROR_MARKERS = RATE_LIMIT_ERROR_MARKERS + UNAVAILABLE_ERROR_MARKERS
+
+class RequestContext:
+    """Estado de uma requisição (ou job) compartilhado por todas as suas chamadas ao EE.
+
+    Propagado às threads do executor via contextvars: identifica o cliente na fila
+    justa e guarda o orçamento de novas tentativas da requisição.
+    """
+
+    def __init__(self, client_key='anonymous', background=False, endpoint=None, deadline_seconds=None):
+        self.client_key = client_key
+        # Rótulo usado nas métricas por endpoint (ex.: contadores do cache de resultados)
+        self.endpoint = endpoint or 'internal'
+        # Trabalho em segundo plano (jobs) espera vaga na fila em vez de ser rejeitado
+        self.background = background
+        self.retry_budget = EE_RETRY_BUDGET_PER_REQUEST
+        self.retries = 0
+        # Orçamento de tempo (segundos) e instante limite em time.monotonic(); None sem prazo
+        self.deadline_seconds = deadline_seconds
+        self.deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+        # Tempo acumulado e ocorrências por etapa (cabeçalho Server-Timing)
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def take_retry(self):
+        """Consome uma nova tentativa do orçamento; False se ele acabou."""
+        with self._lock:
+            if self.retry_budget <= 0:
+                return False
+            self.retry_budget -= 1
+            self.retries += 1
+            return True
+
+    def remaining(self):
+        """Segundos até o prazo (nunca negativo), ou None se a requisição não tem prazo."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def add_timing(self, stage, seconds):
+        with self._lock:
+            total, count = self.timings.get(stage, (0.0, 0))
+            self.timings[stage] = (total + seconds, count + 1)
+
+    def timing_snapshot(self):
+        with self._lock:
+            return dict(self.timings)
+
+current_request = contextvars.ContextVar('current_request', default=None)
+
+def get_request_context():
+    return current_request.get() or RequestContext()
+
+def request_deadline_seconds(header_value=None, data=None, default=REQUEST_DEADLINE_DEFAULT_SECONDS):
+    """Orçamento de tempo da requisição: cabeçalho, `deadline_seconds` do corpo ou o padrão.
+
+    Limitado a REQUEST_DEADLINE_MAX_SECONDS; valores inválidos usam o padrão e 0 (ou menos)
+    significa sem prazo (None).
+    """
+    value = header_value if header_value not in (None, '') else None
+    if value is None and isinstance(data, dict):
+        value = data.get('deadline_seconds')
+    try:
+        seconds = float(value) if value is not None else default
+    except (TypeError, ValueError):
+        seconds = default
+    if not seconds or seconds <= 0:
+        return None
+    return min(seconds, REQUEST_DEADLINE_MAX_SECONDS) if REQUEST_DEADLINE_MAX_SECONDS > 0 else seconds
+
+def http_status_code(error):
+    """Código HTTP de um erro do EE, ou None.
+
+    Vem da resposta HTTP na cadeia de exceções (HttpError do cliente do EE) ou do prefixo
+    'NNN ' das mensagens montadas a partir da API REST (modo assíncrono).
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = getattr(error, 'status_code', None) or getattr(getattr(error, 'resp', None), 'status', None)
+        if status:
+            return int(status)
+        prefix = str(error).split(' ', 1)[0]
+        if len(prefix) == 3 and prefix.isdigit():
+            return int(prefix)
+        error = error.__cause__ or error.__context__
+    return None
+
+def is_retryable_error(error):
+    if http_status_code(error) in RATE_LIMIT_HTTP_STATUSES + UNAVAILABLE_HTTP_STATUSES:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_ERROR_MARKERS)
+
+class ExecutorSaturated(Exception):
+    """A fila do executor compartilhado está cheia; a requisição deve ser rejeitada com 503."""
+
+class DeadlineExceeded(Exception):
+    """O prazo da requisição acabou antes de uma chamada ao EE começar."""
+
+class EECallLimiter:
+    """Semáforo global das chamadas bloqueantes ao EE (getInfo/getMapId) deste processo."""
+
+    def __init__(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self._reset()
+
+    def _reset(self):
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {'calls': 0, 'wait_seconds_sum': 0.0, 'wait_seconds_max': 0.0}
+
+    def __enter__(self):
+        started = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        self._semaphore.acquire()
+        waited = time.monotonic() - started
+        with self._lock:
+            self._waiting -= 1
+            self._in_flight += 1
+            self._stats['calls'] += 1
+            self._stats['wait_seconds_sum'] += waited
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, max_concurrent=self.max_concurrent, in_flight=self._in_flight, waiting=self._waiting)
+
+class FairExecutor:
+    """Executor do processo com uma fila por cliente, atendidas em round-robin.
+
+    Substitui o ThreadPoolExecutor criado a cada requisição. Quando a fila passa de
+    `max_queue` itens, `submit` levanta ExecutorSaturated (ou espera vaga, com block=True).
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._reset()
+
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._queues = collections.OrderedDict()
+        self._queued = 0
+        self._active = 0
+        self._workers_pid = None
+        self._stats = {
+            'submitted': 0, 'rejected': 0, 'completed': 0,
+            'queue_wait_seconds_sum': 0.0, 'queue_wait_seconds_max': 0.0,
+        }
+
+    def saturated(self):
+        return self._queued >= self.max_queue
+
+    def submit(self, client_key, fn, args=(), kwargs=None, block=False):
+        future = Future()
+        context = contextvars.copy_context()
+        with self._cond:
+            while self._queued >= self.max_queue:
+                if not block:
+                    self._stats['rejected'] += 1
+                    raise ExecutorSaturated('Servidor ocupado, tente novamente mais tarde')
+                self._cond.wait()
+            if self._workers_pid != os.getpid():
+                self._workers_pid = os.getpid()
+                for i in range(self.max_workers):
+                    threading.Thread(target=self._work, name=f'ee-executor-{i}', daemon=True).start()
+            self._queues.setdefault(client_key, collections.deque()).append(
+                (future, context, fn, args, kwargs or {}, time.monotonic())
+            )
+            self._queued += 1
+            self._stats['submitted'] += 1
+            self._cond.notify_all()
+        return future
+
+    def _next_item(self):
+        # Round-robin: atende o primeiro cliente e o manda para o fim da fila se ainda houver itens
+        client_key, items = next(iter(self._queues.items()))
+        item = items.popleft()
+        if items:
+            self._queues.move_to_end(client_key)
+        else:
+            del self._queues[client_key]
+        self._queued -= 1
+        return item
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queued:
+                    self._cond.wait()
+                future, context, fn, args, kwargs, enqueued_at = self._next_item()
+                waited = time.monotonic() - enqueued_at
+                self._active += 1
+                self._stats['queue_wait_seconds_sum'] += waited
+                self._stats['queue_wait_seconds_max'] = max(self._stats['queue_wait_seconds_max'], waited)
+                self._cond.notify_all()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(context.run(fn, *args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._stats['completed'] += 1
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats,
+                workers=self.max_workers,
+                active=self._active,
+                occupancy=self._active / self.max_workers if self.max_workers else 0,
+                queued=self._queued,
+                max_queue=self.max_queue,
+                queued_clients=len(self._queues),
+            )
+
+ee_call_limiter = EECallLimiter(EE_MAX_CONCURRENT_CALLS)
+ee_executor = FairExecutor(EE_EXECUTOR_WORKERS, EE_EXECUTOR_MAX_QUEUE)
+os.register_at_fork(after_in_child=ee_call_limiter._reset)
+os.register_at_fork(after_in_child=ee_executor._reset)
+
+def executor_saturated_response():
+    response = jsonify({'error': 'Servidor ocupado, tente novamente mais tarde'})
+    response.headers['Retry-After'] = str(EXECUTOR_RETRY_AFTER_SECONDS)
+    return response, 503
+
+def run_on_ee_executor(fn, *args, block=False):
+    """Executa fn(*args) no executor compartilhado, na fila do cliente da requisição, e aguarda o resultado.
+
+    Para endpoints que fazem o trabalho pesado em blocos (lotes): com a fila cheia levanta
+    ExecutorSaturated, a não ser com `block` (ou em jobs), que esperam vaga.
+    """
+    context = get_request_context()
+    return ee_executor.submit(context.client_key, fn, args, block=block or context.background).result()
+
+ee_retry_stats = {'retries': 0, 'exhausted': 0}
+
+# >>> MÉTRICAS (PROMETHEUS) E INSTRUMENTAÇÃO <<<
+# Cabeçalho Server-Timing com o tempo por etapa de cada requisição
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class MetricsRegistry:
+    """Contadores e histogramas do processo no formato texto do Prometheus.
+
+    Cada worker do gunicorn expõe as próprias métricas. Valores instantâneos (ocupação de pools, filas) vêm de coletores
+    chamados na hora da exposição.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._counters = collections.defaultdict(dict)
+        self._histograms = collections.defaultdict(dict)
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((labels or {}).items()))
+
+    def inc(self, name, labels=None, value=1):
+        key = self._key(labels)
+        with self._lock:
+            self._counters[name][key] = self._counters[name].get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms[name].get(key)
+            if series is None:
+                series = self._histograms[name][key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def add_collector(self, collector):
+        """`collector()` devolve [(nome, tipo, ajuda, [(labels, valor), ...]), ...]."""
+        self._collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ''
+        escaped = (f'{k}="{str(v)}"'.replace('\\', '\\\\').replace('\n', '\\n') for k, v in labels)
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self):
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: copy.deepcopy(series) for name, series in self._histograms.items()}
+        for name, series in sorted(counters.items()):
+            header(name, *self._meta.get(name, ('counter', name)))
+            for key, value in sorted(series.items()):
+                lines.append(f'{name}{self._format_labels(key)} {value}')
+        for name, series in sorted(histograms.items()):
+            header(name, *self._meta.get(name, ('histogram', name)))
+            for key, data in sorted(series.items()):
+                for bound, count in zip(self.buckets, data['buckets']):
+                    lines.append(f'{name}_bucket{self._format_labels(key + (("le", bound),))} {count}')
+                lines.append(f'{name}_bucket{self._format_labels(key + (("le", "+Inf"),))} {data["count"]}')
+                lines.append(f'{name}_sum{self._format_labels(key)} {data["sum"]}')
+                lines.append(f'{name}_count{self._format_labels(key)} {data["count"]}')
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                header(name, kind, help_text)
+                for labels, value in samples:
+                    lines.append(f'{name}{self._format_labels(self._key(labels))} {value}')
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry(METRICS_BUCKETS)
+os.register_at_fork(after_in_child=metrics.reset)
+metrics.describe('gee_stage_duration_seconds', 'histogram', 'Duração das etapas da lógica e das chamadas ao EE por endpoint, etapa e satélite')
+metrics.describe('gee_request_duration_seconds', 'histogram', 'Duração das requisições HTTP por endpoint e status')
+metrics.describe('gee_ee_errors_total', 'counter', 'Erros das chamadas ao EE por classe')
+metrics.describe('gee_scene_selection_total', 'counter', 'Cenas escolhidas por endpoint e satélite (none = nenhuma cena válida)')
+metrics.describe('gee_sentinel_landsat_fallbacks_total', 'counter', 'Períodos em que o Sentinel-2 não tinha cena válida e o Landsat foi usado')
+metrics.describe('gee_deadline_timed_out_total', 'counter', 'Períodos (ou tarefas) devolvidos como timed_out pelo prazo da requisição')
+
+def timed_out_result():
+    """Resultado de um período pulado ou abandonado pelo prazo da requisição."""
+    metrics.inc('gee_deadline_timed_out_total', {'endpoint': get_request_context().endpoint})
+    return {'error': TIMED_OUT_MESSAGE, 'timed_out': True}
+
+def timed_out_periods(periods, on_period=None):
+    """Todos os períodos como `timed_out` (caminhos com uma única chamada ao EE)."""
+    results = {}
+    for period_name in periods:
+        results[period_name] = timed_out_result()
+        if on_period:
+            on_period(period_name, results[period_name])
+    return results
+
+# Classes de erro do EE pelos trechos da mensagem (em minúsculas), na ordem de verificação, quando
+# o código HTTP não decide
+EE_ERROR_CLASSES = (
+    ('rate_limit', RATE_LIMIT_ERROR_MARKERS),
+    ('unavailable', UNAVAILABLE_ERROR_MARKERS),
+    ('timeout', ('timed out', 'timeout', 'deadline')),
+    ('memory', ('memory limit', 'user memory', 'too many pixels')),
+    ('invalid_request', ('not found', 'invalid', 'parameter', 'required')),
+)
+
+def classify_ee_error(error):
+    if is_auth_error(error):
+        return 'auth'
+    status = http_status_code(error)
+    if status in RATE_LIMIT_HTTP_STATUSES:
+        return 'rate_limit'
+    if status in UNAVAILABLE_HTTP_STATUSES:
+        return 'unavailable'
+    message = str(error).lower()
+    for error_class, markers in EE_ERROR_CLASSES:
+        if any(marker in message for marker in markers):
+            return error_class
+    return 'other'
+
+def record_stage(stage, seconds, satellite=None):
+    """Registra a duração de uma etapa no histograma e nos tempos da requisição (Server-Timing)."""
+    context = current_request.get()
+    endpoint = context.endpoint if context else 'internal'
+    metrics.observe('gee_stage_duration_seconds', seconds,
+                    {'endpoint': endpoint, 'stage': stage, 'satellite': satellite or ''})
+    if context:
+        context.add_timing(stage, seconds)
+
+@contextlib.contextmanager
+def stage_timer(stage, satellite=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started, satellite)
+
+def record_scene_selection(satellite):
+    endpoint = get_request_context().endpoint
+    metrics.inc('gee_scene_selection_total', {'endpoint': endpoint, 'satellite': satellite})
+    if satellite == 'landsat':
+        metrics.inc('gee_sentinel_landsat_fallbacks_total', {'endpoint': endpoint})
+
+def server_timing_header(context):
+    """Valor do cabeçalho Server-Timing: tempo total (ms) e número de ocorrências de cada etapa."""
+    return ', '.join(
+        f'{stage};desc="{count}x";dur={total * 1000:.1f}'
+        for stage, (total, count) in sorted(context.timing_snapshot().items())
+    )
+
+
+def call_ee(operation, stage='ee_call', satellite=None):
+    """Executa uma chamada bloqueante ao EE dentro do limite global de concorrência.
+
+    Erros transitórios (429, agregações concorrentes demais, 503) são repetidos com
+    backoff exponencial com jitter, até EE_RETRY_MAX_ATTEMPTS por chamada e dentro do
+    orçamento da requisição. Falhas de autenticação são informadas à sessão do EE.
+    Com o prazo da requisição esgotado, nenhuma tentativa nova começa (DeadlineExceeded).
+    A duração total (espera, tentativas e backoff) é registrada na etapa `stage`.
+    """
+    with stage_timer(stage, satellite):
+        return _call_ee_with_retries(operation)
+
+def _call_ee_with_retries(operation):
+    context = current_request.get()
+    attempt = 0
+    while True:
+        try:
+            with ee_call_limiter:
+                # Verificado após a espera pela vaga, que também consome o prazo
+                if context and context.expired():
+                    raise DeadlineExceeded(TIMED_OUT_MESSAGE)
+                return operation()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            gee_session.report_error(e)
+            metrics.inc('gee_ee_errors_total', {'class': classify_ee_error(e)})
+            attempt += 1
+            if not is_retryable_error(e):
+                raise
+            if attempt >= EE_RETRY_MAX_ATTEMPTS or (context and not context.take_retry()):
+                ee_retry_stats['exhausted'] += 1
+                raise
+            ee_retry_stats['retries'] += 1
+            delay = min(EE_RETRY_MAX_DELAY_SECONDS, EE_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+            remaining = context.remaining() if context else None
+            time.sleep(random.uniform(0, delay) if remaining is None else min(random.uniform(0, delay), remaining))
+
+def ee_get_info(ee_object, stage='getInfo', satellite=None):
+    """getInfo() com limite de concorrência e novas tentativas (ver call_ee)."""
+    return call_ee(ee_object.getInfo, stage, satellite)
+
+def ee_get_map_id(image, vis_params, satellite=None):
+    """getMapId() com limite de concorrência e novas tentativas (ver call_ee)."""
+    return call_ee(lambda: image.getMapId(vis_params), 'getMapId', satellite)
+
 # Função para obter informações do projeto atual
 def get_project_info():
     """Retorna informações sobre o projeto GEE atual."""
     try:
-        project_id = os.getenv('GEE_PROJECT', 'ee-silasnascimento')
+        project_id = gee_project_id()
         return {
             'project_id': project_id,
-            'status': 'initialized',
+            'status': 'initialized' if gee_session.ready else 'not_initialized',
             'source': 'environment_variable' if os.getenv('GEE_PROJECT') else 'default'
         }
     except Exception as e:
@@ -75,16 +724,16 @@ swagger_template = {
 swagger = Swagger(app, template=swagger_template)
 
 # Funções de mascaramento e cobertura de nuvens para Sentinel-2
-def get_cloud_coverage_sentinel(image, roi):
+def get_cloud_coverage_sentinel(image, roi, scale=10, property_name='cloud_coverage_roi'):
     scl = image.select('SCL')
     cloud_mask = scl.eq(8).Or(scl.eq(9)).Or(scl.eq(3))
     cloud_area = cloud_mask.reduceRegion(
         reducer=ee.Reducer.mean(),
         geometry=roi,
-        scale=10,
+        scale=scale,
         maxPixels=1e9
     ).get('SCL')
-    return image.set('cloud_coverage_roi', ee.Number(cloud_area).multiply(100))
+    return image.set(property_name, ee.Number(cloud_area).multiply(100))
 
 def apply_cloud_mask_sentinel(image):
     scl = image.select('SCL')
@@ -99,17 +748,17 @@ def apply_landsat_cloud_mask(image):
     mask = qa.bitwiseAnd(cloud_shadow_bit).eq(0).And(qa.bitwiseAnd(cloud_bit).eq(0))
     return image.updateMask(mask)
 
-def get_landsat_cloud_coverage(image, roi):
+def get_landsat_cloud_coverage(image, roi, scale=30, property_name='cloud_coverage_roi'):
     qa = image.select('QA_PIXEL')
     cloud_bit = 1 << 5
     cloud_mask = qa.bitwiseAnd(cloud_bit).neq(0)
     cloud_area = cloud_mask.reduceRegion(
         reducer=ee.Reducer.mean(),
         geometry=roi,
-        scale=30,
+        scale=scale,
         maxPixels=1e9
     ).get('QA_PIXEL')
-    return image.set('cloud_coverage_roi', ee.Number(cloud_area).multiply(100))
+    return image.set(property_name, ee.Number(cloud_area).multiply(100))
 
 # Função para verificar pixels válidos
 def has_valid_pixels(image, roi, scale):
@@ -122,23 +771,298 @@ def has_valid_pixels(image, roi, scale):
     ).get(image.bandNames().get(0))
     return ee.Number(pixel_count).gt(0)
 
+# Pré-filtro de cenas antes da cobertura de nuvens exata na ROI
+CLOUD_PREFILTER_ENABLED = os.getenv('CLOUD_PREFILTER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Cobertura de nuvens da cena inteira (CLOUDY_PIXEL_PERCENTAGE / CLOUD_COVER); mais frouxo que o limite na ROI
+CLOUD_PREFILTER_MAX_SCENE_PERCENT = float(os.getenv('CLOUD_PREFILTER_MAX_SCENE_PERCENT', '80'))
+# Estimativa grosseira na ROI, em escala reduzida
+CLOUD_PREFILTER_COARSE_SCALE = int(os.getenv('CLOUD_PREFILTER_COARSE_SCALE', '200'))
+CLOUD_PREFILTER_MAX_COARSE_PERCENT = float(os.getenv('CLOUD_PREFILTER_MAX_COARSE_PERCENT', '40'))
+# Candidatas (as menos nubladas pela estimativa) que seguem para a redução exata
+CLOUD_PREFILTER_MAX_CANDIDATES = int(os.getenv('CLOUD_PREFILTER_MAX_CANDIDATES', '8'))
+# Limite final de nuvens na ROI, na escala nativa
+ROI_MAX_CLOUD_PERCENT = float(os.getenv('ROI_MAX_CLOUD_PERCENT', '20'))
+
+# Propriedade de metadados de nuvens e função de cobertura na ROI de cada coleção óptica
+OPTICAL_COLLECTIONS = {
+    'sentinel': {'id': 'COPERNICUS/S2_SR_HARMONIZED', 'cloud_property': 'CLOUDY_PIXEL_PERCENTAGE',
+                 'cloud_coverage': get_cloud_coverage_sentinel, 'cloud_mask': apply_cloud_mask_sentinel},
+    'landsat': {'id': 'LANDSAT/LC09/C02/T1_L2', 'cloud_property': 'CLOUD_COVER',
+                'cloud_coverage': get_landsat_cloud_coverage, 'cloud_mask': apply_landsat_cloud_mask},
+}
+
+def prefilter_candidates(collection, roi, cloud_property, cloud_coverage, max_candidates=CLOUD_PREFILTER_MAX_CANDIDATES):
+    """Reduz as cenas candidatas antes da redução exata: metadados da cena e estimativa grosseira na ROI.
+
+    Com `max_candidates=None` (séries temporais) todas as cenas que passam nos filtros são mantidas.
+    """
+    collection = (collection
+                  .filter(ee.Filter.lt(cloud_property, CLOUD_PREFILTER_MAX_SCENE_PERCENT))
+                  .map(lambda img: cloud_coverage(img, roi, scale=CLOUD_PREFILTER_COARSE_SCALE,
+                                                  property_name='cloud_coverage_coarse'))
+                  .filter(ee.Filter.lt('cloud_coverage_coarse', CLOUD_PREFILTER_MAX_COARSE_PERCENT)))
+    if max_candidates is None:
+        return collection
+    return collection.sort('cloud_coverage_coarse').limit(max_candidates)
+
+# >>> CATÁLOGO LOCAL DE CENAS (SENTINEL-2 E LANDSAT) <<<
+# Arquivo SQLite do catálogo; vazio desativa (as cenas candidatas vêm sempre do EE)
+SCENE_CATALOG_PATH = os.getenv('SCENE_CATALOG_PATH', '')
+# Região sincronizada: "min_lon,min_lat,max_lon,max_lat"; ROIs fora dela consultam o EE
+SCENE_CATALOG_BOUNDS = os.getenv('SCENE_CATALOG_BOUNDS', '')
+SCENE_CATALOG_START_DATE = os.getenv('SCENE_CATALOG_START_DATE', '2022-01-01')
+SCENE_CATALOG_GRID_DEGREES = float(os.getenv('SCENE_CATALOG_GRID_DEGREES', '0.5'))
+SCENE_CATALOG_SYNC_INTERVAL_SECONDS = int(os.getenv('SCENE_CATALOG_SYNC_INTERVAL_SECONDS', '3600'))
+# Dias por chamada getInfo() na sincronização
+SCENE_CATALOG_SYNC_WINDOW_DAYS = int(os.getenv('SCENE_CATALOG_SYNC_WINDOW_DAYS', '10'))
+# Janela revisada a cada sincronização, para cenas ingeridas com atraso; o catálogo só responde por períodos anteriores a ela
+SCENE_CATALOG_RESYNC_DAYS = int(os.getenv('SCENE_CATALOG_RESYNC_DAYS', '7'))
+SCENE_CATALOG_LEASE_SECONDS = 600
+
+def date_to_millis(date_string):
+    date = datetime.datetime.strptime(date_string, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+    return int(date.timestamp() * 1000)
+
+def geojson_bbox(geometry):
+    """(min_lon, min_lat, max_lon, max_lat) de uma geometria GeoJSON, ou None se não houver coordenadas."""
+    points = []
+
+    def collect(coordinates):
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            points.append(coordinates)
+        else:
+            for item in coordinates or []:
+                collect(item)
+
+    if geometry.get('type') == 'GeometryCollection':
+        for item in geometry.get('geometries', []):
+            collect(item.get('coordinates'))
+    else:
+        collect(geometry.get('coordinates'))
+    if not points:
+        return None
+    return (min(p[0] for p in points), min(p[1] for p in points),
+            max(p[0] for p in points), max(p[1] for p in points))
+
+class SceneCatalog:
+    """Índice local (SQLite + grade regular) das cenas ópticas de uma região.
+
+    Guarda id, footprint (retângulo envolvente), data de aquisição e cobertura de nuvens
+    de cada cena. Uma thread por processo sincroniza de forma incremental; entre os
+    workers, só quem detém o lease da coleção consulta o EE. `candidates()` responde
+    localmente quais cenas cobrem uma ROI no período, ou None se o catálogo não cobre o pedido.
+    """
+
+    def __init__(self, path, bounds, start_date, grid_degrees):
+        self.path = path or None
+        self.bounds = tuple(float(v) for v in bounds.split(',')) if bounds else None
+        self.start_ms = date_to_millis(start_date)
+        self.grid = grid_degrees
+        self._lock = threading.Lock()
+        self._sync_pid = None
+        self._stats = {'lookups': 0, 'fallbacks': 0, 'empty_periods': 0, 'syncs': 0, 'sync_errors': 0, 'last_sync_error': None}
+        if self.enabled:
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS scenes (scene_id TEXT PRIMARY KEY, collection TEXT, acquired_ms INTEGER, '
+                    'cloud REAL, min_lon REAL, min_lat REAL, max_lon REAL, max_lat REAL)'
+                )
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS scene_cells (cell_x INTEGER, cell_y INTEGER, scene_id TEXT, '
+                    'PRIMARY KEY (cell_x, cell_y, scene_id))'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS scenes_by_date ON scenes (collection, acquired_ms)')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS sync_state (collection TEXT PRIMARY KEY, synced_until_ms INTEGER, '
+                    'lease_owner TEXT, lease_expires REAL)'
+                )
+
+    @property
+    def enabled(self):
+        return bool(self.path and self.bounds)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _cells(self, bbox):
+        min_lon, min_lat, max_lon, max_lat = bbox
+        for x in range(int(min_lon // self.grid), int(max_lon // self.grid) + 1):
+            for y in range(int(min_lat // self.grid), int(max_lat // self.grid) + 1):
+                yield x, y
+
+    def _synced_until(self, conn, collection_type):
+        row = conn.execute('SELECT synced_until_ms FROM sync_state WHERE collection = ?', (collection_type,)).fetchone()
+        return row[0] if row and row[0] is not None else None
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def candidates(self, collection_type, roi, start_date, end_date):
+        """Ids das cenas da coleção que intersectam a ROI no período, menos nubladas primeiro.
+
+        Retorna None quando o catálogo não pode responder (desativado, ROI fora da região,
+        período fora da janela sincronizada ou geometria calculada no servidor).
+        """
+        if not self.enabled or collection_type not in OPTICAL_COLLECTIONS:
+            return None
+        self.ensure_sync_thread()
+        try:
+            bbox = geojson_bbox(roi.toGeoJSON())
+            start_ms, end_ms = date_to_millis(start_date), date_to_millis(end_date)
+        except Exception:
+            self._count('fallbacks')
+            return None
+        inside = bbox is not None and (self.bounds[0] <= bbox[0] and self.bounds[1] <= bbox[1]
+                                       and bbox[2] <= self.bounds[2] and bbox[3] <= self.bounds[3])
+        with self._connect() as conn:
+            synced_until = self._synced_until(conn, collection_type)
+            trusted_until = synced_until - SCENE_CATALOG_RESYNC_DAYS * 86400000 if synced_until else None
+            if not inside or trusted_until is None or start_ms < self.start_ms or end_ms > trusted_until:
+                self._count('fallbacks')
+                return None
+            cells = list(self._cells(bbox))
+            cell_filter = ' OR '.join('(c.cell_x = ? AND c.cell_y = ?)' for _ in cells)
+            params = [collection_type, start_ms, end_ms, bbox[2], bbox[0], bbox[3], bbox[1]]
+            params += [value for cell in cells for value in cell]
+            query = (
+                'SELECT DISTINCT s.scene_id, s.cloud FROM scenes s JOIN scene_cells c ON c.scene_id = s.scene_id '
+                'WHERE s.collection = ? AND s.acquired_ms >= ? AND s.acquired_ms < ? '
+                'AND s.min_lon <= ? AND s.max_lon >= ? AND s.min_lat <= ? AND s.max_lat >= ? '
+                f'AND ({cell_filter})'
+            )
+            if CLOUD_PREFILTER_ENABLED:
+                query += ' AND (s.cloud IS NULL OR s.cloud < ?)'
+                params.append(CLOUD_PREFILTER_MAX_SCENE_PERCENT)
+            rows = conn.execute(query + ' ORDER BY s.cloud', params).fetchall()
+        self._count('lookups')
+        return [row[0] for row in rows]
+
+    def is_empty_period(self, roi, start_date, end_date):
+        """True se o catálogo garante que nenhuma coleção óptica tem cenas para a ROI no período."""
+        empty = all(self.candidates(collection_type, roi, start_date, end_date) == []
+                    for collection_type in OPTICAL_COLLECTIONS)
+        if empty:
+            self._count('empty_periods')
+        return empty
+
+    def ensure_sync_thread(self):
+        """Inicia a sincronização em segundo plano neste processo (uma vez por PID, também após o fork)."""
+        if not self.enabled or self._sync_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sync_pid == os.getpid():
+                return
+            self._sync_pid = os.getpid()
+            threading.Thread(target=self._sync_loop, name='scene-catalog-sync', daemon=True).start()
+
+    def _sync_loop(self):
+        pid = os.getpid()
+        owner = f'{pid}:{uuid.uuid4().hex}'
+        while self._sync_pid == pid:
+            try:
+                gee_session.ensure_initialized()
+                for collection_type in OPTICAL_COLLECTIONS:
+                    self.sync_collection(collection_type, owner)
+                self._count('syncs')
+            except Exception as e:
+                with self._lock:
+                    self._stats['sync_errors'] += 1
+                    self._stats['last_sync_error'] = str(e)
+                print(f"⚠️ Falha na sincronização do catálogo de cenas: {e}")
+            time.sleep(SCENE_CATALOG_SYNC_INTERVAL_SECONDS)
+
+    def _acquire_lease(self, conn, collection_type, owner):
+        now = time.time()
+        conn.execute('INSERT OR IGNORE INTO sync_state (collection, synced_until_ms) VALUES (?, NULL)', (collection_type,))
+        cursor = conn.execute(
+            'UPDATE sync_state SET lease_owner = ?, lease_expires = ? WHERE collection = ? '
+            'AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires < ?)',
+            (owner, now + SCENE_CATALOG_LEASE_SECONDS, collection_type, owner, now)
+        )
+        return cursor.rowcount == 1
+
+    def _fetch_window(self, collection_type, start_ms, end_ms):
+        config = OPTICAL_COLLECTIONS[collection_type]
+        region = ee.Geometry.Rectangle(list(self.bounds))
+        collection = (ee.ImageCollection(config['id'])
+                      .filterBounds(region)
+                      .filter(ee.Filter.gte('system:time_start', start_ms))
+                      .filter(ee.Filter.lt('system:time_start', end_ms)))
+        features = ee.FeatureCollection(collection.map(lambda img: ee.Feature(img.geometry().bounds(), {
+            'scene_id': img.get('system:id'),
+            'acquired_ms': img.get('system:time_start'),
+            'cloud': img.get(config['cloud_property']),
+        })))
+        return ee_get_info(features, 'scene_catalog_sync', collection_type)['features']
+
+    def sync_collection(self, collection_type, owner):
+        """Sincroniza a coleção em janelas de SCENE_CATALOG_SYNC_WINDOW_DAYS, revisando a última semana."""
+        with self._connect() as conn:
+            if not self._acquire_lease(conn, collection_type, owner):
+                return
+            synced_until = self._synced_until(conn, collection_type)
+        now_ms = int(time.time() * 1000)
+        cursor_ms = max(self.start_ms, (synced_until or self.start_ms) - SCENE_CATALOG_RESYNC_DAYS * 86400000)
+        window_ms = SCENE_CATALOG_SYNC_WINDOW_DAYS * 86400000
+        while cursor_ms < now_ms:
+            window_end = min(cursor_ms + window_ms, now_ms)
+            features = self._fetch_window(collection_type, cursor_ms, window_end)
+            with self._connect() as conn:
+                for feature in features:
+                    properties = feature['properties']
+                    bbox = geojson_bbox(feature.get('geometry') or {})
+                    if not properties.get('scene_id') or bbox is None:
+                        continue
+                    conn.execute('INSERT OR REPLACE INTO scenes VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (
+                        properties['scene_id'], collection_type, properties.get('acquired_ms'),
+                        properties.get('cloud'), *bbox
+                    ))
+                    # Células só dentro da região sincronizada
+                    clipped = (max(bbox[0], self.bounds[0]), max(bbox[1], self.bounds[1]),
+                               min(bbox[2], self.bounds[2]), min(bbox[3], self.bounds[3]))
+                    conn.executemany('INSERT OR IGNORE INTO scene_cells VALUES (?, ?, ?)',
+                                     [(x, y, properties['scene_id']) for x, y in self._cells(clipped)])
+                conn.execute('UPDATE sync_state SET synced_until_ms = ?, lease_expires = ? WHERE collection = ?',
+                             (window_end, time.time() + SCENE_CATALOG_LEASE_SECONDS, collection_type))
+            cursor_ms = window_end
+
+    def stats(self):
+        stats = {'enabled': self.enabled}
+        if self.enabled:
+            with self._connect() as conn:
+                stats['scenes'] = dict(conn.execute('SELECT collection, COUNT(*) FROM scenes GROUP BY collection').fetchall())
+                stats['synced_until_ms'] = dict(conn.execute('SELECT collection, synced_until_ms FROM sync_state').fetchall())
+            with self._lock:
+                stats.update(self._stats)
+        return stats
+
+scene_catalog = SceneCatalog(SCENE_CATALOG_PATH, SCENE_CATALOG_BOUNDS, SCENE_CATALOG_START_DATE, SCENE_CATALOG_GRID_DEGREES)
+
 # Função para expandir o intervalo de datas
-def expand_date_range(start_date, end_date, roi, max_days=90, collection_type='sentinel'):
+def expand_date_range(start_date, end_date, roi, max_days=90, collection_type='sentinel',
+                      max_candidates=CLOUD_PREFILTER_MAX_CANDIDATES):
     collection = None
-    if collection_type == 'sentinel':
-        collection = (ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
-                      .filterBounds(roi)
-                      .filterDate(start_date, end_date)
-                      .map(lambda img: get_cloud_coverage_sentinel(img, roi))
-                      .filter(ee.Filter.lt('cloud_coverage_roi', 20))
-                      .map(apply_cloud_mask_sentinel))
-    elif collection_type == 'landsat':
-        collection = (ee.ImageCollection('LANDSAT/LC09/C02/T1_L2')
-                      .filterBounds(roi)
-                      .filterDate(start_date, end_date)
-                      .map(lambda img: get_landsat_cloud_coverage(img, roi))
-                      .filter(ee.Filter.lt('cloud_coverage_roi', 20))
-                      .map(apply_landsat_cloud_mask))
+    if collection_type in OPTICAL_COLLECTIONS:
+        config = OPTICAL_COLLECTIONS[collection_type]
+        candidate_ids = scene_catalog.candidates(collection_type, roi, start_date, end_date)
+        if candidate_ids is not None:
+            # Candidatas já resolvidas pelo catálogo local: coleção a partir da lista de ids, ainda
+            # restrita à ROI (o catálogo compara footprints aproximados)
+            collection = ee.ImageCollection([ee.Image(scene_id) for scene_id in candidate_ids]).filterBounds(roi)
+        else:
+            collection = (ee.ImageCollection(config['id'])
+                          .filterBounds(roi)
+                          .filterDate(start_date, end_date))
+        if CLOUD_PREFILTER_ENABLED:
+            collection = prefilter_candidates(collection, roi, config['cloud_property'], config['cloud_coverage'],
+                                              max_candidates)
+        # Cobertura exata na escala nativa apenas sobre as candidatas restantes
+        collection = (collection
+                      .map(lambda img: config['cloud_coverage'](img, roi))
+                      .filter(ee.Filter.lt('cloud_coverage_roi', ROI_MAX_CLOUD_PERCENT))
+                      .map(config['cloud_mask']))
     elif collection_type == 'chirps':
         collection = (ee.ImageCollection('UCSB-CHG/CHIRPS/DAILY')
                       .filterBounds(roi)
@@ -185,322 +1109,3011 @@ def extract_date_periods(data):
     
     return periods if periods else {'period_1': {'start_date': '2024-01-01', 'end_date': '2024-01-28'}}
 
+# Períodos de uma tarefa rodam como unidades independentes num pool próprio: as tarefas
+# do executor compartilhado que aguardam seus períodos nunca dependem de uma vaga nele.
+# O limite por requisição evita que um pedido com muitos períodos ocupe o pool inteiro;
+# as chamadas ao EE continuam limitadas por EE_MAX_CONCURRENT_CALLS.
+PERIOD_EXECUTOR_WORKERS = int(os.getenv('PERIOD_EXECUTOR_WORKERS', '16'))
+PERIOD_PARALLELISM_PER_REQUEST = int(os.getenv('PERIOD_PARALLELISM_PER_REQUEST', '4'))
 
-# >>> INÍCIO DAS FUNÇÕES LÓGICAS (NDVI) <<<
-def calculate_ndvi_logic(data):
+period_executor = ThreadPoolExecutor(max_workers=PERIOD_EXECUTOR_WORKERS, thread_name_prefix='gee-period')
+
+def period_parallelism(data):
+    """Períodos simultâneos por tarefa: `period_parallelism` do corpo, limitado ao padrão do servidor."""
+    requested = (data or {}).get('period_parallelism')
+    if requested is None:
+        return PERIOD_PARALLELISM_PER_REQUEST
     try:
-        roi = ee.Geometry.Polygon(data['roi']['coordinates'])
-        periods = extract_date_periods(data)
-        results = {}
+        return max(1, min(int(requested), PERIOD_PARALLELISM_PER_REQUEST))
+    except (TypeError, ValueError):
+        return PERIOD_PARALLELISM_PER_REQUEST
 
-        for period_name, dates in periods.items():
-            start_date = dates['start_date']
-            end_date = dates['end_date']
+def run_period(compute_period, dates):
+    """Um período isolado: a falha vira o resultado do próprio período, sem afetar os demais."""
+    try:
+        return compute_period(dates['start_date'], dates['end_date'])
+    except DeadlineExceeded:
+        return timed_out_result()
+    except Exception as e:
+        return {'error': str(e)}
 
-            collection = expand_date_range(start_date, end_date, roi, collection_type='sentinel')
-            best_image = collection.sort('cloud_coverage_roi').first()
-            satellite = 'sentinel'
-            scale = 10
-            
-            if not best_image: # Checa se a coleção não está vazia
-                 results[period_name] = {'error': 'Nenhuma imagem Sentinel encontrada, tentando Landsat.', 'satellite': 'none'}
-            else:
-                ndvi = best_image.normalizedDifference(['B8', 'B4']).rename('NDVI').clip(roi)
-                if not has_valid_pixels(ndvi, roi, scale).getInfo():
-                    best_image = None # Força a checagem do Landsat
-
-            if not best_image:
-                collection = expand_date_range(start_date, end_date, roi, collection_type='landsat')
-                best_image = collection.sort('cloud_coverage_roi').first()
-                satellite = 'landsat'
-                scale = 30
-                if not best_image:
-                    results[period_name] = {'error': 'Nenhuma imagem com pixels válidos na ROI', 'satellite': 'none'}
-                    continue
-                ndvi = best_image.normalizedDifference(['SR_B5', 'SR_B4']).rename('NDVI').clip(roi)
-                if not has_valid_pixels(ndvi, roi, scale).getInfo():
-                    results[period_name] = {'error': 'Nenhuma imagem com pixels válidos na ROI', 'satellite': 'none'}
-                    continue
+def run_periods(periods, compute_period, on_period=None, parallelism=1):
+    """Executa compute_period(start_date, end_date) para cada período.
 
-            stats = ndvi.reduceRegion(
-                reducer=ee.Reducer.mean().combine(reducer2=ee.Reducer.minMax(), sharedInputs=True),
-                geometry=roi, scale=scale, maxPixels=1e9, bestEffort=True
-            ).getInfo()
+    Com `parallelism` > 1, até esse número de períodos roda ao mesmo tempo no
+    `period_executor`; o resultado mantém a ordem dos períodos. A falha de um período
+    fica só na entrada dele (`{'error': ...}`). `on_period(period_name, result)` é
+    chamado assim que cada período termina, para acompanhamento de progresso (jobs)
+    e respostas em streaming.
 
-            results[period_name] = {
-                'ndvi_mean': stats.get('NDVI_mean'), 'ndvi_min': stats.get('NDVI_min'),
-                'ndvi_max': stats.get('NDVI_max'), 'satellite': satellite
-            }
+    Com prazo na requisição, os períodos que ainda não começaram quando ele se esgota
+    são pulados e os que estão em andamento deixam de ser aguardados; ambos voltam
+    como `timed_out`. Os demais mantêm seus resultados.
+    """
+    items = list(periods.items())
+    context = current_request.get()
+    has_deadline = context is not None and context.deadline is not None
+    results = {}
+
+    def finish(period_name, result):
+        results[period_name] = result
+        if on_period:
+            on_period(period_name, result)
+
+    if not has_deadline and (parallelism <= 1 or len(items) <= 1):
+        for period_name, dates in items:
+            finish(period_name, run_period(compute_period, dates))
         return results
-    except Exception as e:
-        return {'error': str(e)}
 
-def get_ndvi_tiles_logic(data):
-    try:
-        roi = ee.Geometry.Polygon(data['roi']['coordinates'])
-        periods = extract_date_periods(data)
-        vis_params = data.get('vis_params', {'min': 0, 'max': 0.8, 'palette': ['red', 'yellow', 'green']})
-        results = {}
+    # Com prazo, mesmo em série o período roda no pool para que a espera possa ser interrompida
+    pending = collections.deque(items)
+    running = {}
+    while pending or running:
+        while pending and len(running) < max(1, parallelism):
+            period_name, dates = pending.popleft()
+            if has_deadline and context.expired():
+                finish(period_name, timed_out_result())
+                continue
+            # Cada período herda o contexto da requisição (orçamento de tentativas, prazo, cliente)
+            future = period_executor.submit(contextvars.copy_context().run, run_period, compute_period, dates)
+            running[future] = period_name
+        if not running:
+            continue
+        done, _ = wait(running, timeout=context.remaining() if has_deadline else None, return_when=FIRST_COMPLETED)
+        if not done:
+            # Prazo esgotado: os períodos em andamento são abandonados; as chamadas seguintes
+            # ao EE deles falham de imediato em call_ee
+            for future, period_name in list(running.items()):
+                future.cancel()
+                finish(period_name, timed_out_result())
+            running.clear()
+            continue
+        for future in done:
+            finish(running.pop(future), future.result())
+    return {period_name: results[period_name] for period_name, _ in items}
 
-        for period_name, dates in periods.items():
-            start_date = dates['start_date']
-            end_date = dates['end_date']
 
-            collection = expand_date_range(start_date, end_date, roi, collection_type='sentinel')
-            best_image = collection.sort('cloud_coverage_roi').first()
-            satellite = 'sentinel'
-            scale = 10
+# >>> CACHE DE RESULTADOS (NDVI) <<<
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '2048'))
+# Camada em disco compartilhada pelos workers do nó; vazio desativa
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', '/tmp/gee_result_cache.sqlite3')
+RESULT_CACHE_CLOSED_TTL_SECONDS = int(os.getenv('RESULT_CACHE_CLOSED_TTL_SECONDS', str(30 * 24 * 3600)))
+RESULT_CACHE_OPEN_TTL_SECONDS = int(os.getenv('RESULT_CACHE_OPEN_TTL_SECONDS', '900'))
+# Cenas chegam às coleções alguns dias após a aquisição: até lá o período ainda é tratado como aberto
+RESULT_CACHE_INGEST_GRACE_DAYS = int(os.getenv('RESULT_CACHE_INGEST_GRACE_DAYS', '5'))
+ROI_HASH_PRECISION = int(os.getenv('ROI_HASH_PRECISION', '6'))
 
-            if not best_image:
-                best_image = None
-            else:
-                ndvi = best_image.normalizedDifference(['B8', 'B4']).rename('NDVI').clip(roi)
-                if not has_valid_pixels(ndvi, roi, scale).getInfo():
-                     best_image = None
-
-            if not best_image:
-                collection = expand_date_range(start_date, end_date, roi, collection_type='landsat')
-                best_image = collection.sort('cloud_coverage_roi').first()
-                satellite = 'landsat'
-                scale = 30
-                if not best_image:
-                    results[period_name] = {'error': 'Nenhuma imagem com pixels válidos na ROI', 'satellite': 'none'}
-                    continue
-                ndvi = best_image.normalizedDifference(['SR_B5', 'SR_B4']).rename('NDVI').clip(roi)
-                if not has_valid_pixels(ndvi, roi, scale).getInfo():
-                    results[period_name] = {'error': 'Nenhuma imagem com pixels válidos na ROI', 'satellite': 'none'}
-                    continue
+def canonical_ring(ring, clockwise, precision):
+    """Normaliza um anel: precisão fixa, sem o vértice de fechamento, orientação e vértice inicial fixos."""
+    points = [(round(float(p[0]), precision), round(float(p[1]), precision)) for p in ring]
+    if len(points) > 1 and points[0] == points[-1]:
+        points = points[:-1]
+    # Área com sinal (shoelace): positiva para anti-horário
+    area = sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]))
+    if (area < 0) != clockwise:
+        points.reverse()
+    if points:
+        start = points.index(min(points))
+        points = points[start:] + points[:start]
+    return points
 
-            map_id_dict = ndvi.getMapId(vis_params)
-            results[period_name] = {'tile_url': map_id_dict['tile_fetcher'].url_format, 'satellite': satellite}
-        return results
-    except Exception as e:
-        return {'error': str(e)}
+def roi_hash(coordinates, precision=None):
+    """Hash canônico de um polígono GeoJSON: mesmo resultado para a mesma área desenhada de outra forma.
+
+    O anel externo é orientado no sentido anti-horário e os buracos no horário (RFC 7946),
+    começando sempre pelo menor vértice.
+    """
+    precision = ROI_HASH_PRECISION if precision is None else precision
+    if not coordinates:
+        return None
+    rings = [canonical_ring(coordinates[0], clockwise=False, precision=precision)]
+    rings += sorted(canonical_ring(ring, clockwise=True, precision=precision) for ring in coordinates[1:])
+    return hashlib.sha256(json.dumps(rings).encode()).hexdigest()
 
-def get_image_tile_logic(data):
-    # Esta função permanece a mesma, pois ainda é usada pelo NDVI Composite
+def period_cache_ttl(end_date):
+    """TTL do resultado de um período: longo se ele já terminou (e as cenas foram ingeridas), curto caso contrário."""
     try:
-        roi = ee.Geometry.Polygon(data['roi']['coordinates'])
-        periods = extract_date_periods(data)
-        results = {}
-        for period_name, dates in periods.items():
-            start_date = dates['start_date']
-            end_date = dates['end_date']
-            collection = expand_date_range(start_date, end_date, roi, collection_type='sentinel')
-            best_image = collection.sort('cloud_coverage_roi').first()
-            satellite = 'sentinel'
-            scale = 10
-            bands = ['B4', 'B3', 'B2']
-            if not best_image or not has_valid_pixels(best_image.select(bands), roi, scale).getInfo():
-                collection = expand_date_range(start_date, end_date, roi, collection_type='landsat')
-                best_image = collection.sort('cloud_coverage_roi').first()
-                satellite = 'landsat'
-                scale = 30
-                bands = ['SR_B4', 'SR_B3', 'SR_B2']
-                if not best_image or not has_valid_pixels(best_image.select(bands), roi, scale).getInfo():
-                    results[period_name] = {'error': 'Nenhuma imagem com pixels válidos na ROI', 'satellite': 'none'}
-                    continue
-            best_image = best_image.clip(roi)
-            stats = best_image.select(bands).reduceRegion(reducer=ee.Reducer.percentile([15, 85]), geometry=roi, scale=scale, maxPixels=1e9, bestEffort=True).getInfo()
-            vis_params = {'bands': bands, 'min': [stats.get(f'{b}_p15', 300) for b in bands], 'max': [stats.get(f'{b}_p85', 1000) for b in bands], 'gamma': 1.3}
-            map_id_dict = best_image.getMapId(vis_params)
-            results[period_name] = {'tile_url': map_id_dict['tile_fetcher'].url_format, 'satellite': satellite}
-        return results
-    except Exception as e:
-        return {'error': str(e)}
+        end = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return RESULT_CACHE_OPEN_TTL_SECONDS
+    closed_until = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=RESULT_CACHE_INGEST_GRACE_DAYS)
+    return RESULT_CACHE_CLOSED_TTL_SECONDS if end < closed_until else RESULT_CACHE_OPEN_TTL_SECONDS
 
-# >>> INÍCIO DAS FUNÇÕES LÓGICAS CLIMÁTICAS OTIMIZADAS E CORRIGIDAS <<<
+class ResultCache:
+    """Cache de resultados em duas camadas: LRU em memória e SQLite em disco compartilhado pelos workers.
 
-def calculate_chirps_logic_optimized(data, point):
-    """Calcula estatísticas de precipitação para um ponto - VERSÃO OTIMIZADA E CORRIGIDA."""
-    try:
-        periods = extract_date_periods(data)
-        results = {}
-        scale = 5566  # Resolução nativa do CHIRPS
+    Só resultados calculados com sucesso são gravados; exceções nunca passam por set().
+    Acertos e falhas são contados por endpoint (rótulo do RequestContext).
+    """
 
-        for period_name, dates in periods.items():
-            start_date = dates['start_date']
-            end_date = dates['end_date']
-            
-            # Criar coleção diretamente sem cache problemático
-            collection = expand_date_range(start_date, end_date, point, collection_type='chirps')
+    def __init__(self, max_entries, path=None):
+        self.max_entries = max_entries
+        self.path = path or None
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = collections.defaultdict(lambda: {'memory_hits': 0, 'disk_hits': 0, 'misses': 0})
+        if self.path:
+            try:
+                with self._connect() as conn:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)')
+            except sqlite3.Error as e:
+                print(f"Cache em disco indisponível ({self.path}): {e}")
+                self.path = None
 
-            # Calcular estatísticas em uma única operação
-            precip_sum = collection.sum()
-            precip_mean = collection.mean()
-            
-            # Combinar em uma única imagem para uma única chamada getInfo()
-            combined_stats = ee.Image.cat([precip_sum, precip_mean]).rename(['precip_sum', 'precip_mean'])
-            
-            # Uma única chamada getInfo() em vez de duas
-            stats = combined_stats.reduceRegion(
-                reducer=ee.Reducer.first(), 
-                geometry=point, 
-                scale=scale,
-                maxPixels=1e9
-            ).getInfo()
-            
-            # Verificar se os valores existem antes de acessar
-            precip_sum_val = stats.get('precip_sum')
-            precip_mean_val = stats.get('precip_mean')
-            
-            results[period_name] = {
-                'precipitation_sum': precip_sum_val,
-                'precipitation_daily_mean': precip_mean_val,
-                'source': 'precipitation'
-            }
-        return results
-    except Exception as e:
-        return {'error': str(e)}
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
 
-def calculate_era5_temp_logic_optimized(data, point):
-    """Calcula estatísticas de temperatura (mín, máx, média) para um ponto - VERSÃO OTIMIZADA E CORRIGIDA."""
-    try:
-        periods = extract_date_periods(data)
-        results = {}
-        scale = 11132  # Resolução nativa do ERA5-Land
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
 
-        for period_name, dates in periods.items():
-            start_date = dates['start_date']
-            end_date = dates['end_date']
-            
-            # Criar coleção diretamente sem cache problemático
-            collection = expand_date_range(start_date, end_date, point, collection_type='era5_temp')
+    def _count(self, field):
+        with self._lock:
+            self._stats[get_request_context().endpoint][field] += 1
 
-            # Calcular min, max e mean em uma única operação
-            temp_min_k = collection.min()
-            temp_max_k = collection.max()
-            temp_mean_k = collection.mean()
-            
-            # Combinar em uma única imagem para uma única chamada getInfo()
-            stats_image_k = ee.Image.cat([temp_min_k, temp_mean_k, temp_max_k]).rename(['temp_min_k', 'temp_mean_k', 'temp_max_k'])
-            
-            # Uma única chamada getInfo() em vez de múltiplas
-            temp_stats_k = stats_image_k.reduceRegion(
-                reducer=ee.Reducer.first(), 
-                geometry=point, 
-                scale=scale,
-                maxPixels=1e9
-            ).getInfo()
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
-            # Verificar se os valores existem antes de converter
-            temp_min_val = temp_stats_k.get('temp_min_k')
-            temp_mean_val = temp_stats_k.get('temp_mean_k')
-            temp_max_val = temp_stats_k.get('temp_max_k')
-            
-            # Converter de Kelvin para Celsius apenas se os valores existirem
-            results[period_name] = {
-                'temperature_min_celsius': temp_min_val - 273.15 if temp_min_val is not None else None,
-                'temperature_mean_celsius': temp_mean_val - 273.15 if temp_mean_val is not None else None,
-                'temperature_max_celsius': temp_max_val - 273.15 if temp_max_val is not None else None,
-                'source': 'temperature'
-            }
-        return results
-    except Exception as e:
-        return {'error': str(e)}
+    def get(self, key):
+        """Devolve uma cópia do valor em cache, ou None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            self._count('memory_hits')
+            return copy.deepcopy(entry[0])
 
-# Função genérica para executar tarefas em paralelo e unificar resultados
-def run_composite_tasks(data, tasks_to_run, point=None):
-    unified_results = {}
-    with ThreadPoolExecutor(max_workers=len(tasks_to_run)) as executor:
-        if point:
-            future_to_task = {executor.submit(task[0], data, point): task[1] for task in tasks_to_run}
-        else:
-            future_to_task = {executor.submit(task[0], data): task[1] for task in tasks_to_run}
-        
-        for future in as_completed(future_to_task):
-            task_name = future_to_task[future]
+        if self.path:
             try:
-                unified_results[task_name] = future.result()
-            except Exception as e:
-                unified_results[task_name] = {'error': str(e)}
-    return unified_results
+                with self._connect() as conn:
+                    row = conn.execute('SELECT value, expires_at FROM results WHERE key = ? AND expires_at > ?', (key, now)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self._count('disk_hits')
+                return copy.deepcopy(value)
 
+        self._count('misses')
+        return None
 
-# >>> AUTENTICAÇÃO POR API KEY <<<
-def require_api_key(func):
-    """Decorator para exigir API Key no cabeçalho X-API-Key.
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        self._remember(key, copy.deepcopy(value), expires_at)
+        if self.path:
+            try:
+                with self._connect() as conn:
+                    conn.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+                    conn.execute('INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)',
+                                 (key, json.dumps(value), expires_at))
+            except sqlite3.Error as e:
+                print(f"Falha ao gravar no cache em disco: {e}")
 
-    Valida a chave contra a lista em ALLOWED_API_KEYS (separadas por vírgula).
-    Retorna 401 em caso de ausência ou chave inválida.
-    """
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        allowed_keys_env = os.getenv('ALLOWED_API_KEYS', '')
-        allowed_keys = {key.strip() for key in allowed_keys_env.split(',') if key.strip()}
-        provided_key = request.headers.get('X-API-Key')
+    def get_or_compute(self, key, compute, ttl):
+        """Devolve o valor em cache ou calcula, grava e devolve. Desativado com RESULT_CACHE_ENABLED=false."""
+        if not RESULT_CACHE_ENABLED:
+            return compute()
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value, ttl)
+        return value
 
-        if not provided_key:
-            return jsonify({'error': 'API key ausente. Envie em X-API-Key'}), 401
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': RESULT_CACHE_ENABLED,
+                'memory_entries': len(self._entries),
+                'disk': bool(self.path),
+                'endpoints': {endpoint: dict(counts) for endpoint, counts in self._stats.items()},
+            }
 
-        if not allowed_keys or provided_key not in allowed_keys:
-            return jsonify({'error': 'API key inválida ou não autorizada'}), 401
+ndvi_result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_PATH)
 
-        return func(*args, **kwargs)
+# Identifica as coleções, a lógica de seleção de cenas e os limiares de nuvens na chave do cache:
+# mudar os limiares muda a cena escolhida, então resultados antigos não podem ser reaproveitados
+SCENE_SELECTION_THRESHOLDS = (
+    f'prefilter={CLOUD_PREFILTER_ENABLED},{CLOUD_PREFILTER_MAX_SCENE_PERCENT:g},{CLOUD_PREFILTER_COARSE_SCALE},'
+    f'{CLOUD_PREFILTER_MAX_COARSE_PERCENT:g},{CLOUD_PREFILTER_MAX_CANDIDATES}|roi_max_cloud={ROI_MAX_CLOUD_PERCENT:g}'
+)
+NDVI_STATS_CACHE_NAMESPACE = f'ndvi_stats:COPERNICUS/S2_SR_HARMONIZED|LANDSAT/LC09/C02/T1_L2:v2:{SCENE_SELECTION_THRESHOLDS}'
 
-    return wrapper
+def ndvi_stats_cache_key(roi_key, start_date, end_date):
+    return ResultCache.make_key(NDVI_STATS_CACHE_NAMESPACE, roi_key, start_date, end_date)
 
-# >>> ENDPOINTS DA API <<<
+# >>> CACHE DE CENAS E URLS DE TILES <<<
+TILE_CACHE_MAX_ENTRIES = int(os.getenv('TILE_CACHE_MAX_ENTRIES', '2048'))
+# Vida de um map id do EE e a folga antes dela em que a URL deixa de ser reutilizada
+TILE_MAP_ID_LIFETIME_SECONDS = int(os.getenv('TILE_MAP_ID_LIFETIME_SECONDS', '14400'))
+TILE_URL_EXPIRY_MARGIN_SECONDS = int(os.getenv('TILE_URL_EXPIRY_MARGIN_SECONDS', '900'))
+TILE_URL_TTL_SECONDS = max(TILE_MAP_ID_LIFETIME_SECONDS - TILE_URL_EXPIRY_MARGIN_SECONDS, 0)
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Endpoint para verificar saúde da aplicação e projeto GEE.
-    ---
-    tags:
+# Cena escolhida por (ROI, período) e URL de tiles por (cena, ROI, vis_params)
+tile_cache = ResultCache(TILE_CACHE_MAX_ENTRIES, RESULT_CACHE_PATH)
+
+def scene_cache_key(roi_key, start_date, end_date):
+    return ResultCache.make_key('scene', NDVI_STATS_CACHE_NAMESPACE, roi_key, start_date, end_date)
+
+def tile_url_cache_key(scene_id, roi_key, vis_params):
+    return ResultCache.make_key('tile_url', scene_id, roi_key, vis_params)
+
+
+# >>> INÍCIO DAS FUNÇÕES LÓGICAS (NDVI) <<<
+
+# Bandas (NDVI e RGB) e escala de cada satélite
+NDVI_SATELLITES = {
+    'sentinel': {'bands': ['B8', 'B4'], 'rgb_bands': ['B4', 'B3', 'B2'], 'scale': 10},
+    'landsat': {'bands': ['SR_B5', 'SR_B4'], 'rgb_bands': ['SR_B4', 'SR_B3', 'SR_B2'], 'scale': 30},
+}
+
+def body_flag(data, name, default):
+    """Flag booleana do corpo com o mesmo critério das variáveis de ambiente ("false" e "0" desligam)."""
+    return str((data or {}).get(name, default)).lower() in ('1', 'true', 'yes')
+
+def use_single_roundtrip(data):
+    """Indica se o NDVI deve ser resolvido em um único getInfo() por requisição."""
+    return body_flag(data, 'single_roundtrip', os.getenv('NDVI_SINGLE_ROUNDTRIP', 'false'))
+
+def build_ndvi_candidate_stats(roi, start_date, end_date, satellite):
+    """Monta (sem executar) as estatísticas de NDVI da melhor imagem de um satélite.
+
+    A contagem de pixels válidos vem no mesmo redutor das estatísticas (NDVI_count),
+    substituindo a chamada separada a has_valid_pixels().
+    """
+    config = NDVI_SATELLITES[satellite]
+    collection = expand_date_range(start_date, end_date, roi, collection_type=satellite)
+    best_image = ee.Image(collection.sort('cloud_coverage_roi').first())
+    ndvi = best_image.normalizedDifference(config['bands']).rename('NDVI').clip(roi)
+    reducer = (ee.Reducer.mean()
+               .combine(reducer2=ee.Reducer.minMax(), sharedInputs=True)
+               .combine(reducer2=ee.Reducer.count(), sharedInputs=True))
+    stats = ndvi.reduceRegion(
+        reducer=reducer, geometry=roi, scale=config['scale'], maxPixels=1e9, bestEffort=True
+    )
+    return ee.Dictionary(ee.Algorithms.If(
+        collection.size().gt(0),
+        stats.set('satellite', satellite).set('scene_id', best_image.get('system:id')),
+        ee.Dictionary({'NDVI_count': 0, 'satellite': satellite})
+    ))
+
+def build_ndvi_period_graph(roi, start_date, end_date):
+    """Monta o grafo server-side de um período com a escolha Sentinel/Landsat via ee.Algorithms.If."""
+    sentinel = build_ndvi_candidate_stats(roi, start_date, end_date, 'sentinel')
+    landsat = build_ndvi_candidate_stats(roi, start_date, end_date, 'landsat')
+    return ee.Algorithms.If(
+        ee.Number(sentinel.get('NDVI_count', 0)).gt(0),
+        sentinel,
+        ee.Algorithms.If(
+            ee.Number(landsat.get('NDVI_count', 0)).gt(0),
+            landsat,
+            ee.Dictionary({'NDVI_count': 0, 'satellite': 'none'})
+        )
+    )
+
+def format_ndvi_period_stats(stats):
+    """Converte o dicionário retornado pelo grafo no formato de resposta de calculate_ndvi_logic."""
+    if not stats or stats.get('satellite') == 'none' or not stats.get('NDVI_count'):
+        return {'error': 'Nenhuma imagem com pixels válidos na ROI', 'satellite': 'none'}
+    return {
+        'ndvi_mean': stats.get('NDVI_mean'), 'ndvi_min': stats.get('NDVI_min'),
+        'ndvi_max': stats.get('NDVI_max'), 'satellite': stats.get('satellite')
+    }
+
+def calculate_ndvi_logic_single_roundtrip(data, on_period=None):
+    """Calcula o NDVI de todos os períodos com uma única chamada getInfo()."""
+    try:
+        roi = ee.Geometry.Polygon(data['roi']['coordinates'])
+        roi_key = roi_hash(data['roi']['coordinates'])
+        periods = extract_date_periods(data)
+        cache_keys = {
+            period_name: ndvi_stats_cache_key(roi_key, dates['start_date'], dates['end_date'])
+            for period_name, dates in periods.items()
+        }
+        cached = {}
+        if RESULT_CACHE_ENABLED:
+            for period_name, key in cache_keys.items():
+                value = ndvi_result_cache.get(key)
+                if value is not None:
+                    cached[period_name] = value
+
+        # Períodos sem nenhuma cena no catálogo local são respondidos sem o EE
+        for period_name, dates in periods.items():
+            if period_name not in cached and scene_catalog.is_empty_period(roi, dates['start_date'], dates['end_date']):
+                cached[period_name] = dict(NO_VALID_SCENE_RESULT)
+
+        # Só os períodos fora do cache entram no grafo; se todos estiverem em cache, não há chamada ao EE
+        missing = {name: dates for name, dates in periods.items() if name not in cached}
+        all_stats = {}
+        if missing:
+            graph = ee.Dictionary({
+                period_name: build_ndvi_period_graph(roi, dates['start_date'], dates['end_date'])
+                for period_name, dates in missing.items()
+            })
+            try:
+                all_stats = ee_get_info(graph, 'ndvi_period_graph')
+            except DeadlineExceeded:
+                # Os períodos em cache continuam na resposta
+                all_stats = None
+
+        results = {}
+        for period_name, dates in periods.items():
+            if period_name in cached:
+                results[period_name] = cached[period_name]
+            elif all_stats is None:
+                results[period_name] = timed_out_result()
+            else:
+                results[period_name] = format_ndvi_period_stats(all_stats.get(period_name))
+                record_scene_selection(results[period_name]['satellite'])
+                if RESULT_CACHE_ENABLED:
+                    ndvi_result_cache.set(cache_keys[period_name], results[period_name], period_cache_ttl(dates['end_date']))
+            if on_period:
+                on_period(period_name, results[period_name])
+        return results
+    except Exception as e:
+        return {'error': str(e)}
+
+# >>> SELEÇÃO DE CENAS COMPARTILHADA <<<
+
+# Seleção especulativa: a verificação do Landsat começa junto com a do Sentinel-2 em vez de
+# esperar a falha dele. Pool próprio: as tarefas do executor compartilhado que aguardam o
+# Landsat nunca dependem de uma vaga nele mesmo.
+SCENE_HEDGED_SELECTION = os.getenv('SCENE_HEDGED_SELECTION', 'false').lower() in ('1', 'true', 'yes')
+SCENE_HEDGE_WORKERS = int(os.getenv('SCENE_HEDGE_WORKERS', '4'))
+
+hedge_executor = ThreadPoolExecutor(max_workers=SCENE_HEDGE_WORKERS, thread_name_prefix='gee-hedge')
+metrics.describe('gee_scene_hedge_total', 'counter',
+                 'Seleções especulativas por desfecho (landsat_won, sentinel_cancelled, sentinel_wasted, none)')
+metrics.describe('gee_scene_hedge_saved_seconds', 'histogram',
+                 'Tempo economizado quando o Landsat especulativo foi usado')
+
+def use_hedged_selection(data):
+    """Seleção especulativa pedida no corpo (`hedged_selection`) ou o padrão do servidor."""
+    return body_flag(data, 'hedged_selection', SCENE_HEDGED_SELECTION)
+
+def check_candidate(roi, start_date, end_date, satellite):
+    """Melhor cena de um satélite no período, ou None se ela não tiver pixels válidos na ROI."""
+    config = NDVI_SATELLITES[satellite]
+    # Sem cenas no catálogo local: nada a verificar no EE
+    if scene_catalog.candidates(satellite, roi, start_date, end_date) == []:
+        return None
+    collection = expand_date_range(start_date, end_date, roi, collection_type=satellite)
+    best_image = collection.sort('cloud_coverage_roi').first()
+    ndvi = best_image.normalizedDifference(config['bands']).rename('NDVI').clip(roi)
+    # O id da cena vem junto com a verificação de pixels válidos, sem chamada extra
+    check = ee_get_info(ee.Dictionary({
+        'valid': has_valid_pixels(ndvi, roi, config['scale']),
+        'scene_id': best_image.get('system:id'),
+    }), 'validity_check', satellite)
+    if not check.get('valid'):
+        return None
+    return {
+        'image': best_image,
+        'ndvi': ndvi,
+        'satellite': satellite,
+        'scale': config['scale'],
+        'scene_id': check.get('scene_id'),
+    }
+
+def timed_check_candidate(roi, start_date, end_date, satellite):
+    started = time.perf_counter()
+    return check_candidate(roi, start_date, end_date, satellite), time.perf_counter() - started
+
+def select_scene(roi, start_date, end_date, hedged=False):
+    """Escolhe a melhor cena do período: Sentinel-2 com fallback para Landsat.
+
+    Retorna um dicionário com a imagem escolhida, o NDVI recortado na ROI, o satélite
+    e a escala, ou None se nenhuma imagem tiver pixels válidos na ROI. Com `hedged`, o
+    Landsat é verificado em paralelo e descartado (ou cancelado, se ainda não começou)
+    quando o Sentinel-2 é válido; o resultado é o mesmo da seleção em série.
+    """
+    if not hedged:
+        return check_candidate(roi, start_date, end_date, 'sentinel') or check_candidate(roi, start_date, end_date, 'landsat')
+
+    landsat_future = hedge_executor.submit(
+        contextvars.copy_context().run, timed_check_candidate, roi, start_date, end_date, 'landsat'
+    )
+    try:
+        sentinel, sentinel_seconds = timed_check_candidate(roi, start_date, end_date, 'sentinel')
+    except Exception:
+        landsat_future.cancel()
+        raise
+    if sentinel is not None:
+        outcome = 'sentinel_cancelled' if landsat_future.cancel() else 'sentinel_wasted'
+        metrics.inc('gee_scene_hedge_total', {'outcome': outcome})
+        return sentinel
+
+    landsat, landsat_seconds = landsat_future.result()
+    if landsat is None:
+        metrics.inc('gee_scene_hedge_total', {'outcome': 'none'})
+        return None
+    # Em série, o Landsat só começaria depois do Sentinel-2: a sobreposição é o ganho
+    metrics.inc('gee_scene_hedge_total', {'outcome': 'landsat_won'})
+    metrics.observe('gee_scene_hedge_saved_seconds', min(sentinel_seconds, landsat_seconds))
+    return landsat
+
+def scene_from_id(scene_id, satellite, roi):
+    """Reconstrói a cena escolhida a partir do id em cache, com a mesma máscara de nuvens, sem chamar o EE."""
+    config = NDVI_SATELLITES[satellite]
+    image = OPTICAL_COLLECTIONS[satellite]['cloud_mask'](ee.Image(scene_id))
+    return {
+        'image': image,
+        'ndvi': image.normalizedDifference(config['bands']).rename('NDVI').clip(roi),
+        'satellite': satellite,
+        'scale': config['scale'],
+        'scene_id': scene_id,
+    }
+
+class SceneSelector:
+    """Seleção de cenas feita uma única vez por (ROI, período) e compartilhada entre tarefas.
+
+    As tarefas de /ndvi_composite rodam em paralelo; quem pede um período primeiro
+    executa a seleção e as demais aguardam o mesmo resultado. Com `roi_key`, a cena
+    escolhida (id e satélite) também vai para o tile_cache e é reaproveitada entre requisições.
+    `hedged` ativa a seleção especulativa (ver select_scene).
+    """
+
+    def __init__(self, roi, roi_key=None, hedged=False):
+        self.roi = roi
+        self.roi_key = roi_key
+        self.hedged = hedged
+        self._lock = threading.Lock()
+        self._selections = {}
+
+    def _select_from_ee(self, start_date, end_date):
+        with stage_timer('scene_selection'):
+            scene = select_scene(self.roi, start_date, end_date, self.hedged)
+        record_scene_selection(scene['satellite'] if scene else 'none')
+        return scene
+
+    def _select(self, start_date, end_date):
+        if not self.roi_key or not RESULT_CACHE_ENABLED:
+            return self._select_from_ee(start_date, end_date)
+        key = scene_cache_key(self.roi_key, start_date, end_date)
+        cached = tile_cache.get(key)
+        if cached is not None:
+            if cached['scene_id'] is None:
+                return None
+            return scene_from_id(cached['scene_id'], cached['satellite'], self.roi)
+        scene = self._select_from_ee(start_date, end_date)
+        if scene is None:
+            tile_cache.set(key, {'scene_id': None, 'satellite': 'none'}, period_cache_ttl(end_date))
+        elif scene.get('scene_id'):
+            tile_cache.set(key, {'scene_id': scene['scene_id'], 'satellite': scene['satellite']}, period_cache_ttl(end_date))
+        return scene
+
+    def select(self, start_date, end_date):
+        key = (start_date, end_date)
+        with self._lock:
+            future = self._selections.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._selections[key] = Future()
+        if is_owner:
+            try:
+                future.set_result(self._select(start_date, end_date))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+NO_VALID_SCENE_RESULT = {'error': 'Nenhuma imagem com pixels válidos na ROI', 'satellite': 'none'}
+DEFAULT_NDVI_VIS_PARAMS = {'min': 0, 'max': 0.8, 'palette': ['red', 'yellow', 'green']}
+
+def calculate_ndvi_logic(data, scene_selector=None, on_period=None):
+    if use_single_roundtrip(data):
+        return calculate_ndvi_logic_single_roundtrip(data, on_period)
+    try:
+        roi = ee.Geometry.Polygon(data['roi']['coordinates'])
+        roi_key = roi_hash(data['roi']['coordinates'])
+        periods = extract_date_periods(data)
+        selector = scene_selector or SceneSelector(roi, roi_key, use_hedged_selection(data))
+
+        def compute_stats(start_date, end_date):
+            scene = selector.select(start_date, end_date)
+            if scene is None:
+                return dict(NO_VALID_SCENE_RESULT)
+
+            stats = ee_get_info(scene['ndvi'].reduceRegion(
+                reducer=ee.Reducer.mean().combine(reducer2=ee.Reducer.minMax(), sharedInputs=True),
+                geometry=roi, scale=scene['scale'], maxPixels=1e9, bestEffort=True
+            ), 'ndvi_reduction', scene['satellite'])
+
+            return {
+                'ndvi_mean': stats.get('NDVI_mean'), 'ndvi_min': stats.get('NDVI_min'),
+                'ndvi_max': stats.get('NDVI_max'), 'satellite': scene['satellite']
+            }
+
+        def compute_period(start_date, end_date):
+            return ndvi_result_cache.get_or_compute(
+                ndvi_stats_cache_key(roi_key, start_date, end_date),
+                partial(compute_stats, start_date, end_date),
+                period_cache_ttl(end_date),
+            )
+
+        return run_periods(periods, compute_period, on_period, period_parallelism(data))
+    except Exception as e:
+        return {'error': str(e)}
+
+def public_tile_url(tile_url, scene_id, roi_key, vis_params):
+    """URL de tiles entregue ao cliente: a do EE, ou a do proxy com TILE_PROXY_ENABLED."""
+    if not TILE_PROXY_ENABLED:
+        return tile_url
+    # Chave estável por cena/ROI/paleta: os tiles em disco sobrevivem à renovação do map id
+    map_key = (tile_url_cache_key(scene_id, roi_key, vis_params) if scene_id
+               else hashlib.sha256(tile_url.encode()).hexdigest())[:32]
+    return tile_proxy.register(map_key, tile_url)
+
+def get_ndvi_tiles_logic(data, scene_selector=None, on_period=None):
+    try:
+        roi = ee.Geometry.Polygon(data['roi']['coordinates'])
+        roi_key = roi_hash(data['roi']['coordinates'])
+        periods = extract_date_periods(data)
+        vis_params = data.get('vis_params', DEFAULT_NDVI_VIS_PARAMS)
+        selector = scene_selector or SceneSelector(roi, roi_key, use_hedged_selection(data))
+
+        def create_tile_url(scene):
+            return ee_get_map_id(scene['ndvi'], vis_params, scene['satellite'])['tile_fetcher'].url_format
+
+        def compute_period(start_date, end_date):
+            scene = selector.select(start_date, end_date)
+            if scene is None:
+                return dict(NO_VALID_SCENE_RESULT)
+
+            # Mesma cena, ROI e paleta reaproveitam o map id até pouco antes de ele expirar
+            if scene.get('scene_id') and TILE_URL_TTL_SECONDS > 0:
+                tile_url = tile_cache.get_or_compute(
+                    tile_url_cache_key(scene['scene_id'], roi_key, vis_params),
+                    partial(create_tile_url, scene),
+                    TILE_URL_TTL_SECONDS,
+                )
+            else:
+                tile_url = create_tile_url(scene)
+            return {'tile_url': public_tile_url(tile_url, scene.get('scene_id'), roi_key, vis_params),
+                    'satellite': scene['satellite']}
+
+        return run_periods(periods, compute_period, on_period, period_parallelism(data))
+    except Exception as e:
+        return {'error': str(e)}
+
+def get_image_tile_logic(data, scene_selector=None, on_period=None):
+    # Usa a mesma seleção de cenas do NDVI, trocando apenas as bandas para RGB
+    try:
+        roi = ee.Geometry.Polygon(data['roi']['coordinates'])
+        periods = extract_date_periods(data)
+        selector = scene_selector or SceneSelector(roi, roi_hash(data['roi']['coordinates']), use_hedged_selection(data))
+
+        def compute_period(start_date, end_date):
+            scene = selector.select(start_date, end_date)
+            if scene is None:
+                return dict(NO_VALID_SCENE_RESULT)
+            bands = NDVI_SATELLITES[scene['satellite']]['rgb_bands']
+            best_image = scene['image'].clip(roi)
+            stats = ee_get_info(best_image.select(bands).reduceRegion(reducer=ee.Reducer.percentile([15, 85]), geometry=roi, scale=scene['scale'], maxPixels=1e9, bestEffort=True), 'rgb_percentiles', scene['satellite'])
+            vis_params = {'bands': bands, 'min': [stats.get(f'{b}_p15', 300) for b in bands], 'max': [stats.get(f'{b}_p85', 1000) for b in bands], 'gamma': 1.3}
+            map_id_dict = ee_get_map_id(best_image, vis_params, scene['satellite'])
+            return {'tile_url': map_id_dict['tile_fetcher'].url_format, 'satellite': scene['satellite']}
+
+        return run_periods(periods, compute_period, on_period, period_parallelism(data))
+    except Exception as e:
+        return {'error': str(e)}
+
+# >>> LOTE DE TALHÕES (NDVI) <<<
+
+# Talhões por getInfo(); cada talhão carrega sua própria seleção de cenas no grafo
+NDVI_BATCH_CHUNK_SIZE = int(os.getenv('NDVI_BATCH_CHUNK_SIZE', '50'))
+NDVI_BATCH_MAX_FIELDS = int(os.getenv('NDVI_BATCH_MAX_FIELDS', '5000'))
+
+def build_ndvi_batch_graph(features, periods):
+    """Mapeia, server-side, a seleção de cenas e as estatísticas de NDVI sobre cada talhão."""
+    def field_stats(feature):
+        geometry = feature.geometry()
+        stats = {
+            period_name: build_ndvi_period_graph(geometry, dates['start_date'], dates['end_date'])
+            for period_name, dates in periods.items()
+        }
+        return ee.Feature(None, {'field_id': feature.get('field_id'), 'ndvi': ee.Dictionary(stats)})
+    return features.map(field_stats)
+
+def iter_ndvi_batch_results(data, fields):
+    """Gera o resultado de cada talhão assim que o bloco em que ele está é calculado."""
+    periods = extract_date_periods(data)
+
+    def compute_chunk(chunk):
+        features = ee.FeatureCollection([
+            ee.Feature(ee.Geometry(geometry), {'field_id': field_id}) for field_id, geometry in chunk
+        ])
+        return ee_get_info(build_ndvi_batch_graph(features, periods), 'ndvi_batch_reduction')
+
+    for chunk in chunked(fields, NDVI_BATCH_CHUNK_SIZE):
+        try:
+            # A resposta já começou (streaming): espera vaga no executor em vez de falhar
+            chunk_stats = run_on_ee_executor(compute_chunk, chunk, block=True)
+        except Exception as e:
+            for field_id, _ in chunk:
+                yield {'field_id': field_id, 'error': str(e)}
+            continue
+
+        for feature in chunk_stats['features']:
+            properties = feature['properties']
+            stats = properties.get('ndvi') or {}
+            yield {
+                'field_id': properties['field_id'],
+                'ndvi': {period_name: format_ndvi_period_stats(stats.get(period_name)) for period_name in periods}
+            }
+
+# >>> SÉRIE TEMPORAL DE NDVI <<<
+
+# Dias por getInfo() (intervalos maiores são divididos) e intervalo máximo por requisição
+NDVI_TIMESERIES_CHUNK_DAYS = int(os.getenv('NDVI_TIMESERIES_CHUNK_DAYS', '366'))
+NDVI_TIMESERIES_MAX_DAYS = int(os.getenv('NDVI_TIMESERIES_MAX_DAYS', '3660'))
+
+def date_chunks(start_date, end_date, chunk_days):
+    """Divide [start_date, end_date) em intervalos consecutivos de até chunk_days dias."""
+    start = datetime.date.fromisoformat(start_date)
+    end = datetime.date.fromisoformat(end_date)
+    chunks = []
+    while start < end:
+        chunk_end = min(start + datetime.timedelta(days=chunk_days), end)
+        chunks.append((start.isoformat(), chunk_end.isoformat()))
+        start = chunk_end
+    return chunks
+
+def build_ndvi_timeseries_graph(roi, start_date, end_date, satellites):
+    """Mapeia, server-side, a redução de NDVI sobre todas as cenas limpas do intervalo.
+
+    Cada cena vira uma feição com data, satélite, estatísticas de NDVI e fração de pixels
+    válidos na ROI; cenas sem pixels válidos são descartadas.
+    """
+    reducer = (ee.Reducer.mean()
+               .combine(reducer2=ee.Reducer.minMax(), sharedInputs=True)
+               .combine(reducer2=ee.Reducer.count(), sharedInputs=True))
+    series = None
+    for satellite in satellites:
+        config = NDVI_SATELLITES[satellite]
+        collection = expand_date_range(start_date, end_date, roi, collection_type=satellite, max_candidates=None)
+
+        def scene_stats(image, satellite=satellite, config=config):
+            ndvi = image.normalizedDifference(config['bands']).rename('NDVI').clip(roi)
+            valid = ndvi.mask().unmask(0).rename('valid')
+            stats = ndvi.addBands(valid).reduceRegion(
+                reducer=reducer, geometry=roi, scale=config['scale'], maxPixels=1e9, bestEffort=True
+            )
+            return ee.Feature(None, {
+                'time_start': image.get('system:time_start'),
+                'scene_id': image.get('system:id'),
+                'satellite': satellite,
+                'cloud_coverage_roi': image.get('cloud_coverage_roi'),
+                'ndvi_mean': stats.get('NDVI_mean'),
+                'ndvi_min': stats.get('NDVI_min'),
+                'ndvi_max': stats.get('NDVI_max'),
+                'valid_pixel_count': stats.get('NDVI_count'),
+                'valid_pixel_fraction': stats.get('valid_mean'),
+            })
+
+        features = ee.FeatureCollection(collection.map(scene_stats)).filter(ee.Filter.gt('valid_pixel_count', 0))
+        series = features if series is None else series.merge(features)
+    return series
+
+def format_timeseries_feature(properties):
+    time_start = properties.get('time_start')
+    date = None
+    if time_start is not None:
+        date = datetime.datetime.fromtimestamp(time_start / 1000, tz=datetime.timezone.utc).date().isoformat()
+    return {
+        'date': date,
+        'satellite': properties.get('satellite'),
+        'scene_id': properties.get('scene_id'),
+        'ndvi_mean': properties.get('ndvi_mean'),
+        'ndvi_min': properties.get('ndvi_min'),
+        'ndvi_max': properties.get('ndvi_max'),
+        'valid_pixel_fraction': properties.get('valid_pixel_fraction'),
+        'cloud_coverage_roi': properties.get('cloud_coverage_roi'),
+    }
+
+def calculate_ndvi_timeseries(data):
+    """Série temporal de NDVI: uma chamada getInfo() por bloco de NDVI_TIMESERIES_CHUNK_DAYS dias."""
+    roi = ee.Geometry.Polygon(data['roi']['coordinates'])
+    satellites = data.get('satellites') or list(NDVI_SATELLITES)
+    series = []
+    chunks = date_chunks(data['start_date'], data['end_date'], NDVI_TIMESERIES_CHUNK_DAYS)
+    for chunk_start, chunk_end in chunks:
+        graph = build_ndvi_timeseries_graph(roi, chunk_start, chunk_end, satellites)
+        result = ee_get_info(graph, 'ndvi_timeseries')
+        series.extend(format_timeseries_feature(f['properties']) for f in result['features'])
+    series.sort(key=lambda item: (item['date'] or '', item['satellite'] or ''))
+    return {'series': series, 'scene_count': len(series), 'chunks': len(chunks)}
+
+def validate_ndvi_timeseries_request(data):
+    """Retorna a mensagem de erro de validação do corpo de /ndvi_timeseries, ou None."""
+    error = validate_ndvi_request(data)
+    if error:
+        return error
+    try:
+        start = datetime.date.fromisoformat(data.get('start_date') or '')
+        end = datetime.date.fromisoformat(data.get('end_date') or '')
+    except (TypeError, ValueError):
+        return 'start_date e end_date devem estar no formato YYYY-MM-DD'
+    if end <= start:
+        return 'end_date deve ser posterior a start_date'
+    if (end - start).days > NDVI_TIMESERIES_MAX_DAYS:
+        return f'Intervalo máximo de {NDVI_TIMESERIES_MAX_DAYS} dias'
+    satellites = data.get('satellites')
+    if satellites is not None and (not isinstance(satellites, list) or not satellites
+                                   or any(s not in NDVI_SATELLITES for s in satellites)):
+        return f'satellites deve ser uma lista com valores em {sorted(NDVI_SATELLITES)}'
+    return None
+
+# >>> INÍCIO DAS FUNÇÕES LÓGICAS CLIMÁTICAS OTIMIZADAS E CORRIGIDAS <<<
+
+CHIRPS_SCALE = 5566  # Resolução nativa do CHIRPS
+ERA5_SCALE = 11132  # Resolução nativa do ERA5-Land
+
+def build_chirps_stats_image(start_date, end_date, region):
+    """Imagem com soma e média diária de precipitação do período (bandas precip_sum, precip_mean)."""
+    collection = expand_date_range(start_date, end_date, region, collection_type='chirps')
+    return ee.Image.cat([collection.sum(), collection.mean()]).rename(['precip_sum', 'precip_mean'])
+
+def build_chirps_partials_image(start_date, end_date, region):
+    """Imagem com as parciais da precipitação do período (bandas precip_sum, precip_count)."""
+    collection = expand_date_range(start_date, end_date, region, collection_type='chirps')
+    return masked_if_empty(collection, ee.Image.cat([collection.sum(), collection.count()]), ['precip_sum', 'precip_count'])
+
+def masked_if_empty(collection, image, band_names):
+    """A imagem renomeada, ou bandas totalmente mascaradas se a coleção estiver vazia (reduz para None)."""
+    empty = ee.Image.cat([ee.Image.constant(0)] * len(band_names)).rename(band_names).updateMask(ee.Image.constant(0))
+    return ee.Image(ee.Algorithms.If(collection.size().gt(0), image.rename(band_names), empty))
+
+# Fonte da temperatura: 'auto' usa o agregado diário nos dias inteiros e o horário só nas bordas; 'hourly' só o horário
+ERA5_SOURCES = ('auto', 'hourly')
+ERA5_DEFAULT_SOURCE = os.getenv('ERA5_DEFAULT_SOURCE', 'auto')
+ERA5_DAILY_COLLECTION = 'ECMWF/ERA5_LAND/DAILY_AGGR'
+
+def era5_source(data):
+    """Fonte de temperatura pedida no corpo (`era5_source`) ou a padrão do servidor."""
+    source = (data or {}).get('era5_source') or ERA5_DEFAULT_SOURCE
+    return source if source in ERA5_SOURCES else 'auto'
+
+def split_whole_days(start_date, end_date):
+    """Divide [start, end) em bordas parciais e o trecho de dias UTC inteiros.
+
+    Retorna (bordas, dias), com bordas = [(início, fim), ...] em ISO e dias = (primeiro_dia,
+    dia_após_o_último, quantidade), ou None se não houver dia inteiro no intervalo. Datas sem
+    hora (YYYY-MM-DD) nunca geram bordas.
+    """
+    start = datetime.datetime.fromisoformat(start_date)
+    end = datetime.datetime.fromisoformat(end_date)
+    first_day = start.date() if start.time() == datetime.time(0) else start.date() + datetime.timedelta(days=1)
+    last_day = end.date()
+    if last_day <= first_day:
+        return [(start_date, end_date)], None
+    edges = []
+    if start.time() != datetime.time(0):
+        edges.append((start_date, first_day.isoformat()))
+    if end.time() != datetime.time(0):
+        edges.append((last_day.isoformat(), end_date))
+    return edges, (first_day.isoformat(), last_day.isoformat(), (last_day - first_day).days)
+
+# Parciais combináveis da temperatura: mínima, máxima, soma das horas e número de horas
+ERA5_PARTIAL_BANDS = ['temp_min_k', 'temp_max_k', 'temp_sum_k', 'temp_hours']
+
+def build_era5_hourly_partials_image(start_date, end_date, region):
+    collection = expand_date_range(start_date, end_date, region, collection_type='era5_temp')
+    return masked_if_empty(collection, ee.Image.cat([collection.min(), collection.max(), collection.sum(), collection.count()]),
+                           ERA5_PARTIAL_BANDS)
+
+def build_era5_temp_partials_image(start_date, end_date, region, source='auto'):
+    """Imagem com as parciais da temperatura do período (bandas ERA5_PARTIAL_BANDS, em Kelvin).
+
+    Com source='auto', os dias inteiros vêm do ERA5-Land diário (uma imagem por dia em vez
+    de 24) e só as bordas parciais do horário; a média diária vale por 24 horas na soma.
+    Se faltar algum dia no agregado diário (dias recentes), o grafo volta para o horário
+    em todo o período.
+    """
+    if source == 'hourly':
+        return build_era5_hourly_partials_image(start_date, end_date, region)
+    try:
+        edges, days = split_whole_days(start_date, end_date)
+    except (TypeError, ValueError):
+        days = None
+    if days is None:
+        return build_era5_hourly_partials_image(start_date, end_date, region)
+
+    first_day, day_after_last, day_count = days
+    daily = (ee.ImageCollection(ERA5_DAILY_COLLECTION)
+             .filterBounds(region)
+             .filterDate(first_day, day_after_last))
+    parts = ee.ImageCollection([ee.Image.cat([
+        daily.select('temperature_2m_min').min(),
+        daily.select('temperature_2m_max').max(),
+        daily.select('temperature_2m').sum().multiply(24),
+        daily.select('temperature_2m').count().multiply(24),
+    ]).rename(ERA5_PARTIAL_BANDS)])
+    for edge_start, edge_end in edges:
+        edge_hours = expand_date_range(edge_start, edge_end, region, collection_type='era5_temp')
+        # Borda sem nenhuma hora no ERA5 (ex.: de 23:30 até a meia-noite) fica fora da combinação
+        parts = parts.merge(ee.ImageCollection(ee.Algorithms.If(
+            edge_hours.size().gt(0),
+            ee.ImageCollection([build_era5_hourly_partials_image(edge_start, edge_end, region)]),
+            ee.ImageCollection([]),
+        )))
+
+    combined = ee.Image.cat([
+        parts.select('temp_min_k').min(),
+        parts.select('temp_max_k').max(),
+        parts.select('temp_sum_k').sum(),
+        parts.select('temp_hours').sum(),
+    ]).rename(ERA5_PARTIAL_BANDS)
+    return ee.Image(ee.Algorithms.If(
+        daily.size().eq(day_count),
+        combined,
+        build_era5_hourly_partials_image(start_date, end_date, region)
+    ))
+
+def build_era5_temp_stats_image(start_date, end_date, region, source='auto'):
+    """Imagem com temperatura mínima, média (ponderada por hora) e máxima do período em Kelvin."""
+    partials = build_era5_temp_partials_image(start_date, end_date, region, source)
+    return ee.Image.cat([
+        partials.select('temp_min_k'),
+        partials.select('temp_sum_k').divide(partials.select('temp_hours')),
+        partials.select('temp_max_k'),
+    ]).rename(['temp_min_k', 'temp_mean_k', 'temp_max_k'])
+
+def format_chirps_stats(stats):
+    return {
+        'precipitation_sum': stats.get('precip_sum'),
+        'precipitation_daily_mean': stats.get('precip_mean'),
+        'source': 'precipitation'
+    }
+
+def format_era5_temp_stats(stats):
+    # Converter de Kelvin para Celsius apenas se os valores existirem
+    temp_min_val = stats.get('temp_min_k')
+    temp_mean_val = stats.get('temp_mean_k')
+    temp_max_val = stats.get('temp_max_k')
+    return {
+        'temperature_min_celsius': temp_min_val - 273.15 if temp_min_val is not None else None,
+        'temperature_mean_celsius': temp_mean_val - 273.15 if temp_mean_val is not None else None,
+        'temperature_max_celsius': temp_max_val - 273.15 if temp_max_val is not None else None,
+        'source': 'temperature'
+    }
+
+def calculate_chirps_logic_optimized(data, point, on_period=None):
+    """Calcula estatísticas de precipitação para um ponto - VERSÃO OTIMIZADA E CORRIGIDA."""
+    try:
+        periods = extract_date_periods(data)
+
+        def compute_period(start_date, end_date):
+            combined_stats = build_chirps_stats_image(start_date, end_date, point)
+
+            # Uma única chamada getInfo() em vez de duas
+            stats = ee_get_info(combined_stats.reduceRegion(
+                reducer=ee.Reducer.first(),
+                geometry=point,
+                scale=CHIRPS_SCALE,
+                maxPixels=1e9
+            ), 'precipitation_reduction')
+            return format_chirps_stats(stats)
+
+        if CLIMATE_CHUNK_CACHE_ENABLED:
+            return run_climate_chunk_periods('precipitation', periods, point, data['point']['coordinates'],
+                                             format_chirps_stats, compute_period, on_period, period_parallelism(data))
+        return run_periods(periods, compute_period, on_period, period_parallelism(data))
+    except Exception as e:
+        return {'error': str(e)}
+
+def calculate_era5_temp_logic_optimized(data, point, on_period=None):
+    """Calcula estatísticas de temperatura (mín, máx, média) para um ponto - VERSÃO OTIMIZADA E CORRIGIDA."""
+    try:
+        periods = extract_date_periods(data)
+        source = era5_source(data)
+
+        def compute_period(start_date, end_date):
+            stats_image_k = build_era5_temp_stats_image(start_date, end_date, point, source)
+
+            # Uma única chamada getInfo() em vez de múltiplas
+            temp_stats_k = ee_get_info(stats_image_k.reduceRegion(
+                reducer=ee.Reducer.first(),
+                geometry=point,
+                scale=ERA5_SCALE,
+                maxPixels=1e9
+            ), 'temperature_reduction')
+            return format_era5_temp_stats(temp_stats_k)
+
+        if CLIMATE_CHUNK_CACHE_ENABLED:
+            return run_climate_chunk_periods('temperature', periods, point, data['point']['coordinates'],
+                                             format_era5_temp_stats, compute_period, on_period,
+                                             period_parallelism(data), source)
+        return run_periods(periods, compute_period, on_period, period_parallelism(data))
+    except Exception as e:
+        return {'error': str(e)}
+
+# >>> CACHE DE PARCIAIS CLIMÁTICAS POR MÊS <<<
+
+# Intervalos que se sobrepõem ("últimos 30 dias", "safra", "acumulado do ano") reaproveitam
+# as parciais de cada mês civil já encerrado; só as bordas e os meses ausentes vão ao EE.
+CLIMATE_CHUNK_CACHE_ENABLED = os.getenv('CLIMATE_CHUNK_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes') and RESULT_CACHE_ENABLED
+CLIMATE_CHUNK_CACHE_MAX_ENTRIES = int(os.getenv('CLIMATE_CHUNK_CACHE_MAX_ENTRIES', '8192'))
+CLIMATE_CHUNK_TTL_SECONDS = int(os.getenv('CLIMATE_CHUNK_TTL_SECONDS', str(365 * 24 * 3600)))
+
+climate_chunk_cache = ResultCache(CLIMATE_CHUNK_CACHE_MAX_ENTRIES, RESULT_CACHE_PATH)
+
+def merge_precipitation_partials(parts):
+    count = sum(part.get('precip_count') or 0 for part in parts)
+    if not count:
+        return {'precip_sum': None, 'precip_mean': None}
+    total = sum(part.get('precip_sum') or 0 for part in parts)
+    return {'precip_sum': total, 'precip_mean': total / count}
+
+def merge_temperature_partials(parts):
+    parts = [part for part in parts if part.get('temp_hours')]
+    if not parts:
+        return {'temp_min_k': None, 'temp_mean_k': None, 'temp_max_k': None}
+    return {
+        'temp_min_k': min(part['temp_min_k'] for part in parts),
+        'temp_mean_k': sum(part['temp_sum_k'] for part in parts) / sum(part['temp_hours'] for part in parts),
+        'temp_max_k': max(part['temp_max_k'] for part in parts),
+    }
+
+# Por variável: imagem de parciais, banda de contagem (imagens por dia completo) e combinação
+CLIMATE_PARTIALS = {
+    'precipitation': {
+        'namespace': 'UCSB-CHG/CHIRPS/DAILY:v1',
+        'build': lambda start, end, region, source: build_chirps_partials_image(start, end, region),
+        'count_band': 'precip_count',
+        'per_day': 1,
+        'scale': CHIRPS_SCALE,
+        'merge': merge_precipitation_partials,
+        'stage': 'precipitation_reduction',
+    },
+    'temperature': {
+        'namespace': 'ECMWF/ERA5_LAND:v1',
+        'build': build_era5_temp_partials_image,
+        'count_band': 'temp_hours',
+        'per_day': 24,
+        'scale': ERA5_SCALE,
+        'merge': merge_temperature_partials,
+        'stage': 'temperature_reduction',
+    },
+}
+
+def next_month(day):
+    return (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+def parse_utc_datetime(value):
+    """Data ISO 8601 (com 'Z', offset ou sem fuso, tratada como UTC, como no EE) em datetime UTC."""
+    # fromisoformat só aceita 'Z' a partir do Python 3.11
+    parsed = datetime.datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc)
+
+def month_segments(start_date, end_date):
+    """Divide [start, end) em meses civis (UTC) inteiros já encerrados e nos trechos restantes.
+
+    Retorna [(início, fim, mês_inteiro), ...] em ordem. Os trechos restantes (bordas e o mês
+    corrente) mantêm as datas originais da requisição, inclusive com hora e fuso.
+    """
+    start = parse_utc_datetime(start_date)
+    end = parse_utc_datetime(end_date)
+    today = datetime.datetime.combine(datetime.datetime.now(datetime.timezone.utc).date(), datetime.time(0),
+                                      tzinfo=datetime.timezone.utc)
+    limit = min(end, today)
+    month = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if month < start:
+        month = next_month(month)
+
+    segments, cursor, cursor_label = [], start, start_date
+    while next_month(month) <= limit:
+        if month > cursor:
+            segments.append((cursor_label, month.date().isoformat(), False))
+        cursor = next_month(month)
+        cursor_label = cursor.date().isoformat()
+        segments.append((month.date().isoformat(), cursor_label, True))
+        month = cursor
+    if cursor < end or not segments:
+        segments.append((cursor_label, end_date, False))
+    return segments
+
+def run_climate_chunk_periods(kind, periods, point, coordinates, format_stats, compute_period, on_period=None,
+                              parallelism=1, source='auto'):
+    """Períodos do clima a partir das parciais mensais em cache (climate_period_stats).
+
+    Sem prazo, todos os períodos vão ao EE num único getInfo(). Com prazo, cada período faz o
+    seu, ainda aproveitando os meses em cache, para que os prontos saiam mesmo que o prazo
+    acabe (como em run_periods). Datas que não se dividem em meses usam compute_period, sem cache.
+    """
+    context = current_request.get()
+    if context is not None and context.deadline is not None:
+        def compute_chunked_period(start_date, end_date):
+            period = {'period': {'start_date': start_date, 'end_date': end_date}}
+            period_stats = climate_period_stats(kind, period, point, coordinates, source)
+            if period_stats is None:
+                return compute_period(start_date, end_date)
+            return format_stats(period_stats[(start_date, end_date)])
+
+        return run_periods(periods, compute_chunked_period, on_period, parallelism)
+
+    try:
+        period_stats = climate_period_stats(kind, periods, point, coordinates, source)
+    except DeadlineExceeded:
+        return timed_out_periods(periods, on_period)
+    if period_stats is None:
+        return run_periods(periods, compute_period, on_period, parallelism)
+    return run_periods(periods, lambda start, end: format_stats(period_stats[(start, end)]), on_period)
+
+def climate_period_stats(kind, periods, point, coordinates, source='auto'):
+    """Estatísticas de cada período de um ponto a partir das parciais mensais em cache.
+
+    Meses sem cache e bordas de todos os períodos vão ao EE em um único getInfo(). Só meses
+    completos (uma imagem por dia, ou por hora no ERA5) são gravados: meses com ingestão
+    pendente ou pixel mascarado são recalculados na próxima requisição.
+    Retorna {(start_date, end_date): estatísticas no formato de reduceRegion}, ou None quando
+    alguma data não pode ser dividida em meses (o chamador usa o cálculo por período sem cache).
+    """
+    config = CLIMATE_PARTIALS[kind]
+    point_key = [round(float(c), ROI_HASH_PRECISION) for c in coordinates[:2]]
+    namespace = f"climate_chunk:{config['namespace']}:{source if kind == 'temperature' else ''}"
+
+    segments_by_period, partials, missing = {}, {}, []
+    for dates in periods.values():
+        period = (dates['start_date'], dates['end_date'])
+        try:
+            segments_by_period[period] = month_segments(*period)
+        except (TypeError, ValueError):
+            return None
+        for start, end, whole_month in segments_by_period[period]:
+            segment = (start, end)
+            if segment in partials or segment in missing:
+                continue
+            cached = climate_chunk_cache.get(ResultCache.make_key(namespace, point_key, start)) if whole_month else None
+            if cached is not None:
+                partials[segment] = cached
+            else:
+                missing.append(segment)
+
+    if missing:
+        graph = ee.Dictionary({
+            f'segment_{i}': config['build'](start, end, point, source).reduceRegion(
+                reducer=ee.Reducer.first(),
+                geometry=point,
+                scale=config['scale'],
+                maxPixels=1e9
+            )
+            for i, (start, end) in enumerate(missing)
+        })
+        fetched = ee_get_info(graph, config['stage'])
+        for i, (start, end) in enumerate(missing):
+            partials[(start, end)] = fetched[f'segment_{i}']
+
+        whole_months = {(start, end) for segments in segments_by_period.values() for start, end, whole in segments if whole}
+        for start, end in missing:
+            if (start, end) not in whole_months:
+                continue
+            days = (datetime.date.fromisoformat(end) - datetime.date.fromisoformat(start)).days
+            if partials[(start, end)].get(config['count_band']) == days * config['per_day']:
+                climate_chunk_cache.set(ResultCache.make_key(namespace, point_key, start), partials[(start, end)],
+                                        CLIMATE_CHUNK_TTL_SECONDS)
+
+    return {
+        period: config['merge']([partials[(start, end)] for start, end, _ in segments])
+        for period, segments in segments_by_period.items()
+    }
+
+# >>> LOTE DE PONTOS (CLIMA) <<<
+
+# Pontos por chamada reduceRegions/getInfo, para ficar abaixo dos limites do EE
+CLIMATE_BATCH_CHUNK_SIZE = int(os.getenv('CLIMATE_BATCH_CHUNK_SIZE', '500'))
+CLIMATE_BATCH_MAX_POINTS = int(os.getenv('CLIMATE_BATCH_MAX_POINTS', '10000'))
+
+def chunked(items, size):
+    """Divide uma lista em blocos de até `size` elementos."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def parse_feature_collection(geojson, geometry_types, max_features):
+    """Extrai [(feature_id, geometry)] de uma FeatureCollection GeoJSON.
+
+    O id vem do `id` da feição, depois de `properties.id`, e por fim é gerado
+    (feature_1, feature_2, ...). Levanta ValueError para entradas inválidas.
+    """
+    features = []
+    for i, feature in enumerate(geojson.get('features') or [], 1):
+        geometry = (feature or {}).get('geometry') or {}
+        if geometry.get('type') not in geometry_types:
+            raise ValueError(f'Feição {i} deve ser do tipo {" ou ".join(geometry_types)}')
+        properties = feature.get('properties') or {}
+        feature_id = feature.get('id', properties.get('id', f'feature_{i}'))
+        features.append((str(feature_id), geometry))
+
+    if not features:
+        raise ValueError('Nenhuma feição informada')
+    if len(features) > max_features:
+        raise ValueError(f'Máximo de {max_features} feições por requisição')
+    ids = [feature_id for feature_id, _ in features]
+    if len(set(ids)) != len(ids):
+        raise ValueError('Ids de feições duplicados')
+    return features
+
+def parse_batch_points(geojson):
+    """Converte um GeoJSON MultiPoint ou FeatureCollection de pontos em [(point_id, [lon, lat])].
+
+    Em MultiPoint os ids são gerados (point_1, point_2, ...).
+    """
+    if not isinstance(geojson, dict):
+        raise ValueError('GeoJSON de pontos inválido')
+
+    if geojson.get('type') == 'MultiPoint':
+        points = [(f'point_{i}', coords) for i, coords in enumerate(geojson.get('coordinates') or [], 1)]
+        if not points:
+            raise ValueError('Nenhum ponto informado')
+        if len(points) > CLIMATE_BATCH_MAX_POINTS:
+            raise ValueError(f'Máximo de {CLIMATE_BATCH_MAX_POINTS} pontos por requisição')
+    elif geojson.get('type') == 'FeatureCollection':
+        points = [
+            (point_id, geometry.get('coordinates'))
+            for point_id, geometry in parse_feature_collection(geojson, ['Point'], CLIMATE_BATCH_MAX_POINTS)
+        ]
+    else:
+        raise ValueError('Envie um GeoJSON MultiPoint ou FeatureCollection de pontos')
+
+    for point_id, coords in points:
+        if not isinstance(coords, list) or len(coords) < 2:
+            raise ValueError(f'Coordenadas inválidas para o ponto {point_id}')
+    return points
+
+def build_climate_batch_graph(features, periods, source='auto'):
+    """Monta as reduções de todos os períodos para um bloco de pontos (um único getInfo())."""
+    region = features.geometry()
+    graph = {}
+    for period_name, dates in periods.items():
+        precipitation = build_chirps_stats_image(dates['start_date'], dates['end_date'], region).reduceRegions(
+            collection=features, reducer=ee.Reducer.first(), scale=CHIRPS_SCALE
+        )
+        temperature = build_era5_temp_stats_image(dates['start_date'], dates['end_date'], region, source).reduceRegions(
+            collection=features, reducer=ee.Reducer.first(), scale=ERA5_SCALE
+        )
+        graph[period_name] = {
+            'precipitation': precipitation.select(['point_id', 'precip_sum', 'precip_mean'], None, False),
+            'temperature': temperature.select(['point_id', 'temp_min_k', 'temp_mean_k', 'temp_max_k'], None, False),
+        }
+    return ee.Dictionary(graph)
+
+def calculate_climate_batch_logic(data, points):
+    """Calcula precipitação e temperatura para vários pontos, com reduceRegions em blocos.
+
+    Com sampling='local' (e NumPy instalado), amostra rasters baixados uma vez por requisição.
+    """
+    if climate_sampling(data) == 'local':
+        results = calculate_climate_batch_local(data, points)
+        if results is not None:
+            return results
+
+    periods = extract_date_periods(data)
+    results = {point_id: {'precipitation': {}, 'temperature': {}} for point_id, _ in points}
+
+    def compute_chunk(chunk):
+        features = ee.FeatureCollection([
+            ee.Feature(ee.Geometry.Point(coords), {'point_id': point_id}) for point_id, coords in chunk
+        ])
+        return ee_get_info(build_climate_batch_graph(features, periods, era5_source(data)), 'climate_batch_reduction')
+
+    for chunk in chunked(points, CLIMATE_BATCH_CHUNK_SIZE):
+        try:
+            chunk_stats = run_on_ee_executor(compute_chunk, chunk)
+        except ExecutorSaturated:
+            raise
+        except Exception as e:
+            for point_id, _ in chunk:
+                results[point_id] = {'error': str(e)}
+            continue
+
+        collect_climate_batch_results(chunk_stats, periods, results)
+    return results
+
+def collect_climate_batch_results(chunk_stats, periods, results):
+    """Distribui o resultado de build_climate_batch_graph em results[point_id][fonte][período]."""
+    formatters = {'precipitation': format_chirps_stats, 'temperature': format_era5_temp_stats}
+    # Os dicionários do EE voltam com as chaves ordenadas; manter a ordem dos períodos
+    for period_name in periods:
+        for source, collection in chunk_stats[period_name].items():
+            for feature in collection['features']:
+                properties = feature['properties']
+                results[properties['point_id']][source][period_name] = formatters[source](properties)
+
+# >>> AMOSTRAGEM LOCAL DE PONTOS (NUMPY) <<<
+
+# CHIRPS (~5,5 km) e ERA5-Land (~11 km) são grossos: centenas de pontos de uma fazenda caem em
+# poucos pixels. Em vez de reduceRegions, baixa o raster de estatísticas do bbox dos pontos
+# (computePixels) e lê o pixel de cada ponto com indexação vetorizada.
+CLIMATE_SAMPLING_MODES = ('ee', 'local')
+CLIMATE_SAMPLING_DEFAULT = os.getenv('CLIMATE_SAMPLING_DEFAULT', 'ee')
+# Pixels x bandas máximos por download (limite de tamanho do computePixels); acima disso usa o EE
+CLIMATE_LOCAL_MAX_VALUES = int(os.getenv('CLIMATE_LOCAL_MAX_VALUES', '4000000'))
+CLIMATE_RASTER_CACHE_MAX_ENTRIES = int(os.getenv('CLIMATE_RASTER_CACHE_MAX_ENTRIES', '64'))
+CLIMATE_LOCAL_NODATA = -9999.0
+
+# Grade nativa de cada conjunto (affine do EE): tamanho do pixel e canto superior esquerdo em graus
+CLIMATE_RASTER_GRIDS = {
+    'precipitation': {
+        'degrees': 0.05,
+        'origin': (-180.0, 50.0),
+        'bands': ['precip_sum', 'precip_mean'],
+        'build': lambda start, end, region, source: build_chirps_stats_image(start, end, region),
+        'format': format_chirps_stats,
+    },
+    'temperature': {
+        'degrees': 0.1,
+        'origin': (-180.05, 90.05),
+        'bands': ['temp_min_k', 'temp_mean_k', 'temp_max_k'],
+        'build': build_era5_temp_stats_image,
+        'format': format_era5_temp_stats,
+    },
+}
+
+# Rasters baixados por (conjunto, grade, períodos); só em memória
+climate_raster_cache = ResultCache(CLIMATE_RASTER_CACHE_MAX_ENTRIES)
+
+def climate_sampling(data):
+    """Modo de amostragem pedido no corpo (`sampling`) ou o padrão; 'local' exige NumPy."""
+    mode = (data or {}).get('sampling') or CLIMATE_SAMPLING_DEFAULT
+    if mode not in CLIMATE_SAMPLING_MODES or (mode == 'local' and np is None):
+        return 'ee'
+    return mode
+
+def raster_window(grid, lons, lats):
+    """Janela da grade nativa que cobre os pontos: (x0, y0, largura, altura), com x0/y0 no canto superior esquerdo."""
+    degrees = grid['degrees']
+    origin_x, origin_y = grid['origin']
+    first_col = int(np.floor((lons.min() - origin_x) / degrees))
+    last_col = int(np.floor((lons.max() - origin_x) / degrees))
+    first_row = int(np.floor((origin_y - lats.max()) / degrees))
+    last_row = int(np.floor((origin_y - lats.min()) / degrees))
+    return (origin_x + first_col * degrees, origin_y - first_row * degrees,
+            last_col - first_col + 1, last_row - first_row + 1)
+
+def fetch_climate_raster(kind, periods, window, source):
+    """Raster (array estruturado do NumPy) com as bandas `<período>_<banda>` de todos os períodos."""
+    grid = CLIMATE_RASTER_GRIDS[kind]
+    x0, y0, width, height = window
+    degrees = grid['degrees']
+    region = ee.Geometry.Rectangle([x0, y0 - height * degrees, x0 + width * degrees, y0])
+    image = ee.Image.cat([
+        grid['build'](dates['start_date'], dates['end_date'], region, source)
+        .select(grid['bands'], [f'{period_name}_{band}' for band in grid['bands']])
+        for period_name, dates in periods.items()
+    ]).toDouble().unmask(CLIMATE_LOCAL_NODATA)
+    return call_ee(lambda: ee.data.computePixels({
+        'expression': image,
+        'fileFormat': 'NUMPY_NDARRAY',
+        'grid': {
+            'dimensions': {'width': width, 'height': height},
+            'affineTransform': {'scaleX': degrees, 'shearX': 0, 'translateX': x0,
+                                'shearY': 0, 'scaleY': -degrees, 'translateY': y0},
+            'crsCode': 'EPSG:4326',
+        },
+    }), 'climate_raster_download')
+
+def calculate_climate_batch_local(data, points):
+    """Estatísticas dos pontos lidas de um raster por conjunto, em vez de reduceRegions.
+
+    Uma chamada computePixels por conjunto (CHIRPS e ERA5) cobre todos os pontos e períodos.
+    Retorna None se a janela dos pontos exceder CLIMATE_LOCAL_MAX_VALUES (usar o EE).
+    """
+    periods = extract_date_periods(data)
+    source = era5_source(data)
+    lons = np.array([float(coords[0]) for _, coords in points])
+    lats = np.array([float(coords[1]) for _, coords in points])
+    windows = {kind: raster_window(grid, lons, lats) for kind, grid in CLIMATE_RASTER_GRIDS.items()}
+    if any(width * height * len(CLIMATE_RASTER_GRIDS[kind]['bands']) * len(periods) > CLIMATE_LOCAL_MAX_VALUES
+           for kind, (_, _, width, height) in windows.items()):
+        return None
+
+    results = {point_id: {'precipitation': {}, 'temperature': {}} for point_id, _ in points}
+    ttl = min(period_cache_ttl(dates['end_date']) for dates in periods.values())
+    for kind, grid in CLIMATE_RASTER_GRIDS.items():
+        window = windows[kind]
+        key = ResultCache.make_key('climate_raster', kind, source if kind == 'temperature' else None, window,
+                                   list(periods.values()))
+        try:
+            raster = climate_raster_cache.get_or_compute(
+                key, lambda: run_on_ee_executor(fetch_climate_raster, kind, periods, window, source), ttl)
+        except ExecutorSaturated:
+            raise
+        except Exception as e:
+            for point_id, _ in points:
+                results[point_id] = {'error': str(e)}
+            return results
+
+        x0, y0, width, height = window
+        cols = np.clip(np.floor((lons - x0) / grid['degrees']).astype(int), 0, width - 1)
+        rows = np.clip(np.floor((y0 - lats) / grid['degrees']).astype(int), 0, height - 1)
+        for period_name in periods:
+            columns = {}
+            for band in grid['bands']:
+                values = raster[f'{period_name}_{band}'][rows, cols].astype(float)
+                values[(values == CLIMATE_LOCAL_NODATA) | np.isnan(values)] = np.nan
+                columns[band] = [None if np.isnan(v) else float(v) for v in values]
+            for i, (point_id, _) in enumerate(points):
+                results[point_id][kind][period_name] = grid['format']({band: columns[band][i] for band in grid['bands']})
+    return results
+
+# Função genérica para executar tarefas em paralelo e unificar resultados
+def run_composite_tasks(data, tasks_to_run, point=None, on_period=None):
+    """Executa as tarefas em paralelo; `on_period(task_name, period_name, result)` recebe cada período pronto.
+
+    Com prazo na requisição, uma tarefa que não termina até o prazo (mais a folga
+    REQUEST_DEADLINE_GRACE_SECONDS) volta como `timed_out`.
+    """
+    unified_results = {}
+    future_to_task = {}
+    context = get_request_context()
+    for task_fn, task_name in tasks_to_run:
+        kwargs = {}
+        if on_period:
+            kwargs['on_period'] = partial(on_period, task_name)
+        args = (data, point) if point else (data,)
+        future = ee_executor.submit(context.client_key, task_fn, args, kwargs, block=context.background)
+        future_to_task[future] = task_name
+
+    remaining = context.remaining()
+    timeout = remaining + REQUEST_DEADLINE_GRACE_SECONDS if remaining is not None else None
+    try:
+        for future in as_completed(future_to_task, timeout=timeout):
+            task_name = future_to_task[future]
+            try:
+                unified_results[task_name] = future.result()
+            except Exception as e:
+                unified_results[task_name] = {'error': str(e)}
+    except (FuturesTimeoutError, TimeoutError):
+        # No Python < 3.11 o as_completed levanta concurrent.futures.TimeoutError, que não é o builtin
+        for future, task_name in future_to_task.items():
+            if task_name not in unified_results:
+                future.cancel()
+                unified_results[task_name] = timed_out_result()
+    return unified_results
+
+# >>> REQUISIÇÕES COMPOSTAS (COMPARTILHADAS ENTRE ENDPOINTS E JOBS) <<<
+def validate_ndvi_request(data):
+    """Retorna a mensagem de erro de validação do corpo de /ndvi_composite, ou None."""
+    if not isinstance(data, dict) or 'roi' not in data or 'coordinates' not in data['roi']:
+        return 'GeoJSON de ROI (polígono) inválido'
+    return None
+
+def validate_climate_request(data):
+    """Retorna a mensagem de erro de validação do corpo de /climate_stats, ou None."""
+    if not isinstance(data, dict) or 'point' not in data or 'coordinates' not in data['point']:
+        return 'GeoJSON de ponto inválido'
+    return None
+
+def compute_ndvi_composite(data, on_period=None):
+    """Estatísticas de NDVI e tiles de todos os períodos (corpo de /ndvi_composite)."""
+    # Seleção de cenas compartilhada entre as tarefas desta requisição
+    scene_selector = SceneSelector(ee.Geometry.Polygon(data['roi']['coordinates']), roi_hash(data['roi']['coordinates']),
+                                   use_hedged_selection(data))
+    tasks = [
+        (partial(calculate_ndvi_logic, scene_selector=scene_selector), 'ndvi'),
+        (partial(get_ndvi_tiles_logic, scene_selector=scene_selector), 'ndvi_tiles'),
+#        (partial(get_image_tile_logic, scene_selector=scene_selector), 'image_tiles')
+    ]
+    return run_composite_tasks(data, tasks, on_period=on_period)
+
+def compute_climate_stats(data, on_period=None):
+    """Precipitação e temperatura de todos os períodos para um ponto (corpo de /climate_stats)."""
+    point = ee.Geometry.Point(data['point']['coordinates'])
+    tasks = [
+        (calculate_chirps_logic_optimized, 'precipitation'),
+        (calculate_era5_temp_logic_optimized, 'temperature')
+    ]
+    return run_composite_tasks(data, tasks, point, on_period=on_period)
+
+# >>> COALESCÊNCIA DE REQUISIÇÕES IDÊNTICAS (SINGLEFLIGHT) <<<
+class SingleFlight:
+    """Requisições idênticas em andamento compartilham um único cálculo.
+
+    A primeira chamada com uma chave executa `fn`; as que chegam enquanto ela roda
+    aguardam o mesmo resultado (cada uma recebe sua própria cópia).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'executed': 0, 'coalesced': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._calls[key] = Future()
+                self._stats['executed'] += 1
+            else:
+                self._stats['coalesced'] += 1
+        if is_leader:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+        return copy.deepcopy(future.result())
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+request_coalescer = SingleFlight()
+
+# >>> PROXY DE TILES COM CACHE EM DISCO <<<
+# Opcional: as URLs de tiles apontam para /tiles/<map_key>/{z}/{x}/{y}.png em vez do EE, e cada
+# tile buscado fica em disco para todos os usuários e workers do nó.
+TILE_PROXY_ENABLED = os.getenv('TILE_PROXY_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+TILE_PROXY_CACHE_DIR = os.getenv('TILE_PROXY_CACHE_DIR', '/tmp/gee_tile_cache')
+TILE_PROXY_CACHE_MAX_BYTES = int(os.getenv('TILE_PROXY_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+# Prefixo das URLs devolvidas aos clientes (ex.: https://api.exemplo.com); vazio gera caminhos relativos
+TILE_PROXY_BASE_URL = os.getenv('TILE_PROXY_BASE_URL', '')
+# Substitui esquema e host do EE nas buscas (ex.: servidor stub local em testes)
+TILE_PROXY_UPSTREAM_URL = os.getenv('TILE_PROXY_UPSTREAM_URL', '')
+TILE_PROXY_POOL_SIZE = int(os.getenv('TILE_PROXY_POOL_SIZE', '32'))
+TILE_PROXY_TIMEOUT_SECONDS = float(os.getenv('TILE_PROXY_TIMEOUT_SECONDS', '15'))
+TILE_PROXY_MAX_AGE_SECONDS = int(os.getenv('TILE_PROXY_MAX_AGE_SECONDS', '86400'))
+# Fração do limite que sobra após um despejo, para não despejar a cada gravação
+TILE_PROXY_EVICT_TO_RATIO = 0.9
+
+class TileNotFound(Exception):
+    pass
+
+class TileUpstreamError(Exception):
+    pass
+
+class DiskTileCache:
+    """Tiles em arquivos sob `directory`, limitados a `max_bytes` com despejo LRU.
+
+    Cada acerto atualiza a data de modificação do arquivo; o despejo remove os mais antigos.
+    O diretório é compartilhado pelos workers: o tamanho em memória é só uma estimativa,
+    corrigida pela varredura de cada despejo.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.png')
+
+    def _count(self, field, value=1):
+        with self._lock:
+            self._stats[field] += value
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self._count('misses')
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count('hits')
+        return data
+
+    def set(self, key, data):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Falha ao gravar tile em disco: {e}")
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._files())
+            else:
+                self._size += len(data)
+            over_limit = self._size > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        with self._lock:
+            files = sorted(self._files(), key=lambda item: item[2])
+            total = sum(size for _, size, _ in files)
+            target = int(self.max_bytes * TILE_PROXY_EVICT_TO_RATIO)
+            for path, size, _ in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self._stats['evictions'] += 1
+            self._size = total
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, directory=self.directory, max_bytes=self.max_bytes, bytes=self._size)
+
+class HttpTileUpstream:
+    """Busca tiles por HTTP com uma sessão e pool de conexões compartilhados pelas threads.
+
+    `base_url` troca esquema e host da URL do EE, para apontar a um servidor stub.
+    """
+
+    def __init__(self, pool_size, timeout, base_url=None):
+        self.timeout = timeout
+        self.base_url = (base_url or '').rstrip('/') or None
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def fetch(self, url):
+        """Devolve (status, conteúdo)."""
+        if self.base_url:
+            parts = urllib.parse.urlsplit(url)
+            url = self.base_url + parts.path + (f'?{parts.query}' if parts.query else '')
+        response = self.session.get(url, timeout=self.timeout)
+        return response.status_code, response.content
+
+class TileProxy:
+    """Resolve map_key -> URL do EE (no tile_cache compartilhado) e serve tiles do disco ou do upstream.
+
+    Buscas simultâneas do mesmo tile no processo compartilham uma única ida ao upstream.
+    """
+
+    def __init__(self, cache, upstream):
+        self.cache = cache
+        self.upstream = upstream
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def is_map_key(map_key):
+        return len(map_key) == 32 and all(c in '0123456789abcdef' for c in map_key)
+
+    @staticmethod
+    def _mapping_key(map_key):
+        return ResultCache.make_key('tile_proxy', map_key)
+
+    def register(self, map_key, url_format):
+        """Associa o map_key à URL de tiles do EE e devolve a URL do proxy no mesmo formato ({z}/{x}/{y})."""
+        if tile_cache.get(self._mapping_key(map_key)) != url_format:
+            tile_cache.set(self._mapping_key(map_key), url_format, TILE_URL_TTL_SECONDS or TILE_MAP_ID_LIFETIME_SECONDS)
+        return f'{TILE_PROXY_BASE_URL.rstrip("/")}/tiles/{map_key}/{{z}}/{{x}}/{{y}}.png'
+
+    def get(self, map_key, z, x, y):
+        """Devolve (bytes do tile, veio do disco)."""
+        key = f'{map_key}/{z}/{x}/{y}'
+        data = self.cache.get(key)
+        if data is not None:
+            return data, True
+        return self._flight.do(key, partial(self._fetch, map_key, key, z, x, y)), False
+
+    def _fetch(self, map_key, key, z, x, y):
+        url_format = tile_cache.get(self._mapping_key(map_key))
+        if url_format is None:
+            raise TileNotFound('map_key desconhecido ou expirado; solicite as URLs de tiles novamente')
+        with stage_timer('tile_upstream'):
+            status, content = self.upstream.fetch(url_format.format(z=z, x=x, y=y))
+        if status == 404:
+            raise TileNotFound('Tile não encontrado no upstream')
+        if status != 200:
+            raise TileUpstreamError(f'Upstream respondeu {status}')
+        self.cache.set(key, content)
+        return content
+
+tile_proxy = TileProxy(
+    DiskTileCache(TILE_PROXY_CACHE_DIR, TILE_PROXY_CACHE_MAX_BYTES),
+    HttpTileUpstream(TILE_PROXY_POOL_SIZE, TILE_PROXY_TIMEOUT_SECONDS, TILE_PROXY_UPSTREAM_URL),
+)
+metrics.describe('gee_tile_proxy_requests_total', 'counter', 'Tiles servidos pelo proxy por resultado (hit, miss, not_modified, not_found, error)')
+
+def request_fingerprint(kind, data, with_deadline=True):
+    """Chave normalizada de uma requisição composta: geometria, períodos e parâmetros que mudam o resultado.
+
+    Sem `with_deadline`, o prazo da requisição fica de fora (resultados completos, como os pré-calculados).
+    """
+    normalized = {
+        'kind': kind,
+        'roi': roi_hash((data.get('roi') or {}).get('coordinates')),
+        'point': (data.get('point') or {}).get('coordinates'),
+        'periods': list(extract_date_periods(data).values()),
+        'vis_params': data.get('vis_params'),
+        'single_roundtrip': use_single_roundtrip(data),
+        'era5_source': era5_source(data),
+    }
+    if with_deadline:
+        # Requisições com prazos diferentes não compartilham resultados parciais
+        normalized['deadline_seconds'] = get_request_context().deadline_seconds
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+# >>> RESPOSTAS EM STREAMING (NDJSON) <<<
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def wants_ndjson():
+    """Indica se o cliente pediu streaming com `Accept: application/x-ndjson`."""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def ndjson_response(items):
+    """Resposta HTTP que envia cada item como uma linha JSON assim que ele é gerado.
+
+    O Flask consome o corpo depois que require_api_key já restaurou current_request: o contexto
+    é capturado aqui, ainda na view, e cada item é gerado dentro dele (fila justa, prazo,
+    orçamento de novas tentativas e métricas por endpoint continuam valendo no streaming).
+    """
+    context = contextvars.copy_context()
+
+    def lines():
+        iterator = iter(items)
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield json.dumps(item) + '\n'
+
+    return Response(stream_with_context(lines()), mimetype=NDJSON_MIMETYPE)
+
+def iter_period_results(compute, data):
+    """Executa compute(data, on_period=...) em segundo plano e gera cada (tarefa, período) pronto.
+
+    Gera {'task', 'period', 'result'} por período, {'task', 'error'} para tarefas que
+    falharam por inteiro e, por último, {'done': True}.
+    """
+    events = queue.Queue()
+
+    def on_period(task_name, period_name, result):
+        events.put({'task': task_name, 'period': period_name, 'result': result})
+
+    def worker():
+        try:
+            results = compute(data, on_period=on_period)
+            for task_name, task_result in results.items():
+                if isinstance(task_result, dict) and set(task_result) == {'error'}:
+                    events.put({'task': task_name, 'error': task_result['error']})
+            events.put({'done': True})
+        except Exception as e:
+            events.put({'done': True, 'error': str(e)})
+
+    threading.Thread(target=contextvars.copy_context().run, args=(worker,), name='ndjson-stream', daemon=True).start()
+    while True:
+        event = events.get()
+        yield event
+        if event.get('done'):
+            return
+
+def stream_period_results(compute, data, start_time):
+    """Resposta NDJSON de um endpoint composto; a última linha traz tempo total e projeto."""
+    def items():
+        for event in iter_period_results(compute, data):
+            if event.get('done'):
+                event['processing_time_seconds'] = round(time.time() - start_time, 2)
+                event['project_info'] = get_project_info()
+            yield event
+    return ndjson_response(items())
+
+# >>> JOBS ASSÍNCRONOS <<<
+
+# sqlite (padrão) compartilha os jobs entre os workers do gunicorn; memory só serve com um worker
+JOB_STORE_BACKEND = os.getenv('JOB_STORE', 'sqlite')  # sqlite | memory
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', '/tmp/gee_jobs.sqlite3')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', '50'))
+JOB_TTL_SECONDS = int(os.getenv('JOB_TTL_SECONDS', '86400'))
+JOB_MAX_WAIT_SECONDS = float(os.getenv('JOB_MAX_WAIT_SECONDS', '30'))
+JOB_POLL_INTERVAL_SECONDS = 0.25
+
+JOB_FINAL_STATUSES = ('succeeded', 'failed')
+
+# Tipos de job aceitos: validação do corpo, cálculo e nomes das tarefas (para o progresso)
+JOB_KINDS = {
+    'ndvi_composite': {
+        'validate': validate_ndvi_request,
+        'compute': compute_ndvi_composite,
+        'tasks': ['ndvi', 'ndvi_tiles'],
+    },
+    'climate_stats': {
+        'validate': validate_climate_request,
+        'compute': compute_climate_stats,
+        'tasks': ['precipitation', 'temperature'],
+    },
+}
+
+class JobStore(abc.ABC):
+    """Interface dos armazenamentos de jobs: estado, progresso por período e resultado."""
+
+    @abc.abstractmethod
+    def create(self, job):
+        """Grava um job novo."""
+
+    @abc.abstractmethod
+    def get(self, job_id):
+        """Estado atual do job, ou None se não existir."""
+
+    @abc.abstractmethod
+    def update(self, job_id, **fields):
+        """Atualiza campos do job (status, progresso, resultado...)."""
+
+    @abc.abstractmethod
+    def delete_expired(self, created_before):
+        """Remove os jobs criados antes do timestamp `created_before`."""
+
+    def wait(self, job_id, timeout):
+        """Aguarda até `timeout` segundos o job terminar (long-poll) e retorna seu estado."""
+        deadline = time.time() + timeout
+        job = self.get(job_id)
+        while job and job['status'] not in JOB_FINAL_STATUSES and time.time() < deadline:
+            time.sleep(min(JOB_POLL_INTERVAL_SECONDS, max(0, deadline - time.time())))
+            job = self.get(job_id)
+        return job
+
+class InMemoryJobStore(JobStore):
+    """Jobs em memória do processo (visíveis apenas no worker que os recebeu)."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._changed = threading.Condition()
+
+    def create(self, job):
+        with self._changed:
+            self._jobs[job['job_id']] = json.loads(json.dumps(job))
+
+    def get(self, job_id):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def update(self, job_id, **fields):
+        with self._changed:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(json.loads(json.dumps(fields)))
+                self._changed.notify_all()
+
+    def delete_expired(self, created_before):
+        with self._changed:
+            for job_id in [j for j, job in self._jobs.items() if job['created_at'] < created_before]:
+                del self._jobs[job_id]
+
+    def wait(self, job_id, timeout):
+        deadline = time.time() + timeout
+        with self._changed:
+            while True:
+                job = self._jobs.get(job_id)
+                remaining = deadline - time.time()
+                if not job or job['status'] in JOB_FINAL_STATUSES or remaining <= 0:
+                    return json.loads(json.dumps(job)) if job else None
+                self._changed.wait(remaining)
+
+class SQLiteJobStore(JobStore):
+    """Jobs em SQLite local, compartilhados entre os workers do gunicorn do mesmo nó."""
+
+    JSON_FIELDS = ('payload', 'progress', 'result')
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'job_id TEXT PRIMARY KEY, kind TEXT, owner TEXT, status TEXT, payload TEXT, '
+                'progress TEXT, result TEXT, error TEXT, created_at REAL, started_at REAL, finished_at REAL)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, job):
+        row = {k: json.dumps(v) if k in self.JSON_FIELDS else v for k, v in job.items()}
+        columns = ', '.join(row)
+        placeholders = ', '.join('?' for _ in row)
+        with self._connect() as conn:
+            conn.execute(f'INSERT INTO jobs ({columns}) VALUES ({placeholders})', list(row.values()))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {k: json.loads(row[k]) if k in self.JSON_FIELDS and row[k] is not None else row[k] for k in row.keys()}
+
+    def update(self, job_id, **fields):
+        assignments = ', '.join(f'{k} = ?' for k in fields)
+        values = [json.dumps(v) if k in self.JSON_FIELDS else v for k, v in fields.items()]
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE job_id = ?', values + [job_id])
+
+    def delete_expired(self, created_before):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE created_at < ?', (created_before,))
+
+def create_job_store():
+    if JOB_STORE_BACKEND == 'sqlite':
+        return SQLiteJobStore(JOB_STORE_PATH)
+    return InMemoryJobStore()
+
+class JobQueueFull(Exception):
+    """A fila de jobs atingiu JOB_MAX_PENDING."""
+
+class JobRunner:
+    """Executor limitado em segundo plano para os jobs de cálculo."""
+
+    def __init__(self, store, max_workers, max_pending):
+        self.store = store
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def submit(self, kind, payload, owner):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull('Fila de jobs cheia, tente novamente mais tarde')
+            self._pending += 1
+
+        job, created = None, False
+        try:
+            self.store.delete_expired(time.time() - JOB_TTL_SECONDS)
+            job = self._new_job(kind, payload, owner)
+            self.store.create(job)
+            created = True
+            self._executor.submit(self._run, job)
+        except Exception as e:
+            # A vaga só é devolvida por _run; se o job não chegou ao executor, devolve aqui
+            with self._lock:
+                self._pending -= 1
+            if created:
+                self.store.update(job['job_id'], status='failed', error=str(e), finished_at=time.time())
+            raise
+        return job
+
+    @staticmethod
+    def _new_job(kind, payload, owner):
+        periods = extract_date_periods(payload)
+        return {
+            'job_id': uuid.uuid4().hex,
+            'kind': kind,
+            'owner': owner,
+            'status': 'queued',
+            'payload': payload,
+            'progress': {
+                'completed_periods': 0,
+                'total_periods': len(periods) * len(JOB_KINDS[kind]['tasks']),
+                'tasks': {task_name: {} for task_name in JOB_KINDS[kind]['tasks']},
+            },
+            'result': None,
+            'error': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+        }
+
+    def _run(self, job):
+        job_id = job['job_id']
+        progress = job['progress']
+        progress_lock = threading.Lock()
+
+        def on_period(task_name, period_name, result):
+            with progress_lock:
+                progress['tasks'].setdefault(task_name, {})[period_name] = 'error' if 'error' in result else 'done'
+                progress['completed_periods'] += 1
+                self.store.update(job_id, progress=progress)
+
+        # Jobs só têm prazo se o corpo pedir (deadline_seconds); o padrão do servidor vale para requisições síncronas
+        current_request.set(RequestContext(job['owner'], background=True, endpoint=f"job:{job['kind']}",
+                                           deadline_seconds=request_deadline_seconds(None, job['payload'], default=0)))
+        try:
+            self.store.update(job_id, status='running', started_at=time.time())
+            gee_session.ensure_initialized()
+            result = JOB_KINDS[job['kind']]['compute'](job['payload'], on_period=on_period)
+            result['project_info'] = get_project_info()
+            self.store.update(job_id, status='succeeded', result=result, finished_at=time.time())
+        except Exception as e:
+            self.store.update(job_id, status='failed', error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+def job_owner(api_key):
+    """Identificador do dono do job derivado da API key (a chave não é armazenada)."""
+    return hashlib.sha256((api_key or '').encode()).hexdigest()[:16]
+
+def public_job_view(job):
+    """Estado do job devolvido ao cliente (sem payload e dono)."""
+    return {k: v for k, v in job.items() if k not in ('owner', 'payload')}
+
+job_runner = JobRunner(create_job_store(), JOB_WORKERS, JOB_MAX_PENDING)
+
+# >>> ASSINATURAS E PRÉ-CÁLCULO EM SEGUNDO PLANO <<<
+# Talhões e pontos consultados sempre com a mesma janela relativa ("últimos 30 dias") viram
+# assinaturas. Um agendador por nó recalcula esses resultados em lotes, de preferência fora do
+# pico, quando a janela avança ou chegam cenas/dados novos, e guarda o último resultado. Os
+# endpoints respondem do armazenamento quando o pedido coincide com uma assinatura.
+# Arquivo SQLite das assinaturas e resultados; vazio desativa
+SUBSCRIPTIONS_PATH = os.getenv('SUBSCRIPTIONS_PATH', '')
+SUBSCRIPTION_CHECK_INTERVAL_SECONDS = int(os.getenv('SUBSCRIPTION_CHECK_INTERVAL_SECONDS', '1800'))
+# Horas (UTC) em que o agendador trabalha, como "22-6"; vazio permite qualquer hora
+SUBSCRIPTION_OFFPEAK_HOURS = os.getenv('SUBSCRIPTION_OFFPEAK_HOURS', '')
+# Assinaturas por consulta de dados novos (uma chamada getInfo por lote)
+SUBSCRIPTION_BATCH_SIZE = int(os.getenv('SUBSCRIPTION_BATCH_SIZE', '50'))
+SUBSCRIPTION_RESULT_MAX_AGE_SECONDS = int(os.getenv('SUBSCRIPTION_RESULT_MAX_AGE_SECONDS', '86400'))
+SUBSCRIPTION_MAX_PER_OWNER = int(os.getenv('SUBSCRIPTION_MAX_PER_OWNER', '500'))
+SUBSCRIPTION_MAX_TEMPLATES = 12
+SUBSCRIPTION_LEASE_SECONDS = 600
+
+# Coleções cuja chegada de imagens novas na janela da assinatura dispara o recálculo
+SUBSCRIPTION_DATA_COLLECTIONS = {
+    'ndvi_composite': [config['id'] for config in OPTICAL_COLLECTIONS.values()],
+    'climate_stats': ['UCSB-CHG/CHIRPS/DAILY', 'ECMWF/ERA5_LAND/HOURLY'],
+}
+# Parâmetros do corpo guardados na assinatura (os períodos vêm dos modelos)
+SUBSCRIPTION_PARAMS = ('roi', 'point', 'vis_params', 'era5_source')
+
+metrics.describe('gee_subscription_lookups_total', 'counter',
+                 'Consultas ao armazenamento de assinaturas por endpoint e resultado (hit, miss, stale)')
+
+def resolve_period_template(template, today):
+    """[start_date, end_date] de um modelo de período relativo a `today`, ou None se o modelo for inválido.
+
+    Modelos: `last_<N>_days` (N de 1 a 366, até hoje), `month_to_date` e `previous_month`.
+    """
+    if template == 'month_to_date':
+        return [today.replace(day=1).isoformat(), today.isoformat()]
+    if template == 'previous_month':
+        last_day = today.replace(day=1) - datetime.timedelta(days=1)
+        return [last_day.replace(day=1).isoformat(), last_day.isoformat()]
+    if isinstance(template, str) and template.startswith('last_') and template.endswith('_days'):
+        days = template[len('last_'):-len('_days')]
+        if days.isdigit() and 1 <= int(days) <= 366:
+            return [(today - datetime.timedelta(days=int(days))).isoformat(), today.isoformat()]
+    return None
+
+def utc_today():
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+def subscription_payload(subscription, today):
+    """Corpo equivalente ao do endpoint síncrono, com os modelos resolvidos para `today`."""
+    return dict(subscription['params'], date_periods=[
+        resolve_period_template(template, today) for template in subscription['period_templates']
+    ])
+
+def subscription_result_max_age(kind):
+    # As URLs de tiles do NDVI expiram com o map id do EE: nunca além da vida dele, mesmo sem folga configurada
+    if kind == 'ndvi_composite':
+        return min(SUBSCRIPTION_RESULT_MAX_AGE_SECONDS, TILE_URL_TTL_SECONDS or TILE_MAP_ID_LIFETIME_SECONDS)
+    return SUBSCRIPTION_RESULT_MAX_AGE_SECONDS
+
+def precompute_complete(result):
+    """True se o resultado pode ser servido: nenhuma tarefa falhou e nenhum período tem erro transitório.
+
+    Períodos sem cena válida (satellite none) são resultados legítimos.
+    """
+    for task_result in result.values():
+        if not isinstance(task_result, dict) or 'error' in task_result:
+            return False
+        for period_result in task_result.values():
+            if isinstance(period_result, dict) and 'error' in period_result and period_result.get('satellite') != 'none':
+                return False
+    return True
+
+def in_offpeak_window(hour=None):
+    """True se a hora (UTC) está na janela SUBSCRIPTION_OFFPEAK_HOURS ("início-fim", pode cruzar a meia-noite)."""
+    if not SUBSCRIPTION_OFFPEAK_HOURS:
+        return True
+    start, _, end = SUBSCRIPTION_OFFPEAK_HOURS.partition('-')
+    start, end = int(start), int(end)
+    hour = datetime.datetime.now(datetime.timezone.utc).hour if hour is None else hour
+    return start <= hour < end if start <= end else (hour >= start or hour < end)
+
+class SubscriptionStore:
+    """Assinaturas (tipo, geometria, modelos de período) e o último resultado pré-calculado de cada uma.
+
+    SQLite local, compartilhado pelos workers do nó. O resultado é encontrado pela mesma
+    impressão digital usada na coalescência (request_fingerprint sem o prazo).
+    """
+
+    JSON_FIELDS = ('params', 'period_templates', 'date_periods', 'result')
+
+    def __init__(self, path):
+        self.path = path or None
+        if self.enabled:
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS subscriptions ('
+                    'subscription_id TEXT PRIMARY KEY, owner TEXT, kind TEXT, params TEXT, period_templates TEXT, '
+                    'created_at REAL, status TEXT, fingerprint TEXT, date_periods TEXT, data_version TEXT, '
+                    'result TEXT, computed_at REAL, attempted_at REAL, error TEXT)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS subscriptions_by_fingerprint ON subscriptions (fingerprint)')
+                conn.execute('CREATE INDEX IF NOT EXISTS subscriptions_by_owner ON subscriptions (owner)')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS subscription_scheduler (name TEXT PRIMARY KEY, lease_owner TEXT, lease_expires REAL)'
+                )
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _row(self, row):
+        return {k: json.loads(row[k]) if k in self.JSON_FIELDS and row[k] is not None else row[k] for k in row.keys()}
+
+    def _select(self, where, params):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(f'SELECT * FROM subscriptions {where}', params).fetchall()
+        return [self._row(row) for row in rows]
+
+    def create(self, subscription):
+        row = {k: json.dumps(v) if k in self.JSON_FIELDS else v for k, v in subscription.items()}
+        columns = ', '.join(row)
+        placeholders = ', '.join('?' for _ in row)
+        with self._connect() as conn:
+            conn.execute(f'INSERT INTO subscriptions ({columns}) VALUES ({placeholders})', list(row.values()))
+
+    def get(self, subscription_id):
+        rows = self._select('WHERE subscription_id = ?', (subscription_id,))
+        return rows[0] if rows else None
+
+    def list(self, owner=None):
+        if owner is None:
+            return self._select('ORDER BY created_at', ())
+        return self._select('WHERE owner = ? ORDER BY created_at', (owner,))
+
+    def count(self, owner):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM subscriptions WHERE owner = ?', (owner,)).fetchone()[0]
+
+    def delete(self, subscription_id, owner):
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM subscriptions WHERE subscription_id = ? AND owner = ?', (subscription_id, owner))
+        return cursor.rowcount == 1
+
+    def update(self, subscription_id, **fields):
+        assignments = ', '.join(f'{k} = ?' for k in fields)
+        values = [json.dumps(v) if k in self.JSON_FIELDS else v for k, v in fields.items()]
+        with self._connect() as conn:
+            conn.execute(f'UPDATE subscriptions SET {assignments} WHERE subscription_id = ?', values + [subscription_id])
+
+    def lookup(self, fingerprint):
+        """(resultado, kind, computed_at) mais recente com a impressão digital, ou None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT result, kind, computed_at FROM subscriptions WHERE fingerprint = ? AND result IS NOT NULL '
+                'ORDER BY computed_at DESC LIMIT 1', (fingerprint,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1], row[2]) if row else None
+
+    def acquire_lease(self, owner):
+        """Lease do agendador entre os workers do nó (renovado a cada lote e a cada assinatura)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO subscription_scheduler (name) VALUES ('scheduler')")
+            cursor = conn.execute(
+                "UPDATE subscription_scheduler SET lease_owner = ?, lease_expires = ? WHERE name = 'scheduler' "
+                'AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires < ?)',
+                (owner, now + SUBSCRIPTION_LEASE_SECONDS, owner, now)
+            )
+        return cursor.rowcount == 1
+
+    def stats(self):
+        stats = {'enabled': self.enabled}
+        if self.enabled:
+            with self._connect() as conn:
+                stats['subscriptions'] = dict(conn.execute('SELECT status, COUNT(*) FROM subscriptions GROUP BY status').fetchall())
+        return stats
+
+class SubscriptionScheduler:
+    """Recalcula as assinaturas em lotes numa thread por processo; só o worker com o lease trabalha.
+
+    A cada ciclo (dentro da janela fora de pico), uma chamada getInfo por lote lê a imagem mais
+    recente de cada coleção na janela de cada assinatura. Uma assinatura é recalculada quando
+    os períodos resolvidos mudaram (a janela avançou), quando chegou imagem nova, quando o
+    resultado está perto de expirar ou quando a última tentativa falhou. Os cálculos passam
+    pelo executor compartilhado como um cliente próprio, sem furar a fila dos demais.
+    """
+
+    CLIENT_KEY = 'subscriptions'
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stats = {'cycles': 0, 'computed': 0, 'skipped': 0, 'failed': 0, 'last_cycle_at': None, 'last_error': None}
+
+    def ensure_thread(self):
+        """Inicia o agendador neste processo (uma vez por PID, também após o fork)."""
+        if not self.store.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._loop, name='subscription-scheduler', daemon=True).start()
+
+    def _loop(self):
+        pid = os.getpid()
+        owner = f'{pid}:{uuid.uuid4().hex}'
+        while self._pid == pid:
+            try:
+                if in_offpeak_window():
+                    self.run_cycle(owner)
+            except Exception as e:
+                with self._lock:
+                    self._stats['last_error'] = str(e)
+                print(f"⚠️ Falha no pré-cálculo das assinaturas: {e}")
+            time.sleep(SUBSCRIPTION_CHECK_INTERVAL_SECONDS)
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def run_cycle(self, owner=None, today=None):
+        """Um ciclo completo; sem `owner` roda sem lease (uso direto, ex.: testes e scripts)."""
+        today = today or utc_today()
+        gee_session.ensure_initialized()
+        for batch in chunked(self.store.list(), SUBSCRIPTION_BATCH_SIZE):
+            if owner and not self.store.acquire_lease(owner):
+                return
+            payloads = {sub['subscription_id']: subscription_payload(sub, today) for sub in batch}
+            versions = self.data_versions(batch, payloads)
+            for subscription in batch:
+                # Renova a cada assinatura: um lote de cálculos lentos pode passar de SUBSCRIPTION_LEASE_SECONDS
+                if owner and not self.store.acquire_lease(owner):
+                    return
+                subscription_id = subscription['subscription_id']
+                if self.is_due(subscription, payloads[subscription_id], versions.get(subscription_id)):
+                    self.compute(subscription, payloads[subscription_id], versions.get(subscription_id))
+                else:
+                    self._count('skipped')
+        with self._lock:
+            self._stats['cycles'] += 1
+            self._stats['last_cycle_at'] = time.time()
+
+    def data_versions(self, batch, payloads):
+        """Versão dos dados de cada assinatura do lote (tamanho e imagem mais recente por coleção), num getInfo."""
+        summaries = {}
+        for subscription in batch:
+            params = subscription['params']
+            geometry = (ee.Geometry.Polygon(params['roi']['coordinates']) if subscription['kind'] == 'ndvi_composite'
+                        else ee.Geometry.Point(params['point']['coordinates']))
+            periods = payloads[subscription['subscription_id']]['date_periods']
+            start = min(period[0] for period in periods)
+            # filterDate exclui o fim: inclui o último dia da janela
+            end = (datetime.date.fromisoformat(max(period[1] for period in periods)) + datetime.timedelta(days=1)).isoformat()
+            summaries[subscription['subscription_id']] = ee.List([
+                ee.List([collection.size(), collection.aggregate_max('system:time_start')])
+                for collection in (ee.ImageCollection(collection_id).filterBounds(geometry).filterDate(start, end)
+                                   for collection_id in SUBSCRIPTION_DATA_COLLECTIONS[subscription['kind']])
+            ])
+        info = ee_get_info(ee.Dictionary(summaries), 'subscription_data_version') if summaries else {}
+        return {subscription_id: hashlib.sha256(json.dumps(summary).encode()).hexdigest()[:16]
+                for subscription_id, summary in info.items()}
+
+    def is_due(self, subscription, payload, data_version, now=None):
+        if subscription['status'] != 'ready' or subscription['computed_at'] is None:
+            return True
+        if subscription['date_periods'] != payload['date_periods'] or subscription['data_version'] != data_version:
+            return True
+        # Renova antes de o resultado deixar de ser servido
+        age = (now or time.time()) - subscription['computed_at']
+        return age >= subscription_result_max_age(subscription['kind']) - SUBSCRIPTION_CHECK_INTERVAL_SECONDS
+
+    def compute(self, subscription, payload, data_version):
+        subscription_id = subscription['subscription_id']
+        kind = subscription['kind']
+        token = current_request.set(RequestContext(self.CLIENT_KEY, background=True, endpoint='subscriptions'))
+        try:
+            result = JOB_KINDS[kind]['compute'](payload)
+            if not precompute_complete(result):
+                raise RuntimeError('Resultado incompleto (falha em tarefa ou período)')
+            self.store.update(
+                subscription_id, status='ready', fingerprint=request_fingerprint(kind, payload, with_deadline=False),
+                date_periods=payload['date_periods'], data_version=data_version, result=result,
+                computed_at=time.time(), attempted_at=time.time(), error=None,
+            )
+            self._count('computed')
+        except Exception as e:
+            # O último resultado bom continua sendo servido enquanto não expirar
+            self.store.update(subscription_id, status='failed', attempted_at=time.time(), error=str(e))
+            self._count('failed')
+        finally:
+            current_request.reset(token)
+
+    def stats(self):
+        stats = self.store.stats()
+        if self.store.enabled:
+            with self._lock:
+                stats.update(self._stats)
+        return stats
+
+subscription_store = SubscriptionStore(SUBSCRIPTIONS_PATH)
+subscription_scheduler = SubscriptionScheduler(subscription_store)
+
+def precomputed_result(kind, data):
+    """Resultado pré-calculado de uma assinatura que coincide com o pedido: (resultado, computed_at) ou None."""
+    if not subscription_store.enabled:
+        return None
+    subscription_scheduler.ensure_thread()
+    endpoint = get_request_context().endpoint
+    try:
+        found = subscription_store.lookup(request_fingerprint(kind, data, with_deadline=False))
+    except sqlite3.Error as e:
+        print(f"⚠️ Falha na consulta das assinaturas: {e}")
+        return None
+    if found is None:
+        metrics.inc('gee_subscription_lookups_total', {'endpoint': endpoint, 'result': 'miss'})
+        return None
+    result, stored_kind, computed_at = found
+    if time.time() - computed_at > subscription_result_max_age(stored_kind):
+        metrics.inc('gee_subscription_lookups_total', {'endpoint': endpoint, 'result': 'stale'})
+        return None
+    metrics.inc('gee_subscription_lookups_total', {'endpoint': endpoint, 'result': 'hit'})
+    return result, computed_at
+
+def precomputed_at_header(computed_at):
+    return datetime.datetime.fromtimestamp(computed_at, datetime.timezone.utc).isoformat()
+
+def precomputed_response(response, computed_at):
+    """Marca a resposta servida do armazenamento de assinaturas com o instante do cálculo (X-Precomputed-At)."""
+    if computed_at:
+        response.headers['X-Precomputed-At'] = precomputed_at_header(computed_at)
+    return response
+
+def public_subscription_view(subscription, include_result=False):
+    """Assinatura devolvida ao cliente (sem dono e, por padrão, sem o resultado)."""
+    hidden = ('owner', 'fingerprint', 'data_version') + (() if include_result else ('result',))
+    return {k: v for k, v in subscription.items() if k not in hidden}
+
+# >>> AUTENTICAÇÃO POR API KEY <<<
+def api_key_error(provided_key):
+    """Mensagem de erro para uma API key ausente ou fora de ALLOWED_API_KEYS, ou None se válida."""
+    allowed_keys_env = os.getenv('ALLOWED_API_KEYS', '')
+    allowed_keys = {key.strip() for key in allowed_keys_env.split(',') if key.strip()}
+    if not provided_key:
+        return 'API key ausente. Envie em X-API-Key'
+    if not allowed_keys or provided_key not in allowed_keys:
+        return 'API key inválida ou não autorizada'
+    return None
+
+def require_api_key(func):
+    """Decorator para exigir API Key no cabeçalho X-API-Key.
+
+    Valida a chave contra a lista em ALLOWED_API_KEYS (separadas por vírgula).
+    Retorna 401 em caso de ausência ou chave inválida.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        provided_key = request.headers.get('X-API-Key')
+        auth_error = api_key_error(provided_key)
+        if auth_error:
+            return jsonify({'error': auth_error}), 401
+
+        deadline_seconds = request_deadline_seconds(request.headers.get(REQUEST_DEADLINE_HEADER), request.get_json(silent=True))
+        context = RequestContext(job_owner(provided_key), endpoint=request.endpoint, deadline_seconds=deadline_seconds)
+        # Guardado também em `g` para o cabeçalho Server-Timing em after_request
+        g.request_context = context
+        token = current_request.set(context)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            current_request.reset(token)
+
+    return wrapper
+
+def admission_control(func):
+    """Rejeita de imediato (503 + Retry-After) quando a fila do executor compartilhado está cheia."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if ee_executor.saturated():
+            return executor_saturated_response()
+        return func(*args, **kwargs)
+
+    return wrapper
+
+# >>> ENDPOINTS DA API <<<
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    metrics.observe('gee_request_duration_seconds', elapsed,
+                    {'endpoint': request.endpoint or 'unknown', 'status': str(response.status_code)})
+    context = g.get('request_context')
+    # Em respostas em streaming o cálculo continua depois dos cabeçalhos; não há o que resumir
+    if SERVER_TIMING_ENABLED and context is not None and not response.is_streamed:
+        breakdown = server_timing_header(context)
+        total = f'total;dur={elapsed * 1000:.1f}'
+        response.headers['Server-Timing'] = f'{breakdown}, {total}' if breakdown else total
+    return response
+
+def collect_runtime_metrics():
+    """Ocupação dos pools, filas e contadores já mantidos pelos componentes do processo."""
+    executor = ee_executor.stats()
+    limiter = ee_call_limiter.stats()
+    coalescing = request_coalescer.stats()
+    cache_samples = [
+        ({'cache': cache_name, 'endpoint': endpoint, 'result': result}, count)
+        for cache_name, cache in (('ndvi_result', ndvi_result_cache), ('tile', tile_cache),
+                                  ('climate_chunk', climate_chunk_cache))
+        for endpoint, counts in cache.stats()['endpoints'].items()
+        for result, count in counts.items()
+    ]
+    return [
+        ('gee_executor_workers', 'gauge', 'Threads do executor compartilhado', [({}, executor['workers'])]),
+        ('gee_executor_active', 'gauge', 'Tarefas em execução no executor compartilhado', [({}, executor['active'])]),
+        ('gee_executor_occupancy_ratio', 'gauge', 'Fração das threads do executor ocupadas', [({}, executor['occupancy'])]),
+        ('gee_executor_queued', 'gauge', 'Tarefas na fila do executor compartilhado', [({}, executor['queued'])]),
+        ('gee_executor_rejected_total', 'counter', 'Tarefas rejeitadas com a fila cheia', [({}, executor['rejected'])]),
+        ('gee_ee_calls_in_flight', 'gauge', 'Chamadas ao EE em andamento', [({}, limiter['in_flight'])]),
+        ('gee_ee_calls_waiting', 'gauge', 'Chamadas aguardando vaga no limite de concorrência', [({}, limiter['waiting'])]),
+        ('gee_ee_calls_max_concurrent', 'gauge', 'Limite de chamadas simultâneas ao EE', [({}, limiter['max_concurrent'])]),
+        ('gee_ee_retries_total', 'counter', 'Novas tentativas de chamadas ao EE', [({}, ee_retry_stats['retries'])]),
+        ('gee_ee_retries_exhausted_total', 'counter', 'Chamadas que esgotaram as tentativas', [({}, ee_retry_stats['exhausted'])]),
+        ('gee_jobs_pending', 'gauge', 'Jobs aguardando ou em execução', [({}, job_runner._pending)]),
+        ('gee_coalesced_requests_total', 'counter', 'Requisições atendidas por um cálculo idêntico em andamento',
+         [({}, coalescing['coalesced'])]),
+        ('gee_cache_lookups_total', 'counter', 'Consultas aos caches por endpoint e resultado', cache_samples),
+        ('gee_session_ready', 'gauge', 'Sessão do EE pronta neste processo', [({}, int(gee_session.ready))]),
+    ]
+
+metrics.add_collector(collect_runtime_metrics)
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Endpoint para verificar saúde da aplicação e projeto GEE.
+    ---
+    tags:
+      - Health
+    produces:
+      - application/json
+    responses:
+      200:
+        description: Estado de saúde da API e informações do projeto GEE
+        schema:
+          type: object
+          properties:
+            status:
+              type: string
+              example: healthy
+            ready:
+              type: boolean
+              description: Sessão do Earth Engine inicializada neste worker
+            gee_session:
+              type: object
+            gee_project:
+              type: object
+              properties:
+                project_id:
+                  type: string
+                status:
+                  type: string
+                source:
+                  type: string
+            timestamp:
+              type: number
+      500:
+        description: Erro ao verificar saúde
+        schema:
+          type: object
+          properties:
+            status:
+              type: string
+              example: unhealthy
+            error:
+              type: string
+            timestamp:
+              type: number
+    """
+    try:
+        project_info = get_project_info()
+        return jsonify({
+            'status': 'healthy',
+            'ready': gee_session.ready,
+            'gee_project': project_info,
+            'gee_session': gee_session.status(),
+            'executor': ee_executor.stats(),
+            'ee_calls': dict(ee_call_limiter.stats(), **ee_retry_stats),
+            'coalescing': request_coalescer.stats(),
+            'result_cache': ndvi_result_cache.stats(),
+            'tile_cache': tile_cache.stats(),
+            'climate_chunk_cache': climate_chunk_cache.stats(),
+            'tile_proxy': tile_proxy.cache.stats() if TILE_PROXY_ENABLED else {'enabled': False},
+            'scene_catalog': scene_catalog.stats(),
+            'subscriptions': subscription_scheduler.stats(),
+            'timestamp': time.time()
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'unhealthy',
+            'error': str(e),
+            'timestamp': time.time()
+        }), 500
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness: o processo está de pé e respondendo (não consulta o Earth Engine).
+    ---
+    tags:
+      - Health
+    produces:
+      - application/json
+    responses:
+      200:
+        description: Processo ativo
+    """
+    return jsonify({'status': 'alive', 'pid': os.getpid(), 'timestamp': time.time()})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: a sessão do Earth Engine deste worker está pronta para receber requisições.
+    ---
+    tags:
       - Health
     produces:
-      - application/json
+      - application/json
+    responses:
+      200:
+        description: Sessão do Earth Engine pronta
+      503:
+        description: Sessão do Earth Engine não inicializada ou com falha de autenticação
+    """
+    try:
+        gee_session.ensure_initialized()
+    except Exception:
+        pass
+    body = {'ready': gee_session.ready, 'gee_session': gee_session.status(), 'timestamp': time.time()}
+    return jsonify(body), 200 if gee_session.ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas do processo no formato de exposição do Prometheus.
+    ---
+    tags:
+      - Health
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Histogramas por endpoint/etapa/satélite, fallbacks Sentinel→Landsat, classes de erro do EE e ocupação dos pools
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ndvi_composite', methods=['POST'])
+@require_api_key
+@admission_control
+def ndvi_composite():
+    """Gera estatísticas de NDVI e URLs de tiles para períodos de data.
+    ---
+    tags:
+      - NDVI
+    consumes:
+      - application/json
+    produces:
+      - application/json
+      - application/x-ndjson
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: Chave de API válida
+      - name: X-Request-Deadline
+        in: header
+        type: number
+        required: false
+        description: Prazo da requisição em segundos, limitado a REQUEST_DEADLINE_MAX_SECONDS (padrão via REQUEST_DEADLINE_DEFAULT_SECONDS)
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - roi
+          properties:
+            roi:
+              type: object
+              description: GeoJSON Polygon da ROI
+              properties:
+                type:
+                  type: string
+                  example: Polygon
+                coordinates:
+                  type: array
+                  items:
+                    type: array
+                    items:
+                      type: array
+                      items:
+                        type: number
+            date_periods:
+              type: array
+              description: Lista de períodos [start_date, end_date]
+              items:
+                type: array
+                items:
+                  type: string
+                  example: '2024-01-01'
+            single_roundtrip:
+              type: boolean
+              description: Resolve as estatísticas de NDVI de todos os períodos em um único getInfo() (padrão via NDVI_SINGLE_ROUNDTRIP)
+            hedged_selection:
+              type: boolean
+              description: Verifica Sentinel-2 e Landsat em paralelo em cada período em vez de só após a falha do Sentinel-2 (padrão via SCENE_HEDGED_SELECTION)
+            period_parallelism:
+              type: integer
+              description: Períodos calculados ao mesmo tempo por tarefa, limitado a PERIOD_PARALLELISM_PER_REQUEST (1 calcula em série)
+            deadline_seconds:
+              type: number
+              description: Prazo da requisição em segundos (o mesmo que X-Request-Deadline); períodos não concluídos a tempo voltam com timed_out true
+    responses:
+      200:
+        description: Resultados de NDVI por período e URLs de tiles. Com Accept application/x-ndjson, uma linha {task, period, result} por período assim que fica pronto e uma linha final {done}
+        schema:
+          type: object
+          properties:
+            ndvi:
+              type: object
+            ndvi_tiles:
+              type: object
+            project_info:
+              type: object
+      400:
+        description: Requisição inválida
+      401:
+        description: Não autorizado (API Key ausente ou inválida)
+      500:
+        description: Erro interno do servidor
+      503:
+        description: Servidor ocupado (fila do executor cheia); tente após Retry-After segundos
+    """
+    start_time = time.time()
+    try:
+        gee_session.ensure_initialized()
+        data = request.json
+        validation_error = validate_ndvi_request(data)
+        if validation_error:
+            return jsonify({'error': validation_error}), 400
+
+        if wants_ndjson():
+            return stream_period_results(compute_ndvi_composite, data, start_time)
+
+        # Assinaturas pré-calculadas respondem sem ir ao EE
+        precomputed = precomputed_result('ndvi_composite', data)
+        if precomputed:
+            results, computed_at = precomputed
+        else:
+            results, computed_at = request_coalescer.do(
+                request_fingerprint('ndvi_composite', data), lambda: compute_ndvi_composite(data)
+            ), None
+        
+        # Adicionar informações do projeto na resposta
+        results['project_info'] = get_project_info()
+        
+        return precomputed_response(jsonify(results), computed_at)
+    except ExecutorSaturated:
+        return executor_saturated_response()
+    except Exception as e:
+        return jsonify({'error': str(e), 'project_info': get_project_info()}), 500
+
+@app.route('/tiles/<map_key>/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def proxied_tile(map_key, z, x, y):
+    """Tile de NDVI servido pelo proxy com cache em disco (TILE_PROXY_ENABLED=true).
+    ---
+    tags:
+      - NDVI
+    produces:
+      - image/png
+    description: >
+      As URLs devolvidas em ndvi_tiles apontam para cá quando o proxy está ativo. Assim como as
+      URLs do EE, não exigem API key: o map_key é o próprio identificador de acesso.
+    parameters:
+      - name: map_key
+        in: path
+        type: string
+        required: true
+      - name: z
+        in: path
+        type: integer
+        required: true
+      - name: x
+        in: path
+        type: integer
+        required: true
+      - name: y
+        in: path
+        type: integer
+        required: true
     responses:
       200:
-        description: Estado de saúde da API e informações do projeto GEE
+        description: Tile PNG (cabeçalho X-Cache indica HIT ou MISS)
+      304:
+        description: Tile inalterado (If-None-Match)
+      404:
+        description: Proxy desativado, map_key desconhecido/expirado ou tile inexistente
+      502:
+        description: Falha ao buscar o tile no upstream
+    """
+    if not TILE_PROXY_ENABLED or not TileProxy.is_map_key(map_key):
+        return jsonify({'error': 'Tile não encontrado'}), 404
+
+    # O conteúdo de um map_key não muda: a própria chave serve de ETag
+    etag = f'"{map_key}-{z}-{x}-{y}"'
+    cache_control = f'public, max-age={TILE_PROXY_MAX_AGE_SECONDS}'
+    if etag in request.headers.get('If-None-Match', ''):
+        metrics.inc('gee_tile_proxy_requests_total', {'result': 'not_modified'})
+        return Response(status=304, headers={'ETag': etag, 'Cache-Control': cache_control})
+    try:
+        data, hit = tile_proxy.get(map_key, z, x, y)
+    except TileNotFound as e:
+        metrics.inc('gee_tile_proxy_requests_total', {'result': 'not_found'})
+        return jsonify({'error': str(e)}), 404
+    except (TileUpstreamError, requests.RequestException) as e:
+        metrics.inc('gee_tile_proxy_requests_total', {'result': 'error'})
+        return jsonify({'error': str(e)}), 502
+
+    metrics.inc('gee_tile_proxy_requests_total', {'result': 'hit' if hit else 'miss'})
+    return Response(data, mimetype='image/png', headers={
+        'Cache-Control': cache_control,
+        'ETag': etag,
+        'X-Cache': 'HIT' if hit else 'MISS',
+    })
+
+@app.route('/climate_stats', methods=['POST'])
+@require_api_key
+@admission_control
+def climate_stats():
+    """Calcula estatísticas climáticas (precipitação e temperatura) para um ponto.
+    ---
+    tags:
+      - Climate
+    consumes:
+      - application/json
+    produces:
+      - application/json
+      - application/x-ndjson
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: Chave de API válida
+      - name: X-Request-Deadline
+        in: header
+        type: number
+        required: false
+        description: Prazo da requisição em segundos (ver /ndvi_composite)
+      - in: body
+        name: body
+        required: true
         schema:
           type: object
+          required:
+            - point
           properties:
-            status:
-              type: string
-              example: healthy
-            gee_project:
+            point:
               type: object
+              description: GeoJSON Point
               properties:
-                project_id:
-                  type: string
-                status:
+                type:
                   type: string
-                source:
+                  example: Point
+                coordinates:
+                  type: array
+                  items:
+                    type: number
+            date_periods:
+              type: array
+              description: Lista de períodos [start_date, end_date]
+              items:
+                type: array
+                items:
                   type: string
-            timestamp:
+                  example: '2024-01-01'
+            era5_source:
+              type: string
+              enum: [auto, hourly]
+              description: auto usa o ERA5-Land diário nos dias inteiros e o horário só nas bordas; hourly usa apenas o horário
+            period_parallelism:
+              type: integer
+              description: Períodos calculados ao mesmo tempo por tarefa (ver /ndvi_composite)
+            deadline_seconds:
               type: number
+              description: Prazo da requisição em segundos (ver /ndvi_composite)
+    responses:
+      200:
+        description: Estatísticas climáticas por período. Com Accept application/x-ndjson, uma linha {task, period, result} por período assim que fica pronto e uma linha final {done}
+        schema:
+          type: object
+      400:
+        description: Requisição inválida
+      401:
+        description: Não autorizado (API Key ausente ou inválida)
       500:
-        description: Erro ao verificar saúde
+        description: Erro interno do servidor
+      503:
+        description: Servidor ocupado (fila do executor cheia); tente após Retry-After segundos
+    """
+    start_time = time.time()
+    try:
+        gee_session.ensure_initialized()
+        data = request.json
+        validation_error = validate_climate_request(data)
+        if validation_error:
+            return jsonify({'error': validation_error}), 400
+
+        if wants_ndjson():
+            return stream_period_results(compute_climate_stats, data, start_time)
+
+        precomputed = precomputed_result('climate_stats', data)
+        if precomputed:
+            results, computed_at = precomputed
+        else:
+            results, computed_at = request_coalescer.do(
+                request_fingerprint('climate_stats', data), lambda: compute_climate_stats(data)
+            ), None
+        
+        # Adicionar tempo de processamento e informações do projeto
+        processing_time = time.time() - start_time
+        results['processing_time_seconds'] = round(processing_time, 2)
+        results['project_info'] = get_project_info()
+        
+        return precomputed_response(jsonify(results), computed_at)
+    except ExecutorSaturated:
+        return executor_saturated_response()
+    except Exception as e:
+        processing_time = time.time() - start_time
+        return jsonify({
+            'error': str(e), 
+            'processing_time_seconds': round(processing_time, 2),
+            'project_info': get_project_info()
+        }), 500
+
+@app.route('/climate_stats_batch', methods=['POST'])
+@require_api_key
+@admission_control
+def climate_stats_batch():
+    """Calcula estatísticas climáticas para vários pontos em lote.
+    ---
+    tags:
+      - Climate
+    consumes:
+      - application/json
+    produces:
+      - application/json
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: Chave de API válida
+      - in: body
+        name: body
+        required: true
         schema:
           type: object
+          required:
+            - points
           properties:
-            status:
+            points:
+              type: object
+              description: GeoJSON MultiPoint ou FeatureCollection de Points (o id da feição identifica o ponto)
+            date_periods:
+              type: array
+              description: Lista de períodos [start_date, end_date]
+              items:
+                type: array
+                items:
+                  type: string
+                  example: '2024-01-01'
+            era5_source:
               type: string
-              example: unhealthy
-            error:
+              enum: [auto, hourly]
+              description: Fonte da temperatura (ver /climate_stats)
+            sampling:
               type: string
-            timestamp:
+              enum: [ee, local]
+              description: local baixa um raster por conjunto (computePixels) e amostra os pontos com NumPy; ee usa reduceRegions
+    responses:
+      200:
+        description: Estatísticas climáticas por ponto e por período
+        schema:
+          type: object
+          properties:
+            results:
+              type: object
+              description: Mapa point_id -> {precipitation, temperature}
+            point_count:
+              type: integer
+            processing_time_seconds:
               type: number
+            project_info:
+              type: object
+      400:
+        description: Requisição inválida
+      401:
+        description: Não autorizado (API Key ausente ou inválida)
+      500:
+        description: Erro interno do servidor
+      503:
+        description: Servidor ocupado (fila do executor cheia); tente após Retry-After segundos
     """
+    start_time = time.time()
     try:
-        project_info = get_project_info()
+        gee_session.ensure_initialized()
+        data = request.json
+        if not data or 'points' not in data:
+            return jsonify({'error': 'GeoJSON de pontos ausente'}), 400
+        try:
+            points = parse_batch_points(data['points'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        results = calculate_climate_batch_logic(data, points)
+
+        processing_time = time.time() - start_time
         return jsonify({
-            'status': 'healthy',
-            'gee_project': project_info,
-            'timestamp': time.time()
+            'results': results,
+            'point_count': len(points),
+            'processing_time_seconds': round(processing_time, 2),
+            'project_info': get_project_info()
         })
+    except ExecutorSaturated:
+        return executor_saturated_response()
     except Exception as e:
+        processing_time = time.time() - start_time
         return jsonify({
-            'status': 'unhealthy',
             'error': str(e),
-            'timestamp': time.time()
+            'processing_time_seconds': round(processing_time, 2),
+            'project_info': get_project_info()
         }), 500
 
-@app.route('/ndvi_composite', methods=['POST'])
+@app.route('/ndvi_batch', methods=['POST'])
+@require_api_key
+@admission_control
+def ndvi_batch():
+    """Calcula estatísticas de NDVI para vários talhões, com resposta em streaming (NDJSON).
+    ---
+    tags:
+      - NDVI
+    consumes:
+      - application/json
+    produces:
+      - application/x-ndjson
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: Chave de API válida
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - fields
+          properties:
+            fields:
+              type: object
+              description: GeoJSON FeatureCollection de Polygons/MultiPolygons (o id da feição identifica o talhão)
+            date_periods:
+              type: array
+              description: Lista de períodos [start_date, end_date]
+              items:
+                type: array
+                items:
+                  type: string
+                  example: '2024-01-01'
+    responses:
+      200:
+        description: Uma linha JSON por talhão ({field_id, ndvi}) e uma linha final com {done, field_count, processing_time_seconds}
+      400:
+        description: Requisição inválida
+      401:
+        description: Não autorizado (API Key ausente ou inválida)
+      500:
+        description: Erro interno do servidor
+      503:
+        description: Servidor ocupado (fila do executor cheia); tente após Retry-After segundos
+    """
+    start_time = time.time()
+    try:
+        gee_session.ensure_initialized()
+        data = request.json
+        if not data or not isinstance(data.get('fields'), dict) or data['fields'].get('type') != 'FeatureCollection':
+            return jsonify({'error': 'GeoJSON FeatureCollection de talhões inválido'}), 400
+        try:
+            fields = parse_feature_collection(data['fields'], ['Polygon', 'MultiPolygon'], NDVI_BATCH_MAX_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e), 'project_info': get_project_info()}), 500
+
+    def items():
+        yield from iter_ndvi_batch_results(data, fields)
+        yield {
+            'done': True,
+            'field_count': len(fields),
+            'processing_time_seconds': round(time.time() - start_time, 2),
+            'project_info': get_project_info()
+        }
+
+    return ndjson_response(items())
+
+@app.route('/ndvi_timeseries', methods=['POST'])
 @require_api_key
-def ndvi_composite():
-    """Gera estatísticas de NDVI e URLs de tiles para períodos de data.
+def ndvi_timeseries():
+    """Série temporal de NDVI com todas as cenas limpas do intervalo.
     ---
     tags:
       - NDVI
@@ -523,42 +4136,28 @@ def ndvi_composite():
           type: object
           required:
             - roi
+            - start_date
+            - end_date
           properties:
             roi:
               type: object
-              description: GeoJSON Polygon da ROI
-              properties:
-                type:
-                  type: string
-                  example: Polygon
-                coordinates:
-                  type: array
-                  items:
-                    type: array
-                    items:
-                      type: array
-                      items:
-                        type: number
-            date_periods:
+              description: GeoJSON Polygon da área de interesse
+            start_date:
+              type: string
+              example: '2024-01-01'
+            end_date:
+              type: string
+              description: Data final (exclusiva)
+              example: '2024-07-01'
+            satellites:
               type: array
-              description: Lista de períodos [start_date, end_date]
+              description: Satélites incluídos (padrão sentinel e landsat)
               items:
-                type: array
-                items:
-                  type: string
-                  example: '2024-01-01'
+                type: string
+                enum: [sentinel, landsat]
     responses:
       200:
-        description: Resultados de NDVI por período e URLs de tiles
-        schema:
-          type: object
-          properties:
-            ndvi:
-              type: object
-            ndvi_tiles:
-              type: object
-            project_info:
-              type: object
+        description: Lista ordenada por data de {date, satellite, scene_id, ndvi_mean, ndvi_min, ndvi_max, valid_pixel_fraction, cloud_coverage_roi}
       400:
         description: Requisição inválida
       401:
@@ -566,33 +4165,27 @@ def ndvi_composite():
       500:
         description: Erro interno do servidor
     """
+    start_time = time.time()
     try:
-        initialize_gee()
+        gee_session.ensure_initialized()
         data = request.json
-        if not data or 'roi' not in data or 'coordinates' not in data['roi']:
-            return jsonify({'error': 'GeoJSON de ROI (polígono) inválido'}), 400
-        
-        tasks = [
-            (calculate_ndvi_logic, 'ndvi'),
-            (get_ndvi_tiles_logic, 'ndvi_tiles'),
-#            (get_image_tile_logic, 'image_tiles')
-        ]
-        results = run_composite_tasks(data, tasks)
-        
-        # Adicionar informações do projeto na resposta
-        results['project_info'] = get_project_info()
-        
-        return jsonify(results)
+        error = validate_ndvi_timeseries_request(data)
+        if error:
+            return jsonify({'error': error}), 400
+        result = calculate_ndvi_timeseries(data)
+        result['processing_time_seconds'] = round(time.time() - start_time, 2)
+        result['project_info'] = get_project_info()
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e), 'project_info': get_project_info()}), 500
 
-@app.route('/climate_stats', methods=['POST'])
+@app.route('/jobs', methods=['POST'])
 @require_api_key
-def climate_stats():
-    """Calcula estatísticas climáticas (precipitação e temperatura) para um ponto.
+def submit_job():
+    """Submete um cálculo longo para execução em segundo plano.
     ---
     tags:
-      - Climate
+      - Jobs
     consumes:
       - application/json
     produces:
@@ -611,72 +4204,627 @@ def climate_stats():
         schema:
           type: object
           required:
-            - point
+            - type
+            - params
           properties:
-            point:
+            type:
+              type: string
+              enum: [ndvi_composite, climate_stats]
+            params:
               type: object
-              description: GeoJSON Point
-              properties:
-                type:
-                  type: string
-                  example: Point
-                coordinates:
-                  type: array
-                  items:
-                    type: number
-            date_periods:
-              type: array
-              description: Lista de períodos [start_date, end_date]
-              items:
-                type: array
-                items:
-                  type: string
-                  example: '2024-01-01'
+              description: Mesmo corpo aceito pelo endpoint síncrono correspondente
+    responses:
+      202:
+        description: Job aceito; acompanhe em status_url
+      400:
+        description: Requisição inválida
+      401:
+        description: Não autorizado (API Key ausente ou inválida)
+      503:
+        description: Fila de jobs cheia
+    """
+    data = request.json or {}
+    kind = data.get('type')
+    payload = data.get('params')
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Tipo de job inválido. Use um de: {", ".join(JOB_KINDS)}'}), 400
+    validation_error = JOB_KINDS[kind]['validate'](payload)
+    if validation_error:
+        return jsonify({'error': validation_error}), 400
+
+    try:
+        job = job_runner.submit(kind, payload, job_owner(request.headers.get('X-API-Key')))
+    except JobQueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    status_url = f"/jobs/{job['job_id']}"
+    response = jsonify({'job_id': job['job_id'], 'status': job['status'], 'status_url': status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@require_api_key
+def get_job(job_id):
+    """Consulta o estado, o progresso por período e o resultado de um job.
+    ---
+    tags:
+      - Jobs
+    produces:
+      - application/json
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: Chave de API válida
+      - name: job_id
+        in: path
+        type: string
+        required: true
+      - name: wait
+        in: query
+        type: number
+        required: false
+        description: Long-poll, aguarda até N segundos o job terminar (máximo JOB_MAX_WAIT_SECONDS)
     responses:
       200:
-        description: Estatísticas climáticas por período
+        description: Estado do job (queued, running, succeeded, failed), progresso e resultado
+      401:
+        description: Não autorizado (API Key ausente ou inválida)
+      404:
+        description: Job não encontrado
+    """
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), JOB_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro wait inválido'}), 400
+
+    job = job_runner.store.get(job_id)
+    if not job or job['owner'] != job_owner(request.headers.get('X-API-Key')):
+        return jsonify({'error': 'Job não encontrado'}), 404
+    if wait and job['status'] not in JOB_FINAL_STATUSES:
+        job = job_runner.store.wait(job_id, wait)
+    return jsonify(public_job_view(job))
+
+def subscriptions_disabled_response():
+    return jsonify({'error': 'Assinaturas desativadas; defina SUBSCRIPTIONS_PATH'}), 503
+
+@app.route('/subscriptions', methods=['POST'])
+@require_api_key
+def create_subscription():
+    """Registra uma assinatura: geometria e janelas relativas recalculadas em segundo plano.
+    ---
+    tags:
+      - Assinaturas
+    consumes:
+      - application/json
+    produces:
+      - application/json
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: Chave de API válida
+      - in: body
+        name: body
+        required: true
         schema:
           type: object
+          required:
+            - type
+            - params
+            - period_templates
+          properties:
+            type:
+              type: string
+              enum: [ndvi_composite, climate_stats]
+            params:
+              type: object
+              description: Corpo do endpoint síncrono correspondente, sem os períodos (roi ou point, vis_params, era5_source)
+            period_templates:
+              type: array
+              description: Janelas relativas à data atual (UTC), resolvidas a cada ciclo e na ordem dada
+              items:
+                type: string
+                example: last_30_days
+    responses:
+      201:
+        description: Assinatura criada; o resultado fica disponível após o próximo ciclo do agendador
       400:
         description: Requisição inválida
       401:
         description: Não autorizado (API Key ausente ou inválida)
-      500:
-        description: Erro interno do servidor
+      503:
+        description: Assinaturas desativadas neste servidor
     """
-    start_time = time.time()
+    if not subscription_store.enabled:
+        return subscriptions_disabled_response()
+    data = request.json or {}
+    kind = data.get('type')
+    params = {k: v for k, v in (data.get('params') or {}).items() if k in SUBSCRIPTION_PARAMS}
+    templates = data.get('period_templates')
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Tipo de assinatura inválido. Use um de: {", ".join(JOB_KINDS)}'}), 400
+    validation_error = JOB_KINDS[kind]['validate'](params)
+    if validation_error:
+        return jsonify({'error': validation_error}), 400
+    if (not isinstance(templates, list) or not 1 <= len(templates) <= SUBSCRIPTION_MAX_TEMPLATES
+            or any(resolve_period_template(template, utc_today()) is None for template in templates)):
+        return jsonify({'error': 'period_templates deve ter de 1 a '
+                        f'{SUBSCRIPTION_MAX_TEMPLATES} modelos: last_<N>_days, month_to_date ou previous_month'}), 400
+
+    owner = job_owner(request.headers.get('X-API-Key'))
+    if subscription_store.count(owner) >= SUBSCRIPTION_MAX_PER_OWNER:
+        return jsonify({'error': f'Limite de {SUBSCRIPTION_MAX_PER_OWNER} assinaturas atingido'}), 400
+
+    subscription = {
+        'subscription_id': uuid.uuid4().hex,
+        'owner': owner,
+        'kind': kind,
+        'params': params,
+        'period_templates': templates,
+        'created_at': time.time(),
+        'status': 'pending',
+    }
+    subscription_store.create(subscription)
+    subscription_scheduler.ensure_thread()
+    view = public_subscription_view(subscription)
+    view['date_periods'] = subscription_payload(subscription, utc_today())['date_periods']
+    response = jsonify(view)
+    response.headers['Location'] = f"/subscriptions/{subscription['subscription_id']}"
+    return response, 201
+
+@app.route('/subscriptions', methods=['GET'])
+@require_api_key
+def list_subscriptions():
+    """Lista as assinaturas da API key com o estado do último cálculo.
+    ---
+    tags:
+      - Assinaturas
+    produces:
+      - application/json
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: Chave de API válida
+    responses:
+      200:
+        description: Assinaturas (pending, ready, failed), sem os resultados
+      401:
+        description: Não autorizado (API Key ausente ou inválida)
+      503:
+        description: Assinaturas desativadas neste servidor
+    """
+    if not subscription_store.enabled:
+        return subscriptions_disabled_response()
+    owner = job_owner(request.headers.get('X-API-Key'))
+    return jsonify({'subscriptions': [public_subscription_view(s) for s in subscription_store.list(owner)]})
+
+@app.route('/subscriptions/<subscription_id>', methods=['GET'])
+@require_api_key
+def get_subscription(subscription_id):
+    """Consulta uma assinatura e o último resultado pré-calculado.
+    ---
+    tags:
+      - Assinaturas
+    produces:
+      - application/json
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: Chave de API válida
+      - name: subscription_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Assinatura, períodos do último cálculo (date_periods), computed_at e resultado no formato do endpoint síncrono
+      401:
+        description: Não autorizado (API Key ausente ou inválida)
+      404:
+        description: Assinatura não encontrada
+      503:
+        description: Assinaturas desativadas neste servidor
+    """
+    if not subscription_store.enabled:
+        return subscriptions_disabled_response()
+    subscription = subscription_store.get(subscription_id)
+    if not subscription or subscription['owner'] != job_owner(request.headers.get('X-API-Key')):
+        return jsonify({'error': 'Assinatura não encontrada'}), 404
+    return jsonify(public_subscription_view(subscription, include_result=True))
+
+@app.route('/subscriptions/<subscription_id>', methods=['DELETE'])
+@require_api_key
+def delete_subscription(subscription_id):
+    """Remove uma assinatura e seu resultado.
+    ---
+    tags:
+      - Assinaturas
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: Chave de API válida
+      - name: subscription_id
+        in: path
+        type: string
+        required: true
+    responses:
+      204:
+        description: Assinatura removida
+      401:
+        description: Não autorizado (API Key ausente ou inválida)
+      404:
+        description: Assinatura não encontrada
+      503:
+        description: Assinaturas desativadas neste servidor
+    """
+    if not subscription_store.enabled:
+        return subscriptions_disabled_response()
+    if not subscription_store.delete(subscription_id, job_owner(request.headers.get('X-API-Key'))):
+        return jsonify({'error': 'Assinatura não encontrada'}), 404
+    return '', 204
+
+# >>> MODO ASSÍNCRONO (ASGI) <<<
+# Alternativa ao Flask síncrono para nós com muitas requisições simultâneas: /ndvi_composite e
+# /climate_stats montam os mesmos grafos de uma ida e volta e aguardam o EE pela API REST
+# (value:compute e maps) com um cliente HTTP assíncrono, sem ocupar uma thread por chamada.
+# As demais rotas (e respostas NDJSON) continuam no Flask. Uso: uvicorn app:asgi_app
+EE_REST_BASE_URL = os.getenv('EE_REST_BASE_URL', 'https://earthengine.googleapis.com')
+EE_REST_VERSION = 'v1'
+ASGI_MAX_CONNECTIONS = int(os.getenv('ASGI_MAX_CONNECTIONS', '100'))
+ASGI_MAX_IN_FLIGHT_EE_CALLS = int(os.getenv('ASGI_MAX_IN_FLIGHT_EE_CALLS', '200'))
+ASGI_MAX_IN_FLIGHT_REQUESTS = int(os.getenv('ASGI_MAX_IN_FLIGHT_REQUESTS', '500'))
+ASGI_EE_TIMEOUT_SECONDS = float(os.getenv('ASGI_EE_TIMEOUT_SECONDS', '120'))
+
+# Parâmetros de vis_params aceitos por ee.Image.visualize()
+VISUALIZE_PARAMS = ('bands', 'min', 'max', 'gain', 'bias', 'gamma', 'opacity', 'palette')
+
+class AsyncEEClient:
+    """Chamadas REST ao EE com httpx: pool de conexões, limite de chamadas simultâneas e novas tentativas.
+
+    Cliente e semáforo são criados no primeiro uso dentro do event loop (após o fork dos workers).
+    `transport` permite apontar para um transporte httpx de teste.
+    """
+
+    def __init__(self, base_url, max_connections, max_in_flight, timeout, transport=None):
+        self.base_url = base_url.rstrip('/')
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.transport = transport
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=self.timeout,
+                transport=self.transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._client, self._semaphore
+
+    async def _headers(self):
+        credentials = gee_session.credentials
+        if credentials is None:
+            await asyncio.to_thread(gee_session.ensure_initialized)
+            credentials = gee_session.credentials
+        if hasattr(credentials, 'refresh') and not credentials.valid:
+            await asyncio.to_thread(credentials.refresh, google.auth.transport.requests.Request())
+        headers = {'x-goog-user-project': gee_project_id()}
+        token = getattr(credentials, 'token', None)
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        return headers
+
+    async def _post(self, path, body):
+        client, semaphore = self._bind()
+        context = current_request.get()
+        url = f'{self.base_url}/{EE_REST_VERSION}/projects/{gee_project_id()}/{path}'
+        attempt = 0
+        while True:
+            remaining = context.remaining() if context else None
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(TIMED_OUT_MESSAGE)
+            try:
+                async with semaphore:
+                    post = client.post(url, json=body, headers=await self._headers())
+                    # Com prazo, a chamada em andamento é cancelada quando ele acaba
+                    response = await (post if remaining is None else asyncio.wait_for(post, context.remaining()))
+                payload = response.json() if response.content else {}
+                if response.status_code >= 400:
+                    error = payload.get('error') or {}
+                    raise ee.EEException(f"{response.status_code} {error.get('status', '')}: {error.get('message', response.text)}")
+                return payload
+            except asyncio.TimeoutError as e:
+                raise DeadlineExceeded(TIMED_OUT_MESSAGE) from e
+            except (ee.EEException, httpx.TransportError) as e:
+                # Tempo esgotado pelo prazo da requisição, não por falha do EE
+                if context and context.expired():
+                    raise DeadlineExceeded(TIMED_OUT_MESSAGE) from e
+                gee_session.report_error(e)
+                metrics.inc('gee_ee_errors_total', {'class': classify_ee_error(e)})
+                attempt += 1
+                if not (is_retryable_error(e) or isinstance(e, httpx.TransportError)):
+                    raise
+                if attempt >= EE_RETRY_MAX_ATTEMPTS or (context and not context.take_retry()):
+                    ee_retry_stats['exhausted'] += 1
+                    raise
+                ee_retry_stats['retries'] += 1
+                delay = min(EE_RETRY_MAX_DELAY_SECONDS, EE_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+                remaining = context.remaining() if context else None
+                await asyncio.sleep(random.uniform(0, delay) if remaining is None else min(random.uniform(0, delay), remaining))
+
+    async def compute_value(self, ee_object, stage='getInfo', satellite=None):
+        """Equivalente assíncrono de getInfo() (projects.value.compute)."""
+        with stage_timer(stage, satellite):
+            payload = await self._post('value:compute', {'expression': ee.serializer.encode(ee_object, for_cloud_api=True)})
+        return payload.get('result')
+
+    async def create_map(self, image, vis_params, satellite=None):
+        """Equivalente assíncrono de getMapId() (projects.maps.create); devolve o url_format dos tiles."""
+        vis = {key: value for key, value in (vis_params or {}).items() if key in VISUALIZE_PARAMS}
+        visualized = image.visualize(**vis) if vis else image
+        with stage_timer('getMapId', satellite):
+            payload = await self._post('maps?fields=name', {
+                'expression': ee.serializer.encode(visualized, for_cloud_api=True),
+                'fileFormat': 'AUTO_JPEG_PNG',
+            })
+        return f"{self.base_url}/{EE_REST_VERSION}/{payload['name']}/tiles/{{z}}/{{x}}/{{y}}"
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+async_ee_client = AsyncEEClient(EE_REST_BASE_URL, ASGI_MAX_CONNECTIONS, ASGI_MAX_IN_FLIGHT_EE_CALLS, ASGI_EE_TIMEOUT_SECONDS)
+
+def cached_ndvi_periods(roi_key, periods):
+    """Estatísticas e cenas já em cache por período ({período: ...}, {período: ...})."""
+    stats, scenes = {}, {}
+    if RESULT_CACHE_ENABLED:
+        for period_name, dates in periods.items():
+            cached_stats = ndvi_result_cache.get(ndvi_stats_cache_key(roi_key, dates['start_date'], dates['end_date']))
+            cached_scene = tile_cache.get(scene_cache_key(roi_key, dates['start_date'], dates['end_date']))
+            if cached_stats is not None and cached_scene is not None:
+                stats[period_name], scenes[period_name] = cached_stats, cached_scene
+    return stats, scenes
+
+def store_ndvi_periods(roi_key, periods, stats, scenes):
+    for period_name, dates in periods.items():
+        ttl = period_cache_ttl(dates['end_date'])
+        ndvi_result_cache.set(ndvi_stats_cache_key(roi_key, dates['start_date'], dates['end_date']), stats[period_name], ttl)
+        tile_cache.set(scene_cache_key(roi_key, dates['start_date'], dates['end_date']), scenes[period_name], ttl)
+
+async def compute_ndvi_composite_async(data):
+    """Mesma resposta de compute_ndvi_composite com uma chamada value:compute para todos os períodos.
+
+    A escolha Sentinel/Landsat acontece no grafo (build_ndvi_period_graph). Os map ids dos
+    períodos com cena válida são criados em paralelo. Usa os mesmos caches de estatísticas,
+    cenas e URLs de tiles do modo síncrono.
+    """
+    roi = ee.Geometry.Polygon(data['roi']['coordinates'])
+    roi_key = roi_hash(data['roi']['coordinates'])
+    periods = extract_date_periods(data)
+    vis_params = data.get('vis_params', DEFAULT_NDVI_VIS_PARAMS)
+
+    # Caches (camada SQLite) e catálogo de cenas fazem I/O bloqueante: rodam fora do event loop
+    stats, scenes = await asyncio.to_thread(cached_ndvi_periods, roi_key, periods)
+
+    missing = {name: dates for name, dates in periods.items() if name not in stats}
+    if missing:
+        graph = await asyncio.to_thread(lambda: ee.Dictionary({
+            period_name: build_ndvi_period_graph(roi, dates['start_date'], dates['end_date'])
+            for period_name, dates in missing.items()
+        }))
+        try:
+            all_stats = await async_ee_client.compute_value(graph, 'ndvi_period_graph')
+        except DeadlineExceeded:
+            # Como em run_periods: os períodos já em cache seguem na resposta
+            return {
+                'ndvi': {name: stats.get(name) or timed_out_result() for name in periods},
+                'ndvi_tiles': timed_out_periods(periods),
+            }
+        except Exception as e:
+            # Como no modo síncrono: a falha vira o resultado de cada tarefa, não um 500
+            return {'ndvi': {'error': str(e)}, 'ndvi_tiles': {'error': str(e)}}
+        for period_name, dates in missing.items():
+            period_stats = all_stats.get(period_name) or {}
+            stats[period_name] = format_ndvi_period_stats(period_stats)
+            scene_id = period_stats.get('scene_id') if 'error' not in stats[period_name] else None
+            scenes[period_name] = {'scene_id': scene_id, 'satellite': stats[period_name]['satellite']}
+            record_scene_selection(stats[period_name]['satellite'])
+        if RESULT_CACHE_ENABLED:
+            await asyncio.to_thread(store_ndvi_periods, roi_key, missing, stats, scenes)
+
+    async def tile_for(period_name):
+        scene = scenes[period_name]
+        if not scene.get('scene_id'):
+            return dict(NO_VALID_SCENE_RESULT)
+        key = tile_url_cache_key(scene['scene_id'], roi_key, vis_params)
+        tile_url = await asyncio.to_thread(tile_cache.get, key) if TILE_URL_TTL_SECONDS > 0 else None
+        if tile_url is None:
+            ndvi = scene_from_id(scene['scene_id'], scene['satellite'], roi)['ndvi']
+            tile_url = await async_ee_client.create_map(ndvi, vis_params, scene['satellite'])
+            if TILE_URL_TTL_SECONDS > 0:
+                await asyncio.to_thread(tile_cache.set, key, tile_url, TILE_URL_TTL_SECONDS)
+        return {'tile_url': public_tile_url(tile_url, scene['scene_id'], roi_key, vis_params),
+                'satellite': scene['satellite']}
+
+    tiles = await asyncio.gather(*(tile_for(period_name) for period_name in periods), return_exceptions=True)
+    return {
+        'ndvi': {period_name: stats[period_name] for period_name in periods},
+        'ndvi_tiles': {
+            period_name: (timed_out_result() if isinstance(tile, DeadlineExceeded)
+                          else {'error': str(tile)} if isinstance(tile, Exception) else tile)
+            for period_name, tile in zip(periods, tiles)
+        },
+    }
+
+async def compute_climate_stats_async(data):
+    """Mesma resposta de compute_climate_stats com uma chamada value:compute (grafo do lote com um ponto)."""
+    periods = extract_date_periods(data)
+    features = ee.FeatureCollection([ee.Feature(ee.Geometry.Point(data['point']['coordinates']), {'point_id': 'point'})])
+    graph = build_climate_batch_graph(features, periods, era5_source(data))
     try:
-        initialize_gee()
-        data = request.json
-        if not data or 'point' not in data or 'coordinates' not in data['point']:
-            return jsonify({'error': 'GeoJSON de ponto inválido'}), 400
-        
-        point = ee.Geometry.Point(data['point']['coordinates'])
-        
-        tasks = [
-            (calculate_chirps_logic_optimized, 'precipitation'),
-            (calculate_era5_temp_logic_optimized, 'temperature')
-        ]
-        results = run_composite_tasks(data, tasks, point)
-        
-        # Adicionar tempo de processamento e informações do projeto
-        processing_time = time.time() - start_time
-        results['processing_time_seconds'] = round(processing_time, 2)
-        results['project_info'] = get_project_info()
-        
-        return jsonify(results)
+        point_stats = await async_ee_client.compute_value(graph, 'climate_batch_reduction')
+    except DeadlineExceeded:
+        return {'precipitation': timed_out_periods(periods), 'temperature': timed_out_periods(periods)}
     except Exception as e:
-        processing_time = time.time() - start_time
-        return jsonify({
-            'error': str(e), 
-            'processing_time_seconds': round(processing_time, 2),
-            'project_info': get_project_info()
-        }), 500
+        return {'precipitation': {'error': str(e)}, 'temperature': {'error': str(e)}}
+    results = {'point': {'precipitation': {}, 'temperature': {}}}
+    collect_climate_batch_results(point_stats, periods, results)
+    return results['point']
+
+class AsyncGateway:
+    """Aplicação ASGI: rotas assíncronas próprias e o Flask (via asgiref) para todo o resto.
+
+    Requisições idênticas em andamento compartilham a mesma tarefa; acima de
+    ASGI_MAX_IN_FLIGHT_REQUESTS as rotas assíncronas respondem 503 com Retry-After.
+    """
+
+    def __init__(self, flask_app):
+        self.wsgi = WsgiToAsgi(flask_app) if WsgiToAsgi else None
+        self.routes = {
+            ('POST', '/ndvi_composite'): ('ndvi_composite', validate_ndvi_request, compute_ndvi_composite_async),
+            ('POST', '/climate_stats'): ('climate_stats', validate_climate_request, compute_climate_stats_async),
+        }
+        self.in_flight = 0
+        self._tasks = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        route = self.routes.get((scope.get('method'), scope.get('path')))
+        if scope['type'] == 'http' and route and httpx is not None and 'application/x-ndjson' not in headers.get('accept', ''):
+            await self._handle(route, headers, receive, send)
+        elif self.wsgi is not None:
+            await self.wsgi(scope, receive, send)
+        else:
+            await self._send_json(send, 503, {'error': 'Modo ASGI requer httpx e asgiref instalados'})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_ee_client.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _send_json(send, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        raw_headers += [(k.encode('latin-1'), str(v).encode('latin-1')) for k, v in (headers or {}).items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def _handle(self, route, headers, receive, send):
+        endpoint, validate, compute = route
+        started = time.perf_counter()
+        start_time = time.time()
+        status, payload, extra_headers = 500, {}, {}
+        context = None
+        try:
+            auth_error = api_key_error(headers.get('x-api-key'))
+            if auth_error:
+                status, payload = 401, {'error': auth_error}
+                return
+            if self.in_flight >= ASGI_MAX_IN_FLIGHT_REQUESTS:
+                status, payload = 503, {'error': 'Servidor ocupado, tente novamente em instantes'}
+                extra_headers = {'Retry-After': EXECUTOR_RETRY_AFTER_SECONDS}
+                return
+            try:
+                data = json.loads(await self._read_body(receive) or b'null')
+            except ValueError:
+                data = None
+            validation_error = validate(data)
+            if validation_error:
+                status, payload = 400, {'error': validation_error}
+                return
+
+            deadline_seconds = request_deadline_seconds(headers.get(REQUEST_DEADLINE_HEADER.lower()), data)
+            context = RequestContext(job_owner(headers.get('x-api-key')), endpoint=endpoint, deadline_seconds=deadline_seconds)
+            token = current_request.set(context)
+            self.in_flight += 1
+            try:
+                precomputed = await asyncio.to_thread(precomputed_result, endpoint, data)
+                if precomputed:
+                    payload, computed_at = precomputed
+                    extra_headers['X-Precomputed-At'] = precomputed_at_header(computed_at)
+                else:
+                    payload = await self._coalesced(request_fingerprint(endpoint, data), compute, data)
+                status = 200
+            except Exception as e:
+                status, payload = 500, {'error': str(e)}
+            finally:
+                self.in_flight -= 1
+                current_request.reset(token)
+            if endpoint == 'climate_stats':
+                payload['processing_time_seconds'] = round(time.time() - start_time, 2)
+            payload['project_info'] = get_project_info()
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe('gee_request_duration_seconds', elapsed, {'endpoint': endpoint, 'status': str(status)})
+            if SERVER_TIMING_ENABLED and context is not None:
+                breakdown = server_timing_header(context)
+                total = f'total;dur={elapsed * 1000:.1f}'
+                extra_headers['Server-Timing'] = f'{breakdown}, {total}' if breakdown else total
+            await self._send_json(send, status, payload, extra_headers)
+
+    async def _coalesced(self, key, compute, data):
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(compute(data))
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # shield: o cancelamento de um cliente não cancela o cálculo compartilhado
+        return copy.deepcopy(await asyncio.shield(task))
+
+asgi_app = AsyncGateway(app)
 
 if __name__ == '__main__':
     # Inicializar GEE na inicialização da aplicação
     try:
-        initialize_gee()
+        gee_session.ensure_initialized()
         print("🚀 Aplicação Flask iniciada com sucesso!")
     except Exception as e:
         print(f"⚠️ Aviso: Erro na inicialização do GEE: {e}")
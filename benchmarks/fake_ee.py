@@ -0,0 +1,932 @@
+"""Backend falso do Google Earth Engine para benchmarks determinísticos.
+
+Substitui o módulo `ee` por um simulador em memória e avaliação imediata: as
+coleções são listas de imagens sintéticas, cada imagem é um pequeno vetor de
+pixels por banda (None = pixel mascarado) e as reduções são calculadas em Python.
+Apenas as chamadas que no EE real são idas e voltas HTTP (`getInfo`, `getMapId`,
+`ee.data.computePixels`) são contadas e sofrem a latência simulada. As chamadas REST
+do modo assíncrono (`value:compute`, `maps`) passam por `rest_handler`, que pode ser
+usado como handler de um `httpx.MockTransport`.
+
+Uso:
+    from benchmarks import fake_ee
+    fake_ee.install()            # registra o módulo em sys.modules['ee']
+    fake_ee.configure(scenario)  # define coleções e latência
+    import app
+"""
+import asyncio
+import datetime
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+import types
+
+PIXELS = 16
+
+# >>> CONTADORES E LATÊNCIA <<<
+_state_lock = threading.Lock()
+_state = {
+    'collections': {},
+    'latency': None,
+    'round_trips': {'getInfo': 0, 'getMapId': 0, 'computePixels': 0},
+    'in_flight': 0,
+    'peak_in_flight': 0,
+}
+_map_ids = itertools.count(1)
+
+
+def configure(collections=None, latency=None, seed=0):
+    """Define as coleções sintéticas e a distribuição de latência (segundos) por ida e volta."""
+    with _state_lock:
+        _state['collections'] = dict(collections or {})
+        _state['latency'] = latency
+        _state['rng'] = random.Random(seed)
+    reset_counters()
+
+
+def reset_counters():
+    with _state_lock:
+        _state['round_trips'] = {'getInfo': 0, 'getMapId': 0, 'computePixels': 0}
+        _state['in_flight'] = 0
+        _state['peak_in_flight'] = 0
+
+
+def counters():
+    with _state_lock:
+        return {
+            'round_trips': dict(_state['round_trips']),
+            'total_round_trips': sum(_state['round_trips'].values()),
+            'peak_in_flight': _state['peak_in_flight'],
+        }
+
+
+def _begin_round_trip(kind):
+    """Conta a ida e volta e devolve a latência simulada (segundos)."""
+    with _state_lock:
+        _state['round_trips'][kind] += 1
+        _state['in_flight'] += 1
+        _state['peak_in_flight'] = max(_state['peak_in_flight'], _state['in_flight'])
+        latency = _state['latency']
+        rng = _state.get('rng') or random.Random(0)
+        return latency(rng) if callable(latency) else (latency or 0)
+
+
+def _end_round_trip():
+    with _state_lock:
+        _state['in_flight'] -= 1
+
+
+def _round_trip(kind):
+    delay = _begin_round_trip(kind)
+    try:
+        if delay:
+            time.sleep(delay)
+    finally:
+        _end_round_trip()
+
+
+def fixed_latency(seconds):
+    return lambda rng: seconds
+
+
+def lognormal_latency(median, sigma=0.5):
+    import math
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+# >>> VALORES <<<
+class EEException(Exception):
+    pass
+
+
+def _resolve(value):
+    if isinstance(value, ComputedObject):
+        return value._value()
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_resolve(v) for v in value]
+    return value
+
+
+class ComputedObject:
+    def _value(self):
+        raise NotImplementedError
+
+    def getInfo(self):
+        _round_trip('getInfo')
+        return _resolve(self)
+
+    def serialize(self):
+        return repr(_resolve(self))
+
+
+class Number(ComputedObject):
+    def __init__(self, value):
+        self.v = _resolve(value)
+
+    def _value(self):
+        return self.v
+
+    def _op(self, other, fn):
+        a, b = self.v, _resolve(other)
+        if a is None or b is None:
+            return Number(None)
+        return Number(fn(a, b))
+
+    def add(self, o): return self._op(o, lambda a, b: a + b)
+    def subtract(self, o): return self._op(o, lambda a, b: a - b)
+    def multiply(self, o): return self._op(o, lambda a, b: a * b)
+    def divide(self, o): return self._op(o, lambda a, b: a / b if b else None)
+    def max(self, o): return self._op(o, max)
+    def min(self, o): return self._op(o, min)
+    def gt(self, o): return self._op(o, lambda a, b: int(a > b))
+    def gte(self, o): return self._op(o, lambda a, b: int(a >= b))
+    def lt(self, o): return self._op(o, lambda a, b: int(a < b))
+    def lte(self, o): return self._op(o, lambda a, b: int(a <= b))
+    def eq(self, o): return self._op(o, lambda a, b: int(a == b))
+    def And(self, o): return self._op(o, lambda a, b: int(bool(a) and bool(b)))
+    def Or(self, o): return self._op(o, lambda a, b: int(bool(a) or bool(b)))
+    def toInt(self): return Number(int(self.v) if self.v is not None else None)
+    def format(self, *args): return String(str(self.v))
+
+
+class String(ComputedObject):
+    def __init__(self, value):
+        self.v = _resolve(value)
+
+    def _value(self):
+        return self.v
+
+    def cat(self, other):
+        return String(f'{self.v}{_resolve(other)}')
+
+
+class List(ComputedObject):
+    def __init__(self, items):
+        self.items = list(items._value() if isinstance(items, ComputedObject) else items)
+
+    def _value(self):
+        return [_resolve(v) for v in self.items]
+
+    def get(self, index):
+        return _wrap(self.items[_resolve(index)])
+
+    def size(self):
+        return Number(len(self.items))
+
+    def map(self, fn):
+        return List([fn(_wrap(v)) for v in self.items])
+
+    def flatten(self):
+        out = []
+        for v in self._value():
+            out.extend(v if isinstance(v, list) else [v])
+        return List(out)
+
+
+class Dictionary(ComputedObject):
+    def __init__(self, data=None):
+        self.data = dict(_resolve(data) if isinstance(data, ComputedObject) else (data or {}))
+
+    def _value(self):
+        return {k: _resolve(v) for k, v in self.data.items()}
+
+    def get(self, key, default=None):
+        key = _resolve(key)
+        if key not in self.data:
+            if default is None:
+                raise EEException(f'Dictionary.get: key {key} not found')
+            return _wrap(default)
+        return _wrap(self.data[key])
+
+    def set(self, key, value):
+        data = dict(self.data)
+        data[_resolve(key)] = value
+        return Dictionary(data)
+
+    def combine(self, other, overwrite=True):
+        data = dict(self.data)
+        for k, v in _resolve(other).items():
+            if overwrite or k not in data:
+                data[k] = v
+        return Dictionary(data)
+
+    def keys(self):
+        return List(list(self.data))
+
+    def contains(self, key):
+        return Number(int(_resolve(key) in self.data))
+
+
+def _wrap(value):
+    if isinstance(value, ComputedObject):
+        return value
+    if isinstance(value, dict):
+        return Dictionary(value)
+    if isinstance(value, (list, tuple)):
+        return List(value)
+    if isinstance(value, str):
+        return String(value)
+    return Number(value)
+
+
+# >>> DATAS <<<
+def _parse_date(value):
+    value = _resolve(value)
+    if isinstance(value, (int, float)):
+        return datetime.datetime.utcfromtimestamp(value / 1000)
+    if isinstance(value, datetime.datetime):
+        return value
+    text = str(value).replace('Z', '')
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    try:
+        # Offsets como '-03:00' são convertidos para UTC, como faz o EE
+        parsed = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        raise EEException(f'Invalid date: {value}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _millis(dt):
+    return int((dt - datetime.datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+class Date(ComputedObject):
+    def __init__(self, value):
+        self.dt = value.dt if isinstance(value, Date) else _parse_date(value)
+
+    def _value(self):
+        return {'type': 'Date', 'value': _millis(self.dt)}
+
+    def millis(self):
+        return Number(_millis(self.dt))
+
+    def format(self, fmt=None):
+        return String(self.dt.strftime('%Y-%m-%d'))
+
+    def advance(self, delta, unit):
+        delta = _resolve(delta)
+        if unit == 'day':
+            return Date(self.dt + datetime.timedelta(days=delta))
+        if unit == 'hour':
+            return Date(self.dt + datetime.timedelta(hours=delta))
+        if unit == 'month':
+            month = self.dt.month - 1 + delta
+            return Date(self.dt.replace(year=self.dt.year + month // 12, month=month % 12 + 1))
+        raise EEException(f'Unsupported unit {unit}')
+
+    def difference(self, other, unit):
+        seconds = (self.dt - Date(other).dt).total_seconds()
+        return Number(seconds / {'day': 86400, 'hour': 3600}[unit])
+
+    @staticmethod
+    def fromYMD(y, m, d):
+        return Date(datetime.datetime(_resolve(y), _resolve(m), _resolve(d)))
+
+
+# >>> GEOMETRIAS E FEIÇÕES <<<
+class Geometry(ComputedObject):
+    def __init__(self, geo_json):
+        self.geo_json = geo_json
+
+    def _value(self):
+        return self.geo_json
+
+    @staticmethod
+    def Polygon(coords, *args, **kwargs):
+        return Geometry({'type': 'Polygon', 'coordinates': _resolve(coords)})
+
+    @staticmethod
+    def Point(coords, *args, **kwargs):
+        return Geometry({'type': 'Point', 'coordinates': _resolve(coords)})
+
+    @staticmethod
+    def MultiPoint(coords, *args, **kwargs):
+        return Geometry({'type': 'MultiPoint', 'coordinates': _resolve(coords)})
+
+    @staticmethod
+    def Rectangle(coords, *args, **kwargs):
+        x0, y0, x1, y1 = _resolve(coords)
+        return Geometry.Polygon([[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]])
+
+    def bounds(self, *args, **kwargs):
+        return self
+
+    def toGeoJSON(self):
+        return self.geo_json
+
+    def buffer(self, *args, **kwargs):
+        return self
+
+    def centroid(self, *args, **kwargs):
+        return self
+
+
+class Feature(ComputedObject):
+    def __init__(self, geometry, properties=None):
+        if isinstance(geometry, Feature):
+            properties = dict(geometry.properties, **(properties or {}))
+            geometry = geometry.geometry_
+        self.geometry_ = geometry
+        self.properties = dict(properties or {})
+
+    def _value(self):
+        geometry = _resolve(self.geometry_) if self.geometry_ is not None else None
+        return {'type': 'Feature', 'geometry': geometry, 'properties': _resolve(self.properties)}
+
+    def geometry(self):
+        return self.geometry_
+
+    def get(self, key):
+        return _wrap(self.properties.get(_resolve(key)))
+
+    def set(self, *args):
+        props = dict(self.properties)
+        if len(args) == 1:
+            props.update(_resolve(args[0]))
+        else:
+            props[_resolve(args[0])] = args[1]
+        return Feature(self.geometry_, props)
+
+    def setGeometry(self, geometry):
+        return Feature(geometry, self.properties)
+
+    def id(self):
+        return String(self.properties.get('system:index'))
+
+
+class FeatureCollection(ComputedObject):
+    def __init__(self, features):
+        if isinstance(features, FeatureCollection):
+            features = features.features
+        elif hasattr(features, 'images'):
+            # ImageCollection.map() que devolve Features
+            features = features.images
+        self.features = [f if isinstance(f, Feature) else Feature(f) for f in features]
+
+    def _value(self):
+        return {'type': 'FeatureCollection', 'features': [f._value() for f in self.features]}
+
+    def map(self, fn):
+        return FeatureCollection([fn(f) for f in self.features])
+
+    def filter(self, flt):
+        return FeatureCollection([f for f in self.features if flt.predicate(_resolve(f.properties))])
+
+    def merge(self, other):
+        return FeatureCollection(self.features + other.features)
+
+    def size(self):
+        return Number(len(self.features))
+
+    def geometry(self):
+        return Geometry({'type': 'GeometryCollection'})
+
+    def aggregate_array(self, prop):
+        return List([f.properties.get(prop) for f in self.features])
+
+    def select(self, propertySelectors, newProperties=None, retainGeometry=True):
+        names = newProperties or propertySelectors
+        return FeatureCollection([
+            Feature(f.geometry_ if retainGeometry else None,
+                    {new: f.properties.get(old) for old, new in zip(propertySelectors, names)})
+            for f in self.features
+        ])
+
+    def toList(self, count, offset=0):
+        return List(self.features[offset:offset + _resolve(count)])
+
+
+# >>> REDUTORES <<<
+def _percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Reducer:
+    def __init__(self, outputs):
+        # outputs: lista de (nome, função)
+        self.outputs = outputs
+
+    @staticmethod
+    def mean():
+        return Reducer([('mean', lambda v: sum(v) / len(v) if v else None)])
+
+    @staticmethod
+    def sum():
+        return Reducer([('sum', lambda v: sum(v) if v else 0)])
+
+    @staticmethod
+    def count():
+        return Reducer([('count', len)])
+
+    @staticmethod
+    def first():
+        return Reducer([('first', lambda v: v[0] if v else None)])
+
+    @staticmethod
+    def minMax():
+        return Reducer([('min', lambda v: min(v) if v else None), ('max', lambda v: max(v) if v else None)])
+
+    @staticmethod
+    def min():
+        return Reducer([('min', lambda v: min(v) if v else None)])
+
+    @staticmethod
+    def max():
+        return Reducer([('max', lambda v: max(v) if v else None)])
+
+    @staticmethod
+    def percentile(percentiles):
+        return Reducer([(f'p{p}', lambda v, p=p: _percentile(v, p) if v else None) for p in percentiles])
+
+    def combine(self, reducer2, outputPrefix='', sharedInputs=False):
+        return Reducer(self.outputs + [(outputPrefix + name, fn) for name, fn in reducer2.outputs])
+
+    def setOutputs(self, names):
+        return Reducer([(name, fn) for name, (_, fn) in zip(names, self.outputs)])
+
+    def reduce_bands(self, bands):
+        result = {}
+        single = len(self.outputs) == 1
+        for band, values in bands.items():
+            valid = [v for v in values if v is not None]
+            for name, fn in self.outputs:
+                key = band if single else f'{band}_{name}'
+                result[key] = fn(valid)
+        return result
+
+
+# >>> IMAGENS <<<
+def _pixelwise(a, b, fn):
+    return [None if x is None or y is None else fn(x, y) for x, y in zip(a, b)]
+
+
+class Image(ComputedObject):
+    def __init__(self, value=None, bands=None, props=None):
+        if isinstance(value, Image):
+            bands, props = value.bands, value.props
+        elif isinstance(value, str):
+            bands, props = _find_image(value)
+        elif isinstance(value, (int, float)):
+            bands = {'constant': [value] * PIXELS}
+        self.bands = dict(bands or {})
+        self.props = dict(props or {})
+
+    def _value(self):
+        return {'type': 'Image', 'bands': list(self.bands), 'properties': _resolve(self.props)}
+
+    def _derive(self, bands, props=None):
+        return Image(bands=bands, props=self.props if props is None else props)
+
+    def _binary(self, other, fn):
+        other_bands = other.bands if isinstance(other, Image) else None
+        out = {}
+        for i, (name, values) in enumerate(self.bands.items()):
+            if other_bands is None:
+                constant = _resolve(other)
+                rhs = [constant] * len(values)
+            else:
+                rhs = list(other_bands.values())[min(i, len(other_bands) - 1)]
+            out[name] = _pixelwise(values, rhs, fn)
+        return self._derive(out)
+
+    def select(self, selectors, *args):
+        names = selectors if isinstance(selectors, (list, tuple)) else [selectors]
+        names = [_resolve(n) for n in names]
+        new_names = _resolve(args[0]) if args else names
+        missing = [n for n in names if n not in self.bands]
+        if missing and self.bands:
+            raise EEException(f'Image.select: Band pattern {missing[0]} did not match any bands.')
+        return self._derive({new: self.bands.get(old, [None] * PIXELS) for old, new in zip(names, new_names)})
+
+    def rename(self, *names):
+        names = names[0] if len(names) == 1 and isinstance(names[0], (list, tuple)) else list(names)
+        return self._derive(dict(zip(names, self.bands.values())))
+
+    def eq(self, o): return self._binary(o, lambda a, b: int(a == b))
+    def neq(self, o): return self._binary(o, lambda a, b: int(a != b))
+    def gt(self, o): return self._binary(o, lambda a, b: int(a > b))
+    def lt(self, o): return self._binary(o, lambda a, b: int(a < b))
+    def Or(self, o): return self._binary(o, lambda a, b: int(bool(a) or bool(b)))
+    def And(self, o): return self._binary(o, lambda a, b: int(bool(a) and bool(b)))
+    def add(self, o): return self._binary(o, lambda a, b: a + b)
+    def subtract(self, o): return self._binary(o, lambda a, b: a - b)
+    def multiply(self, o): return self._binary(o, lambda a, b: a * b)
+    def divide(self, o): return self._binary(o, lambda a, b: a / b if b else None)
+    def bitwiseAnd(self, o): return self._binary(o, lambda a, b: int(a) & int(b))
+
+    def updateMask(self, mask):
+        mask_values = list(mask.bands.values())[0] if mask.bands else [None] * PIXELS
+        return self._derive({
+            name: [v if m else None for v, m in zip(values, mask_values)]
+            for name, values in self.bands.items()
+        })
+
+    def mask(self):
+        return self._derive({n: [0 if v is None else 1 for v in vals] for n, vals in self.bands.items()})
+
+    def unmask(self, value=0, *args):
+        return self._derive({n: [value if v is None else v for v in vals] for n, vals in self.bands.items()})
+
+    def normalizedDifference(self, bands):
+        if not self.bands:
+            return Image(bands={'nd': [None] * PIXELS}, props=self.props)
+        a, b = (self.bands[_resolve(n)] for n in bands)
+        return self._derive({'nd': _pixelwise(a, b, lambda x, y: (x - y) / (x + y) if x + y else None)})
+
+    def clip(self, geometry):
+        return self
+
+    def toFloat(self):
+        return self
+
+    def toDouble(self):
+        return self
+
+    def visualize(self, **params):
+        return self
+
+    def addBands(self, other, *args):
+        bands = dict(self.bands)
+        bands.update(other.bands)
+        return self._derive(bands)
+
+    def bandNames(self):
+        return List(list(self.bands))
+
+    def set(self, *args):
+        props = dict(self.props)
+        if len(args) == 1:
+            props.update(_resolve(args[0]))
+        else:
+            props[_resolve(args[0])] = _resolve(args[1])
+        return Image(bands=self.bands, props=props)
+
+    def get(self, prop):
+        return _wrap(self.props.get(_resolve(prop)))
+
+    def id(self):
+        return String(self.props.get('system:id'))
+
+    def geometry(self, *args, **kwargs):
+        return Geometry(self.props.get('system:footprint') or {'type': 'GeometryCollection', 'geometries': []})
+
+    def date(self):
+        return Date(self.props.get('system:time_start', 0))
+
+    def reduceRegion(self, reducer, geometry=None, scale=None, maxPixels=None, bestEffort=False, **kwargs):
+        return Dictionary(reducer.reduce_bands(self.bands))
+
+    def reduceRegions(self, collection, reducer, scale=None, **kwargs):
+        reduced = reducer.reduce_bands(self.bands)
+        if len(self.bands) == 1 and len(reducer.outputs) == 1:
+            reduced = {reducer.outputs[0][0]: list(reduced.values())[0]}
+        return FeatureCollection([f.set(reduced) for f in FeatureCollection(collection).features])
+
+    def getMapId(self, vis_params=None):
+        _round_trip('getMapId')
+        map_id = f'projects/fake/maps/{next(_map_ids)}'
+        url = f'https://earthengine.googleapis.com/v1/{map_id}/tiles/{{z}}/{{x}}/{{y}}'
+        return {'mapid': map_id, 'token': '', 'tile_fetcher': types.SimpleNamespace(url_format=url)}
+
+    @staticmethod
+    def cat(images):
+        bands = {}
+        for image in images:
+            for name, values in image.bands.items():
+                key, suffix = name, 1
+                while key in bands:
+                    key, suffix = f'{name}_{suffix}', suffix + 1
+                bands[key] = values
+        return Image(bands=bands)
+
+    @staticmethod
+    def constant(value):
+        return Image(value)
+
+
+def _find_image(image_id):
+    for collection_id, images in _state['collections'].items():
+        for image in images:
+            if image.props.get('system:id') == image_id:
+                return image.bands, image.props
+    raise EEException(f'Image asset {image_id} not found.')
+
+
+# >>> FILTROS E COLEÇÕES <<<
+class Filter:
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    @staticmethod
+    def lt(name, value):
+        return Filter(lambda p: p.get(name) is not None and p.get(name) < value)
+
+    @staticmethod
+    def lte(name, value):
+        return Filter(lambda p: p.get(name) is not None and p.get(name) <= value)
+
+    @staticmethod
+    def gt(name, value):
+        return Filter(lambda p: p.get(name) is not None and p.get(name) > value)
+
+    @staticmethod
+    def gte(name, value):
+        return Filter(lambda p: p.get(name) is not None and p.get(name) >= value)
+
+    @staticmethod
+    def eq(name, value):
+        return Filter(lambda p: p.get(name) == value)
+
+    @staticmethod
+    def inList(name, values):
+        values = set(_resolve(values))
+        return Filter(lambda p: p.get(name) in values)
+
+    @staticmethod
+    def notNull(names):
+        return Filter(lambda p: all(p.get(n) is not None for n in names))
+
+    @staticmethod
+    def And(*filters):
+        return Filter(lambda p: all(f.predicate(p) for f in filters))
+
+    @staticmethod
+    def date(start, end):
+        lo, hi = _millis(_parse_date(start)), _millis(_parse_date(end))
+        return Filter(lambda p: lo <= p.get('system:time_start', 0) < hi)
+
+
+class ImageCollection(ComputedObject):
+    def __init__(self, source):
+        if isinstance(source, str):
+            self.images = list(_state['collections'].get(source, []))
+        elif isinstance(source, ImageCollection):
+            self.images = list(source.images)
+        else:
+            self.images = list(source)
+
+    def _value(self):
+        return {'type': 'ImageCollection', 'features': [i._value() for i in self.images]}
+
+    @staticmethod
+    def fromImages(images):
+        return ImageCollection(_resolve(images) if isinstance(images, List) else images)
+
+    def filterBounds(self, geometry):
+        return ImageCollection(self.images)
+
+    def filterDate(self, start, end=None):
+        return self.filter(Filter.date(start, end))
+
+    def filter(self, flt):
+        return ImageCollection([i for i in self.images if flt.predicate(i.props)])
+
+    def map(self, fn):
+        return ImageCollection([fn(i) for i in self.images])
+
+    def select(self, *args):
+        return ImageCollection([i.select(*args) for i in self.images])
+
+    def sort(self, prop, ascending=True):
+        return ImageCollection(sorted(
+            self.images, key=lambda i: (i.props.get(prop) is None, i.props.get(prop)), reverse=not ascending
+        ))
+
+    def limit(self, count, prop=None, ascending=True):
+        images = self.sort(prop, ascending).images if prop else self.images
+        return ImageCollection(images[:_resolve(count)])
+
+    def first(self):
+        return Image(self.images[0]) if self.images else Image()
+
+    def size(self):
+        return Number(len(self.images))
+
+    def toList(self, count, offset=0):
+        return List(self.images[offset:offset + _resolve(count)])
+
+    def aggregate_array(self, prop):
+        return List([i.props.get(prop) for i in self.images])
+
+    def aggregate_max(self, prop):
+        values = [i.props.get(prop) for i in self.images if i.props.get(prop) is not None]
+        return Number(max(values) if values else None)
+
+    def merge(self, other):
+        return ImageCollection(self.images + other.images)
+
+    def _reduce(self, fn, suffix=''):
+        if not self.images:
+            return Image()
+        names = list(self.images[0].bands)
+        bands = {}
+        for name in names:
+            columns = zip(*(i.bands.get(name, [None] * PIXELS) for i in self.images))
+            out = []
+            for column in columns:
+                values = [v for v in column if v is not None]
+                out.append(fn(values) if values else None)
+            bands[name + suffix] = out
+        return Image(bands=bands)
+
+    def sum(self): return self._reduce(sum)
+    def mean(self): return self._reduce(lambda v: sum(v) / len(v))
+    def min(self): return self._reduce(min)
+    def max(self): return self._reduce(max)
+    def count(self): return self._reduce(len)
+    def mosaic(self): return self._reduce(lambda v: v[-1])
+
+
+class Algorithms:
+    @staticmethod
+    def If(condition, true_case, false_case):
+        return _wrap(true_case if _resolve(condition) else false_case)
+
+
+# >>> ee.data <<<
+def _compute_pixels(params):
+    _round_trip('computePixels')
+    expression = params['expression']
+    grid = params.get('grid', {})
+    dims = grid.get('dimensions', {'width': 1, 'height': 1})
+    width, height = dims['width'], dims['height']
+    import numpy
+    names = list(expression.bands)
+    dtype = [(name, 'f8') for name in names]
+    array = numpy.zeros((height, width), dtype=dtype)
+    for name in names:
+        values = [v for v in expression.bands[name] if v is not None]
+        array[name] = sum(values) / len(values) if values else numpy.nan
+    return array
+
+
+class _Credentials:
+    expired = False
+    expiry = None
+    valid = True
+
+    def refresh(self, request):
+        return None
+
+
+data = types.SimpleNamespace(
+    computePixels=_compute_pixels,
+    get_persistent_credentials=lambda: _Credentials(),
+    setDeadline=lambda ms: None,
+)
+
+
+def Initialize(credentials=None, project=None, **kwargs):
+    return None
+
+
+def Authenticate(*args, **kwargs):
+    return None
+
+
+# >>> CENAS SINTÉTICAS <<<
+def _time_start(date):
+    return _millis(_parse_date(date))
+
+
+def sentinel_scene(date, scene_id=None, cloudy=False, cloud_percentage=None):
+    """Cena Sentinel-2 sintética; `cloudy` mascara todos os pixels via SCL=9."""
+    scl = [9 if cloudy else 4] * PIXELS
+    scene_id = scene_id or f'COPERNICUS/S2_SR_HARMONIZED/{date.replace("-", "")}_FAKE'
+    return Image(bands={
+        'B8': [3000 + 50 * i for i in range(PIXELS)],
+        'B4': [800 + 10 * i for i in range(PIXELS)],
+        'B3': [700 + 10 * i for i in range(PIXELS)],
+        'B2': [600 + 10 * i for i in range(PIXELS)],
+        'SCL': scl,
+    }, props={
+        'system:id': scene_id,
+        'system:index': scene_id.split('/')[-1],
+        'system:time_start': _time_start(date),
+        'CLOUDY_PIXEL_PERCENTAGE': cloud_percentage if cloud_percentage is not None else (95 if cloudy else 3),
+        'system:footprint': {'type': 'Polygon', 'coordinates': [[[-180, -90], [180, -90], [180, 90], [-180, 90], [-180, -90]]]},
+    })
+
+
+def landsat_scene(date, scene_id=None, cloudy=False):
+    qa = [1 << 5 if cloudy else 0] * PIXELS
+    scene_id = scene_id or f'LANDSAT/LC09/C02/T1_L2/LC09_FAKE_{date.replace("-", "")}'
+    return Image(bands={
+        'SR_B5': [25000 + 100 * i for i in range(PIXELS)],
+        'SR_B4': [9000 + 20 * i for i in range(PIXELS)],
+        'SR_B3': [8500 + 20 * i for i in range(PIXELS)],
+        'SR_B2': [8000 + 20 * i for i in range(PIXELS)],
+        'QA_PIXEL': qa,
+    }, props={
+        'system:id': scene_id,
+        'system:index': scene_id.split('/')[-1],
+        'system:time_start': _time_start(date),
+        'CLOUD_COVER': 90 if cloudy else 5,
+        'system:footprint': {'type': 'Polygon', 'coordinates': [[[-180, -90], [180, -90], [180, 90], [-180, 90], [-180, -90]]]},
+    })
+
+
+def daily_series(start, days, make_image):
+    first = _parse_date(start)
+    return [make_image(first + datetime.timedelta(days=i), i) for i in range(days)]
+
+
+def chirps_day(dt, i):
+    return Image(bands={'precipitation': [float(i % 7)] * PIXELS},
+                 props={'system:time_start': _millis(dt), 'system:id': f'UCSB-CHG/CHIRPS/DAILY/{dt:%Y%m%d}'})
+
+
+def era5_hour(dt, i):
+    return Image(bands={'temperature_2m': [290.0 + (i % 24) / 2] * PIXELS},
+                 props={'system:time_start': _millis(dt), 'system:id': f'ECMWF/ERA5_LAND/HOURLY/{dt:%Y%m%dT%H}'})
+
+
+def hourly_series(start, hours, make_image):
+    first = _parse_date(start)
+    return [make_image(first + datetime.timedelta(hours=i), i) for i in range(hours)]
+
+
+def era5_daily_aggregate(hourly_images):
+    """Agregado diário (UTC) no formato do ERA5_LAND/DAILY_AGGR a partir das imagens horárias."""
+    days = {}
+    for image in hourly_images:
+        day = datetime.datetime.utcfromtimestamp(image.props['system:time_start'] / 1000).date()
+        days.setdefault(day, []).append(image.bands['temperature_2m'])
+    daily = []
+    for day, hours in sorted(days.items()):
+        pixels = list(zip(*hours))
+        daily.append(Image(bands={
+            'temperature_2m': [sum(p) / len(p) for p in pixels],
+            'temperature_2m_min': [min(p) for p in pixels],
+            'temperature_2m_max': [max(p) for p in pixels],
+        }, props={
+            'system:time_start': _millis(datetime.datetime(day.year, day.month, day.day)),
+            'system:id': f'ECMWF/ERA5_LAND/DAILY_AGGR/{day:%Y%m%d}',
+        }))
+    return daily
+
+
+# >>> API REST (MODO ASSÍNCRONO) <<<
+_serialized = {}
+_serialized_ids = itertools.count(1)
+
+
+def _encode(ee_object, for_cloud_api=True):
+    """Guarda o objeto e devolve uma referência no lugar da expressão serializada."""
+    ref = str(next(_serialized_ids))
+    with _state_lock:
+        _serialized[ref] = ee_object
+    return {'fakeRef': ref}
+
+
+serializer = types.SimpleNamespace(encode=_encode)
+
+
+async def rest_handler(request):
+    """Handler de httpx.MockTransport que simula projects.value.compute e projects.maps.create."""
+    import httpx
+    body = json.loads(request.content)
+    with _state_lock:
+        ee_object = _serialized.pop(body['expression']['fakeRef'])
+    is_map = request.url.path.endswith('/maps')
+    delay = _begin_round_trip('getMapId' if is_map else 'getInfo')
+    try:
+        if delay:
+            await asyncio.sleep(delay)
+    finally:
+        _end_round_trip()
+    try:
+        if is_map:
+            name = f'projects/fake/maps/{next(_map_ids)}'
+            return httpx.Response(200, json={'name': name})
+        return httpx.Response(200, json={'result': _resolve(ee_object)})
+    except EEException as e:
+        return httpx.Response(400, json={'error': {'code': 400, 'status': 'INVALID_ARGUMENT', 'message': str(e)}})
+
+
+# >>> INSTALAÇÃO <<<
+def install():
+    """Registra este módulo como `ee` em sys.modules e devolve-o."""
+    module = sys.modules[__name__]
+    sys.modules['ee'] = module
+    return module
+
+
+__all__ = [
+    'Algorithms', 'Date', 'Dictionary', 'EEException', 'Feature', 'FeatureCollection', 'Filter',
+    'Geometry', 'Image', 'ImageCollection', 'Initialize', 'List', 'Number', 'Reducer', 'String',
+    'configure', 'counters', 'data', 'install', 'reset_counters', 'rest_handler', 'serializer',
+]
@@ -0,0 +1,251 @@
+"""Benchmarks determinísticos de idas e voltas ao Earth Engine.
+
+Executa as funções lógicas e os endpoints Flask contra o backend falso de
+`benchmarks/fake_ee.py` e mede, por cenário: idas e voltas (`getInfo`, `getMapId`,
+`computePixels`), tempo de parede e pico de threads. Os cenários combinam 1, 6 e 12
+períodos mensais com Sentinel-2 disponível ou nublado (fallback para Landsat).
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.run_benchmarks --latency lognormal:0.05,0.5 --output bench.json
+    python -m benchmarks.run_benchmarks --compare bench_antes.json
+
+As contagens de idas e voltas não dependem da latência e podem ser comparadas
+diretamente entre commits; os tempos dependem da latência simulada e da máquina.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Caches e catálogo desligados: cada repetição mede o cálculo completo
+os.environ.setdefault('ALLOWED_API_KEYS', 'benchmark')
+os.environ['RESULT_CACHE_ENABLED'] = 'false'
+os.environ['RESULT_CACHE_PATH'] = ''
+os.environ['SCENE_CATALOG_PATH'] = ''
+
+from benchmarks import fake_ee  # noqa: E402
+
+fake_ee.install()
+
+import app  # noqa: E402
+
+API_HEADERS = {'X-API-Key': 'benchmark'}
+ROI = {'type': 'Polygon', 'coordinates': [[[-50.1, -27.1], [-50.0, -27.1], [-50.0, -27.0], [-50.1, -27.0], [-50.1, -27.1]]]}
+POINT = {'type': 'Point', 'coordinates': [-50.05, -27.05]}
+PERIOD_COUNTS = (1, 6, 12)
+FIRST_MONTH = datetime.date(2024, 1, 1)
+
+
+def monthly_periods(count):
+    """Períodos mensais consecutivos a partir de FIRST_MONTH, como [[início, fim], ...]."""
+    periods = []
+    for i in range(count):
+        year, month = divmod(FIRST_MONTH.month - 1 + i, 12)
+        start = datetime.date(FIRST_MONTH.year + year, month + 1, 1)
+        next_year, next_month = divmod(month + 1, 12)
+        end = datetime.date(FIRST_MONTH.year + year + next_year, next_month + 1, 1) - datetime.timedelta(days=1)
+        periods.append([start.isoformat(), end.isoformat()])
+    return periods
+
+
+def build_collections(months, sentinel_cloudy):
+    """Uma cena Sentinel-2 e uma Landsat por mês, CHIRPS diário e ERA5 horário e diário cobrindo os meses."""
+    last_day = datetime.date.fromisoformat(monthly_periods(months)[-1][1])
+    days = (last_day - FIRST_MONTH).days + 1
+    sentinel, landsat = [], []
+    for start, _ in monthly_periods(months):
+        month = datetime.date.fromisoformat(start)
+        sentinel.append(fake_ee.sentinel_scene((month + datetime.timedelta(days=4)).isoformat(), cloudy=sentinel_cloudy))
+        landsat.append(fake_ee.landsat_scene((month + datetime.timedelta(days=6)).isoformat()))
+    era5_hourly = fake_ee.hourly_series(FIRST_MONTH.isoformat(), 24 * days, fake_ee.era5_hour)
+    return {
+        'COPERNICUS/S2_SR_HARMONIZED': sentinel,
+        'LANDSAT/LC09/C02/T1_L2': landsat,
+        'UCSB-CHG/CHIRPS/DAILY': fake_ee.daily_series(FIRST_MONTH.isoformat(), days, fake_ee.chirps_day),
+        'ECMWF/ERA5_LAND/HOURLY': era5_hourly,
+        'ECMWF/ERA5_LAND/DAILY_AGGR': fake_ee.era5_daily_aggregate(era5_hourly),
+    }
+
+
+class ThreadSampler:
+    """Amostra threading.active_count() em segundo plano e guarda o pico."""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = threading.active_count()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        # Não conta a própria thread de amostragem
+        self.peak -= 1
+
+
+def ndvi_body(periods, **extra):
+    return dict({'roi': ROI, 'date_periods': periods}, **extra)
+
+
+def climate_body(periods):
+    return {'point': POINT, 'date_periods': periods}
+
+
+def targets(client):
+    """Alvos medidos: nome -> função(períodos). Endpoints passam pelo cliente de teste do Flask."""
+    point = app.ee.Geometry.Point(POINT['coordinates'])
+
+    def endpoint(path, body_factory):
+        def run(periods):
+            response = client.post(path, json=body_factory(periods), headers=API_HEADERS)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} respondeu {response.status_code}: {response.get_data(as_text=True)[:200]}')
+            return response.get_json()
+        return run
+
+    return {
+        'calculate_ndvi_logic': lambda periods: app.calculate_ndvi_logic(ndvi_body(periods)),
+        'calculate_ndvi_logic_single_roundtrip': lambda periods: app.calculate_ndvi_logic(ndvi_body(periods, single_roundtrip=True)),
+        'get_ndvi_tiles_logic': lambda periods: app.get_ndvi_tiles_logic(ndvi_body(periods)),
+        'calculate_chirps_logic_optimized': lambda periods: app.calculate_chirps_logic_optimized(climate_body(periods), point),
+        'run_composite_tasks_climate': lambda periods: app.compute_climate_stats(climate_body(periods)),
+        'POST /ndvi_composite': endpoint('/ndvi_composite', ndvi_body),
+        'POST /climate_stats': endpoint('/climate_stats', climate_body),
+    }
+
+
+def run_scenario(target, periods, repeat):
+    """Executa o alvo `repeat` vezes e agrega idas e voltas, tempo de parede e pico de threads."""
+    walls, peaks, round_trips, peak_in_flight = [], [], None, 0
+    for _ in range(repeat):
+        fake_ee.reset_counters()
+        with ThreadSampler() as sampler:
+            started = time.perf_counter()
+            target(periods)
+            walls.append(time.perf_counter() - started)
+        counters = fake_ee.counters()
+        # As idas e voltas são determinísticas; guarda as da primeira repetição
+        round_trips = round_trips or counters
+        peak_in_flight = max(peak_in_flight, counters['peak_in_flight'])
+        peaks.append(sampler.peak)
+    return {
+        'round_trips': round_trips['round_trips'],
+        'total_round_trips': round_trips['total_round_trips'],
+        'peak_in_flight': peak_in_flight,
+        'peak_threads': max(peaks),
+        'wall_seconds_median': round(statistics.median(walls), 4),
+        'wall_seconds_min': round(min(walls), 4),
+        'wall_seconds_max': round(max(walls), 4),
+    }
+
+
+def parse_latency(spec):
+    """'0.05' ou 'fixed:0.05' (segundos) ou 'lognormal:mediana,sigma'."""
+    kind, _, args = spec.partition(':')
+    if not args:
+        return fake_ee.fixed_latency(float(kind)), spec
+    if kind == 'fixed':
+        return fake_ee.fixed_latency(float(args)), spec
+    if kind == 'lognormal':
+        median, _, sigma = args.partition(',')
+        return fake_ee.lognormal_latency(float(median), float(sigma or 0.5)), spec
+    raise ValueError(f'Latência inválida: {spec}')
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(latency_spec, repeat, seed, only=None):
+    latency, latency_label = parse_latency(latency_spec)
+    client = app.app.test_client()
+    # Inicialização da sessão fora das medições
+    app.gee_session.ensure_initialized()
+    results = []
+    for satellite_case, sentinel_cloudy in (('sentinel_hit', False), ('landsat_fallback', True)):
+        for count in PERIOD_COUNTS:
+            fake_ee.configure(build_collections(count, sentinel_cloudy), latency=latency, seed=seed)
+            periods = monthly_periods(count)
+            for name, target in targets(client).items():
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                # Clima não depende do satélite: mede só uma vez
+                if satellite_case == 'landsat_fallback' and 'ndvi' not in name:
+                    continue
+                result = run_scenario(target, periods, repeat)
+                result.update({'target': name, 'periods': count, 'case': satellite_case})
+                results.append(result)
+                print(f"{name:42s} {satellite_case:17s} {count:2d} períodos  "
+                      f"{result['total_round_trips']:4d} idas  {result['wall_seconds_median']:8.3f}s  "
+                      f"{result['peak_threads']:3d} threads")
+    return {
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'latency': latency_label,
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+
+def scenario_key(result):
+    return result['target'], result['case'], result['periods']
+
+
+def compare(previous, current):
+    """Imprime a variação de idas e voltas e tempo mediano em relação a um JSON anterior."""
+    before = {scenario_key(r): r for r in previous['results']}
+    print(f"\nComparação com {previous.get('revision')} (latência {previous.get('latency')}):")
+    for result in current['results']:
+        old = before.get(scenario_key(result))
+        if old is None:
+            continue
+        trips = result['total_round_trips'] - old['total_round_trips']
+        wall = result['wall_seconds_median'] - old['wall_seconds_median']
+        print(f"{result['target']:42s} {result['case']:17s} {result['periods']:2d} períodos  "
+              f"{trips:+5d} idas  {wall:+8.3f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--latency', default='fixed:0.02', help="'fixed:S' ou 'lognormal:MEDIANA,SIGMA' (segundos por ida e volta)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', action='append', help='Mede só os alvos cujo nome contém o texto (pode repetir)')
+    parser.add_argument('--output', default=os.path.join(ROOT, 'bench_output.json'))
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparação')
+    args = parser.parse_args(argv)
+
+    report = run_all(args.latency, args.repeat, args.seed, args.only)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados gravados em {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
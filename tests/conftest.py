@@ -0,0 +1,33 @@
+"""Configuração dos testes: o backend falso do Earth Engine substitui o módulo `ee` antes do app."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Sem arquivos em disco: caches, catálogo, jobs e assinaturas só em memória ou desativados
+os.environ.setdefault('ALLOWED_API_KEYS', 'test')
+os.environ['RESULT_CACHE_PATH'] = ''
+os.environ['SCENE_CATALOG_PATH'] = ''
+os.environ['SUBSCRIPTIONS_PATH'] = ''
+os.environ['JOB_STORE'] = 'memory'
+
+from benchmarks import fake_ee  # noqa: E402
+
+fake_ee.install()
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """Módulo do app com os caches em memória vazios e a sessão do EE inicializada."""
+    for cache in (app_module.ndvi_result_cache, app_module.tile_cache,
+                  app_module.climate_chunk_cache, app_module.climate_raster_cache):
+        cache._entries.clear()
+    app_module.gee_session.ensure_initialized()
+    fake_ee.reset_counters()
+    return app_module
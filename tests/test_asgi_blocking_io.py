@@ -0,0 +1,50 @@
+"""Modo assíncrono: caches (camada SQLite) e catálogo de cenas não rodam na thread do event loop."""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from benchmarks import fake_ee
+from benchmarks.run_benchmarks import ROI, build_collections, monthly_periods
+
+
+@pytest.fixture
+def async_app(app, monkeypatch):
+    fake_ee.configure(build_collections(3, sentinel_cloudy=False))
+    client = app.AsyncEEClient('https://earthengine.test', 10, 10, 30, transport=httpx.MockTransport(fake_ee.rest_handler))
+    monkeypatch.setattr(app, 'async_ee_client', client)
+    monkeypatch.setattr(app, 'RESULT_CACHE_ENABLED', True)
+    return app
+
+
+def record_threads(monkeypatch, target, names, calls):
+    for name in names:
+        original = getattr(target, name)
+
+        def recorded(*args, _original=original, _name=name, **kwargs):
+            calls.append((_name, threading.current_thread()))
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(target, name, recorded)
+
+
+def test_ndvi_composite_async_keeps_blocking_io_off_the_loop(async_app, monkeypatch):
+    calls = []
+    record_threads(monkeypatch, async_app.ndvi_result_cache, ('get', 'set'), calls)
+    record_threads(monkeypatch, async_app.tile_cache, ('get', 'set'), calls)
+    record_threads(monkeypatch, async_app.scene_catalog, ('candidates',), calls)
+    body = {'roi': ROI, 'date_periods': monthly_periods(3)}
+
+    async def run():
+        loop_thread = threading.current_thread()
+        first = await async_app.compute_ndvi_composite_async(body)
+        second = await async_app.compute_ndvi_composite_async(body)
+        return loop_thread, first, second
+
+    loop_thread, first, second = asyncio.run(run())
+
+    assert all('error' not in result for result in first['ndvi'].values())
+    assert second == first
+    assert {name for name, _ in calls} >= {'get', 'set', 'candidates'}
+    assert [name for name, thread in calls if thread is loop_thread] == []
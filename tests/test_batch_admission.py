@@ -0,0 +1,66 @@
+"""Endpoints em lote: controle de admissão (503 + Retry-After) e blocos no executor compartilhado."""
+import json
+import threading
+
+import pytest
+
+from benchmarks import fake_ee
+from benchmarks.run_benchmarks import ROI, build_collections
+
+HEADERS = {'X-API-Key': 'test'}
+POINTS = {'type': 'FeatureCollection', 'features': [
+    {'type': 'Feature', 'id': f'p{i}', 'geometry': {'type': 'Point', 'coordinates': [-47.9 + i * 0.01, -15.8]},
+     'properties': {}}
+    for i in range(3)
+]}
+FIELDS = {'type': 'FeatureCollection', 'features': [{'type': 'Feature', 'id': 'a', 'geometry': ROI, 'properties': {}}]}
+REQUESTS = [
+    ('/climate_stats_batch', {'points': POINTS, 'date_periods': [['2024-01-01', '2024-02-01']]}),
+    ('/ndvi_batch', {'fields': FIELDS, 'date_periods': [['2024-01-01', '2024-02-01']]}),
+]
+
+
+@pytest.mark.parametrize('endpoint, body', REQUESTS)
+def test_batch_endpoints_reject_when_executor_saturated(app, monkeypatch, endpoint, body):
+    monkeypatch.setattr(app.ee_executor, 'saturated', lambda: True)
+    response = app.app.test_client().post(endpoint, json=body, headers=HEADERS)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(app.EXECUTOR_RETRY_AFTER_SECONDS)
+
+
+@pytest.mark.parametrize('endpoint, body', REQUESTS)
+def test_batch_chunks_run_on_shared_executor(app, monkeypatch, endpoint, body):
+    fake_ee.configure(build_collections(2, sentinel_cloudy=False))
+    submitted = []
+    submit = app.ee_executor.submit
+
+    def recorded(client_key, fn, args=(), kwargs=None, block=False):
+        submitted.append(client_key)
+        return submit(client_key, fn, args, kwargs, block)
+
+    monkeypatch.setattr(app.ee_executor, 'submit', recorded)
+    threads = []
+    get_info = app.ee_get_info
+    monkeypatch.setattr(app, 'ee_get_info', lambda *args: threads.append(threading.current_thread().name) or get_info(*args))
+
+    response = app.app.test_client().post(endpoint, json=body, headers=HEADERS)
+    payload = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert '"error"' not in payload, payload
+    assert submitted and set(submitted) == {app.job_owner('test')}
+    assert threads and all(name.startswith('ee-executor') for name in threads)
+
+
+def test_climate_batch_saturated_mid_request_returns_503(app, monkeypatch):
+    fake_ee.configure(build_collections(2, sentinel_cloudy=False))
+
+    def saturated(*args, **kwargs):
+        raise app.ExecutorSaturated('Servidor ocupado, tente novamente mais tarde')
+
+    monkeypatch.setattr(app.ee_executor, 'submit', saturated)
+    response = app.app.test_client().post('/climate_stats_batch', json=REQUESTS[0][1], headers=HEADERS)
+
+    assert response.status_code == 503
+    assert json.loads(response.get_data(as_text=True))['error']
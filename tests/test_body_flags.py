@@ -0,0 +1,36 @@
+"""Flags booleanas do corpo (`hedged_selection`, `single_roundtrip`): interpretadas como as variáveis de ambiente."""
+import pytest
+
+FLAG_VALUES = [
+    (True, True), ('true', True), ('True', True), ('1', True), (1, True), ('yes', True),
+    (False, False), ('false', False), ('False', False), ('0', False), (0, False), ('no', False), (None, False),
+]
+
+
+@pytest.mark.parametrize('value, expected', FLAG_VALUES)
+def test_hedged_selection_flag(app, value, expected):
+    assert app.use_hedged_selection({'hedged_selection': value}) is expected
+
+
+@pytest.mark.parametrize('default', [True, False])
+def test_hedged_selection_default(app, monkeypatch, default):
+    monkeypatch.setattr(app, 'SCENE_HEDGED_SELECTION', default)
+    assert app.use_hedged_selection({}) is default
+    assert app.use_hedged_selection(None) is default
+
+
+@pytest.mark.parametrize('value, expected', FLAG_VALUES)
+def test_single_roundtrip_flag(app, value, expected):
+    assert app.use_single_roundtrip({'single_roundtrip': value}) is expected
+
+
+@pytest.mark.parametrize('default, expected', [('true', True), ('1', True), ('false', False)])
+def test_single_roundtrip_default(app, monkeypatch, default, expected):
+    monkeypatch.setenv('NDVI_SINGLE_ROUNDTRIP', default)
+    assert app.use_single_roundtrip({}) is expected
+
+
+def test_single_roundtrip_string_false_uses_per_period_fingerprint(app):
+    body = {'roi': {'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 0]]]}, 'date_periods': [['2024-01-01', '2024-02-01']]}
+    assert (app.request_fingerprint('ndvi_composite', dict(body, single_roundtrip='false'))
+            == app.request_fingerprint('ndvi_composite', dict(body, single_roundtrip=False)))
@@ -0,0 +1,80 @@
+"""Cache de parciais mensais do clima: datas com fuso ('Z' ou offset) e recuo para o cálculo por período."""
+import pytest
+
+from benchmarks import fake_ee
+from benchmarks.run_benchmarks import POINT, build_collections
+
+LOGIC = ('calculate_chirps_logic_optimized', 'calculate_era5_temp_logic_optimized')
+
+
+@pytest.fixture
+def climate(app, monkeypatch):
+    monkeypatch.setattr(app, 'CLIMATE_CHUNK_CACHE_ENABLED', True)
+    monkeypatch.setattr(app, 'RESULT_CACHE_ENABLED', True)
+    fake_ee.configure(build_collections(4, sentinel_cloudy=False))
+    return app
+
+
+def stats(app, logic, periods):
+    point = app.ee.Geometry.Point(POINT['coordinates'])
+    return getattr(app, logic)({'point': POINT, 'date_periods': periods}, point)
+
+
+def test_month_segments_accept_timezones(app):
+    naive = app.month_segments('2024-01-01T00:00:00', '2024-03-01T00:00:00')
+    assert app.month_segments('2024-01-01T00:00:00Z', '2024-03-01T00:00:00Z') == [
+        (start, end if end != '2024-03-01T00:00:00' else '2024-03-01T00:00:00Z', whole)
+        for start, end, whole in naive
+    ]
+    # 00:00-03:00 é 03:00 UTC: janeiro não começa no primeiro instante do mês
+    assert app.month_segments('2024-01-01T00:00:00-03:00', '2024-03-01') == [
+        ('2024-01-01T00:00:00-03:00', '2024-02-01', False),
+        ('2024-02-01', '2024-03-01', True),
+    ]
+
+
+@pytest.mark.parametrize('logic', LOGIC)
+def test_timezone_dates_use_chunk_cache(climate, monkeypatch, logic):
+    periods = [['2024-01-01T00:00:00Z', '2024-03-01T00:00:00Z'], ['2024-02-01T00:00:00+00:00', '2024-04-01']]
+    cached = stats(climate, logic, periods)
+
+    monkeypatch.setattr(climate, 'CLIMATE_CHUNK_CACHE_ENABLED', False)
+    uncached = stats(climate, logic, periods)
+
+    assert 'error' not in cached['period_1']
+    assert list(cached) == list(uncached)
+    for name, period in cached.items():
+        for field, value in period.items():
+            if isinstance(value, float):
+                assert value == pytest.approx(uncached[name][field])
+            else:
+                assert value == uncached[name][field]
+
+
+@pytest.mark.parametrize('logic', LOGIC)
+def test_unsplittable_dates_fall_back_to_per_period(climate, monkeypatch, logic):
+    def unsplittable(start_date, end_date):
+        raise TypeError("can't compare offset-naive and offset-aware datetimes")
+
+    monkeypatch.setattr(climate, 'month_segments', unsplittable)
+    result = stats(climate, logic, [['2024-01-01', '2024-03-01']])
+
+    assert 'error' not in result
+    assert 'error' not in result['period_1']
+
+
+@pytest.mark.parametrize('logic', LOGIC)
+def test_deadline_keeps_finished_periods(climate, logic):
+    # Cada getInfo leva 0,2 s e o prazo é 0,3 s: só o primeiro período termina a tempo
+    fake_ee.configure(build_collections(4, sentinel_cloudy=False), latency=fake_ee.fixed_latency(0.2))
+    periods = [['2024-01-01', '2024-02-01'], ['2024-02-01', '2024-03-01'], ['2024-03-01', '2024-04-01']]
+    point = climate.ee.Geometry.Point(POINT['coordinates'])
+    token = climate.current_request.set(climate.RequestContext('client', deadline_seconds=0.3))
+    try:
+        result = getattr(climate, logic)({'point': POINT, 'date_periods': periods, 'period_parallelism': 1}, point)
+    finally:
+        climate.current_request.reset(token)
+
+    assert 'error' not in result['period_1']
+    assert result['period_2'] == climate.timed_out_result()
+    assert result['period_3'] == climate.timed_out_result()
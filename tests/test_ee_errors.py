@@ -0,0 +1,77 @@
+"""Classificação dos erros do EE: novas tentativas só para limites de taxa e indisponibilidade."""
+import pytest
+
+
+class HttpResponse:
+    def __init__(self, status):
+        self.status = status
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.resp = HttpResponse(status)
+
+
+def ee_error(app, message, cause=None):
+    error = app.ee.EEException(message)
+    error.__cause__ = cause
+    return error
+
+
+@pytest.mark.parametrize('message, error_class', [
+    ("Image.load: Image asset 'projects/x/assets/field_429' not found.", 'invalid_request'),
+    ("Collection.loadTable: Table 'users/farm/plot_503_2024' not found.", 'invalid_request'),
+    ('Date 2024-05-03T15:29:00 is out of range.', 'other'),
+])
+def test_status_digits_in_messages_are_not_retryable(app, message, error_class):
+    error = ee_error(app, message)
+    assert not app.is_retryable_error(error)
+    assert app.classify_ee_error(error) == error_class
+
+
+@pytest.mark.parametrize('message, error_class', [
+    ('Too many concurrent aggregations.', 'rate_limit'),
+    ('Too many requests', 'rate_limit'),
+    ('Service unavailable', 'unavailable'),
+    ('429 RESOURCE_EXHAUSTED: Quota exceeded', 'rate_limit'),
+    ('503 UNAVAILABLE: The service is currently unavailable.', 'unavailable'),
+])
+def test_transient_messages_are_retryable(app, message, error_class):
+    error = ee_error(app, message)
+    assert app.is_retryable_error(error)
+    assert app.classify_ee_error(error) == error_class
+
+
+def test_http_status_from_cause(app):
+    error = ee_error(app, 'Earth Engine capacity exceeded.', HttpError(429, 'capacity'))
+    assert app.http_status_code(error) == 429
+    assert app.is_retryable_error(error)
+    assert app.classify_ee_error(error) == 'rate_limit'
+    assert not app.is_retryable_error(ee_error(app, 'Asset not found.', HttpError(404, 'missing')))
+
+
+@pytest.mark.parametrize('message', [
+    'Request had invalid authentication credentials. Expected OAuth 2 access token.',
+    'invalid_grant: Token has been expired or revoked.',
+    'Earth Engine client library not initialized. Run `ee.Initialize()`.',
+    '401 UNAUTHENTICATED: Request is missing required authentication credential.',
+])
+def test_auth_errors(app, message):
+    assert app.is_auth_error(ee_error(app, message))
+
+
+@pytest.mark.parametrize('message, cause', [
+    ("Quota exceeded for quota metric 'Requests' of service earthengine.googleapis.com for credentials "
+     "of project 'x'.", None),
+    ("Permission denied: the credentials used do not have access to asset 'projects/x/assets/y'.", HttpError(403, 'denied')),
+    ('Caller does not have required permission to use project x.', HttpError(403, 'denied')),
+])
+def test_quota_and_permission_errors_are_not_auth_errors(app, message, cause):
+    error = ee_error(app, message, cause)
+    assert not app.is_auth_error(error)
+    assert app.classify_ee_error(error) != 'auth'
+
+
+def test_auth_error_from_http_401(app):
+    assert app.is_auth_error(ee_error(app, 'Request failed.', HttpError(401, 'unauthorized')))
@@ -0,0 +1,53 @@
+"""ERA5-Land: o agregado diário nos dias inteiros (era5_source='auto') bate com o cálculo só com o horário."""
+import pytest
+
+from benchmarks import fake_ee
+from benchmarks.run_benchmarks import POINT
+
+DAYS = 40
+
+
+@pytest.fixture
+def era5(app, monkeypatch):
+    # Sem o cache de parciais mensais: exercita só a escolha da fonte
+    monkeypatch.setattr(app, 'CLIMATE_CHUNK_CACHE_ENABLED', False)
+    hourly = fake_ee.hourly_series('2024-01-01', 24 * DAYS, fake_ee.era5_hour)
+    fake_ee.configure({
+        'ECMWF/ERA5_LAND/HOURLY': hourly,
+        'ECMWF/ERA5_LAND/DAILY_AGGR': fake_ee.era5_daily_aggregate(hourly),
+    })
+    return app
+
+
+def temperature(app, period, source):
+    point = app.ee.Geometry.Point(POINT['coordinates'])
+    body = {'point': POINT, 'date_periods': [period], 'era5_source': source}
+    return app.calculate_era5_temp_logic_optimized(body, point)['period_1']
+
+
+@pytest.mark.parametrize('period', [
+    ['2024-01-01', '2024-02-01'],
+    ['2024-01-03T06:00:00', '2024-01-20T18:00:00'],
+    # A borda inicial (23:30 até a meia-noite) não tem nenhuma hora do ERA5
+    ['2024-01-01T23:30:00', '2024-01-05'],
+    ['2024-01-10', '2024-01-10T12:00:00'],
+])
+def test_daily_aggregate_matches_hourly(era5, period):
+    auto = temperature(era5, period, 'auto')
+    hourly = temperature(era5, period, 'hourly')
+
+    assert 'error' not in auto
+    for field in ('temperature_min_celsius', 'temperature_mean_celsius', 'temperature_max_celsius'):
+        assert auto[field] is not None
+        assert auto[field] == pytest.approx(hourly[field])
+
+
+def test_missing_daily_aggregate_falls_back_to_hourly(era5):
+    hourly = fake_ee.hourly_series('2024-01-01', 24 * DAYS, fake_ee.era5_hour)
+    # Agregado diário só até o dia 20: o período inteiro usa o horário
+    fake_ee.configure({
+        'ECMWF/ERA5_LAND/HOURLY': hourly,
+        'ECMWF/ERA5_LAND/DAILY_AGGR': fake_ee.era5_daily_aggregate(hourly)[:20],
+    })
+    period = ['2024-01-10', '2024-01-30']
+    assert temperature(era5, period, 'auto') == pytest.approx(temperature(era5, period, 'hourly'))
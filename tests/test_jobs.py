@@ -0,0 +1,36 @@
+"""Fila de jobs: a vaga reservada volta quando o job não chega ao executor."""
+import pytest
+
+
+class FailingStore:
+    def __init__(self, store):
+        self.store = store
+        self.fail = True
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def create(self, job):
+        if self.fail:
+            raise OSError('disk I/O error')
+        self.store.create(job)
+
+
+def test_failed_submit_releases_pending_slot(app):
+    store = FailingStore(app.InMemoryJobStore())
+    runner = app.JobRunner(store, max_workers=1, max_pending=1)
+    payload = {'date_periods': [['2024-01-01', '2024-02-01']]}
+
+    with pytest.raises(OSError):
+        runner.submit('climate_stats', payload, 'owner')
+    with pytest.raises(TypeError):
+        runner.submit('climate_stats', None, 'owner')
+    assert runner._pending == 0
+
+    # Sem vazamento: a única vaga ainda aceita um job
+    runner._executor.submit = lambda fn, job: None
+    store.fail = False
+    job = runner.submit('climate_stats', payload, 'owner')
+    assert store.get(job['job_id'])['status'] == 'queued'
+    with pytest.raises(app.JobQueueFull):
+        runner.submit('climate_stats', payload, 'owner')
@@ -0,0 +1,52 @@
+"""Streaming NDJSON: o contexto da requisição (current_request) chega ao cálculo em segundo plano."""
+import json
+
+import pytest
+
+HEADERS = {'X-API-Key': 'test', 'Accept': 'application/x-ndjson', 'X-Request-Deadline': '5'}
+POINT = {'type': 'Point', 'coordinates': [-47.9, -15.8]}
+ROI = {'type': 'Polygon', 'coordinates': [[[-47.9, -15.8], [-47.8, -15.8], [-47.8, -15.7], [-47.9, -15.8]]]}
+
+
+def probe(app):
+    context = app.current_request.get()
+    return None if context is None else [context.client_key, context.endpoint, context.deadline_seconds]
+
+
+def read_lines(response):
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('endpoint, compute, body', [
+    ('/climate_stats', 'compute_climate_stats', {'point': POINT, 'date_periods': [['2024-01-01', '2024-02-01']]}),
+    ('/ndvi_composite', 'compute_ndvi_composite', {'roi': ROI, 'date_periods': [['2024-01-01', '2024-02-01']]}),
+])
+def test_streamed_composite_sees_request_context(app, monkeypatch, endpoint, compute, body):
+    seen = []
+
+    def fake_compute(data, on_period=None):
+        seen.append(probe(app))
+        on_period('task', 'period_1', {'value': 1})
+        return {'task': {'period_1': {'value': 1}}}
+
+    monkeypatch.setattr(app, compute, fake_compute)
+    lines = read_lines(app.app.test_client().post(endpoint, json=body, headers=HEADERS))
+
+    assert lines[-1]['done'] is True
+    assert seen == [[app.job_owner('test'), endpoint.strip('/'), 5.0]]
+
+
+def test_streamed_ndvi_batch_sees_request_context(app, monkeypatch):
+    seen = []
+
+    def fake_results(data, fields):
+        seen.append(probe(app))
+        yield {'field_id': 'a', 'ndvi': {}}
+
+    monkeypatch.setattr(app, 'iter_ndvi_batch_results', fake_results)
+    fields = {'type': 'FeatureCollection', 'features': [{'type': 'Feature', 'id': 'a', 'geometry': ROI, 'properties': {}}]}
+    lines = read_lines(app.app.test_client().post('/ndvi_batch', json={'fields': fields}, headers=HEADERS))
+
+    assert lines[-1]['done'] is True
+    assert seen == [[app.job_owner('test'), 'ndvi_batch', 5.0]]
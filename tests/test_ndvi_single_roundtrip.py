@@ -0,0 +1,45 @@
+"""NDVI em ida e volta única: um getInfo() para todos os períodos, com o mesmo resultado do caminho por período."""
+import pytest
+
+from benchmarks import fake_ee
+from benchmarks.run_benchmarks import ROI, build_collections, monthly_periods
+
+
+@pytest.mark.parametrize('sentinel_cloudy', [False, True])
+@pytest.mark.parametrize('count', [1, 6, 12])
+def test_single_roundtrip_makes_one_round_trip(app, count, sentinel_cloudy):
+    fake_ee.configure(build_collections(count, sentinel_cloudy))
+    fake_ee.reset_counters()
+
+    results = app.calculate_ndvi_logic({'roi': ROI, 'date_periods': monthly_periods(count), 'single_roundtrip': True})
+
+    assert fake_ee.counters()['total_round_trips'] == 1
+    assert list(results) == [f'period_{i}' for i in range(1, count + 1)]
+    expected = 'landsat' if sentinel_cloudy else 'sentinel'
+    assert all(result['satellite'] == expected for result in results.values())
+
+
+@pytest.mark.parametrize('sentinel_cloudy', [False, True])
+def test_single_roundtrip_matches_per_period_path(app, monkeypatch, sentinel_cloudy):
+    monkeypatch.setattr(app, 'RESULT_CACHE_ENABLED', False)
+    fake_ee.configure(build_collections(6, sentinel_cloudy))
+    body = {'roi': ROI, 'date_periods': monthly_periods(6)}
+
+    single = app.calculate_ndvi_logic(dict(body, single_roundtrip=True))
+    per_period = app.calculate_ndvi_logic(dict(body, single_roundtrip=False))
+
+    assert list(single) == list(per_period)
+    for period_name, result in per_period.items():
+        assert single[period_name]['satellite'] == result['satellite']
+        for field in ('ndvi_mean', 'ndvi_min', 'ndvi_max'):
+            assert single[period_name][field] == pytest.approx(result[field])
+
+
+def test_cached_periods_skip_the_round_trip(app):
+    fake_ee.configure(build_collections(3, False))
+    body = {'roi': ROI, 'date_periods': monthly_periods(3), 'single_roundtrip': True}
+    first = app.calculate_ndvi_logic(body)
+    fake_ee.reset_counters()
+
+    assert app.calculate_ndvi_logic(body) == first
+    assert fake_ee.counters()['total_round_trips'] == 0
@@ -0,0 +1,65 @@
+"""Agendador de assinaturas: lease renovado durante o lote e idade máxima dos resultados do NDVI."""
+import datetime
+import time
+
+
+def subscription(number):
+    return {
+        'subscription_id': f'sub-{number}',
+        'owner': 'owner',
+        'kind': 'climate_stats',
+        'params': {'point': {'type': 'Point', 'coordinates': [-47.9, -15.8]}},
+        'period_templates': ['last_30_days'],
+        'created_at': time.time() + number,
+        'status': 'pending',
+    }
+
+
+def test_lease_renewed_per_subscription(app, tmp_path, monkeypatch):
+    store = app.SubscriptionStore(str(tmp_path / 'subscriptions.sqlite3'))
+    for number in range(3):
+        store.create(subscription(number))
+    scheduler = app.SubscriptionScheduler(store)
+    leases, computed = [], []
+    acquire_lease = store.acquire_lease
+    monkeypatch.setattr(store, 'acquire_lease', lambda owner: leases.append(owner) or acquire_lease(owner))
+    monkeypatch.setattr(scheduler, 'data_versions', lambda batch, payloads: {})
+    monkeypatch.setattr(scheduler, 'compute', lambda sub, payload, version: computed.append(sub['subscription_id']))
+
+    scheduler.run_cycle(owner='worker-1', today=datetime.date(2024, 3, 1))
+
+    assert computed == ['sub-0', 'sub-1', 'sub-2']
+    # Uma renovação no início do lote e uma antes de cada assinatura
+    assert len(leases) == 1 + len(computed)
+
+
+def test_lease_lost_mid_batch_stops_cycle(app, tmp_path, monkeypatch):
+    store = app.SubscriptionStore(str(tmp_path / 'subscriptions.sqlite3'))
+    for number in range(3):
+        store.create(subscription(number))
+    scheduler = app.SubscriptionScheduler(store)
+    computed = []
+    monkeypatch.setattr(scheduler, 'data_versions', lambda batch, payloads: {})
+
+    def compute(sub, payload, version):
+        computed.append(sub['subscription_id'])
+        # Outro worker assume o lease (o deste expirou durante o cálculo)
+        with store._connect() as conn:
+            conn.execute("UPDATE subscription_scheduler SET lease_owner = 'worker-2', lease_expires = ?",
+                         (time.time() + 600,))
+
+    monkeypatch.setattr(scheduler, 'compute', compute)
+    scheduler.run_cycle(owner='worker-1', today=datetime.date(2024, 3, 1))
+
+    assert computed == ['sub-0']
+
+
+def test_ndvi_result_age_capped_by_map_id_lifetime(app, monkeypatch):
+    monkeypatch.setattr(app, 'SUBSCRIPTION_RESULT_MAX_AGE_SECONDS', 86400)
+    monkeypatch.setattr(app, 'TILE_MAP_ID_LIFETIME_SECONDS', 14400)
+    monkeypatch.setattr(app, 'TILE_URL_TTL_SECONDS', 0)
+    assert app.subscription_result_max_age('ndvi_composite') == 14400
+    assert app.subscription_result_max_age('climate_stats') == 86400
+
+    monkeypatch.setattr(app, 'TILE_URL_TTL_SECONDS', 13500)
+    assert app.subscription_result_max_age('ndvi_composite') == 13500